@@ -1,70 +1,91 @@
 """Workout 10 backend demonstrating key rotation and failure modes."""
 from __future__ import annotations
 
-import json
 import os
-from functools import lru_cache
-from typing import Any, Dict
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator
 
-from fastapi import Depends, FastAPI, HTTPException, status
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwt
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Response, status
 from pydantic import BaseModel
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "shared"))
+
+from authn_verify import (  # noqa: E402
+    JwksManager,
+    Screening,
+    SignatureOffload,
+    VerificationMetrics,
+    VerificationPolicy,
+    VerifiedToken,
+    Verifier,
+    Warmup,
+    jwks_loader,
+)
+from authn_verify.dependency import metrics_response, verified_token  # noqa: E402
+from authn_verify.shared_table import shared_jwks_loader  # noqa: E402
+
 EXPECTED_ISSUER = os.environ.get("WORKOUT10_ISSUER", "https://demo-issuer")
 EXPECTED_AUDIENCE = os.environ.get("WORKOUT10_AUDIENCE", "workout10-api")
 JWKS_PATH = os.environ.get("WORKOUT10_JWKS_PATH")
 JWKS_INLINE = os.environ.get("WORKOUT10_JWKS_JSON")
+JWKS_URL = os.environ.get("WORKOUT10_JWKS_URL")
+JWKS_REFRESH_SECONDS = float(os.environ.get("WORKOUT10_JWKS_REFRESH_SECONDS", "300"))
+JWKS_MIN_REFETCH_SECONDS = float(os.environ.get("WORKOUT10_JWKS_MIN_REFETCH_SECONDS", "30"))
+SHARED_STATE_DIR = os.environ.get("WORKOUT10_SHARED_STATE_DIR")
+ADMIN_ENABLED = os.environ.get("WORKOUT10_ADMIN_ENABLED", "0") == "1"
+# A thread pool only adds capacity with a core to run it on; a single-core box verifies inline.
+VERIFY_OFFLOAD = os.environ.get("WORKOUT10_VERIFY_OFFLOAD", "thread" if (os.cpu_count() or 1) > 1 else "inline")
+VERIFY_WORKERS = int(os.environ.get("WORKOUT10_VERIFY_WORKERS", "0")) or None
+VERIFY_MAX_QUEUE = int(os.environ.get("WORKOUT10_VERIFY_MAX_QUEUE", "64"))
+
+# With several workers, one fetch of the JWKS serves all of them; each still builds its own key objects.
+JWKS_LOADER = jwks_loader(inline=JWKS_INLINE, path=JWKS_PATH, url=JWKS_URL)
+if SHARED_STATE_DIR:
+    JWKS_LOADER = shared_jwks_loader(
+        JWKS_LOADER, os.path.join(SHARED_STATE_DIR, "workout10-jwks.tbl"), max_age=JWKS_REFRESH_SECONDS
+    )
 
-bearer_scheme = HTTPBearer(auto_error=False)
-app = FastAPI(title="AuthN Workout 10")
-
-
-def _load_jwks() -> Dict[str, Dict[str, Any]]:
-    """Load JWKS from file or inline JSON."""
-    if JWKS_INLINE:
-        raw = json.loads(JWKS_INLINE)
-    elif JWKS_PATH:
-        with open(JWKS_PATH, "r", encoding="utf-8") as fh:
-            raw = json.load(fh)
-    else:
-        return {}
-    return {key["kid"]: key for key in raw.get("keys", []) if key.get("use") in {None, "sig"}}
-
-
-@lru_cache(maxsize=1)
-def get_jwks_cache() -> Dict[str, Dict[str, Any]]:
-    return _load_jwks()
-
-
-def signature_from_jwk(token: str) -> tuple[dict[str, Any], dict[str, Any]]:
+jwks_manager = JwksManager(
+    JWKS_LOADER,
+    refresh_interval=JWKS_REFRESH_SECONDS,
+    min_refetch_interval=JWKS_MIN_REFETCH_SECONDS,
+)
+# RS256/ES256 checks leave the event loop so one slow verify does not stall every other request.
+OFFLOAD = SignatureOffload(VERIFY_OFFLOAD, max_workers=VERIFY_WORKERS, max_queue=VERIFY_MAX_QUEUE)
+SCREENING = Screening.from_env("WORKOUT10")
+METRICS = VerificationMetrics()
+VERIFIER = Verifier(
+    VerificationPolicy(
+        keys=jwks_manager,
+        issuer=EXPECTED_ISSUER,
+        audience=EXPECTED_AUDIENCE,
+        offload=OFFLOAD,
+        prefilter=SCREENING.prefilter,
+    ),
+    metrics=METRICS,
+)
+WARMUP = Warmup(VERIFIER)
+METRICS.poll("jwks_refreshes_total", "counter", "Successful JWKS reloads.", lambda: jwks_manager.refreshes)
+METRICS.poll("jwks_refresh_failures_total", "counter", "Failed JWKS reloads.", lambda: jwks_manager.failures)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await jwks_manager.start()
+    await OFFLOAD.start()
+    # After both, so the warm-up primes the loaded keys in every pool worker.
+    await WARMUP.run()
     try:
-        header = jwt.get_unverified_header(token)
-    except JWTError as exc:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token header",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from exc
-
-    kid = header.get("kid")
-    if not kid:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing kid header",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        yield
+    finally:
+        OFFLOAD.close()
+        await jwks_manager.stop()
 
-    jwks = get_jwks_cache()
-    key = jwks.get(kid)
-    if not key:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Unknown signing key: {kid}",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
 
-    return header, key
+app = FastAPI(title="AuthN Workout 10", lifespan=lifespan)
+SCREENING.install(app, VERIFIER)
 
 
 class ProtectedPayload(BaseModel):
@@ -73,56 +94,45 @@ class ProtectedPayload(BaseModel):
     claims: dict[str, Any]
 
 
-async def verify_token(
-    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
-) -> dict[str, Any]:
-    if credentials is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing Authorization header",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    token = credentials.credentials
-    header, key = signature_from_jwk(token)
-    alg = header.get("alg")
+@app.get("/health")
+async def health_check() -> dict[str, str]:
+    if not await WARMUP.check():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=WARMUP.detail)
+    return {"status": "ok"}
 
-    try:
-        claims = jwt.decode(
-            token,
-            key,
-            algorithms=[alg],
-            audience=EXPECTED_AUDIENCE,
-            issuer=EXPECTED_ISSUER,
-        )
-    except JWTError as exc:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token verification failed",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from exc
 
-    claims["_kid"] = key["kid"]
-    return claims
+@app.get("/metrics")
+async def metrics() -> Response:
+    return metrics_response(METRICS)
 
 
-@app.get("/health")
-async def health_check() -> dict[str, str]:
-    return {"status": "ok"}
+# The key endpoints carry no authentication, so they exist only when WORKOUT10_ADMIN_ENABLED=1.
+admin = APIRouter()
 
 
-@app.post("/admin/reload-keys")
+@admin.post("/admin/reload-keys")
 async def reload_keys() -> dict[str, str]:
-    get_jwks_cache.cache_clear()
-    get_jwks_cache()
+    if not await jwks_manager.refresh():
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="JWKS reload failed; still serving the previous key set",
+        )
     return {"status": "reloaded"}
 
 
+@admin.get("/admin/keys")
+async def key_status() -> dict[str, Any]:
+    return {**jwks_manager.stats(), "warmup": WARMUP.stats()}
+
+
+if ADMIN_ENABLED:
+    app.include_router(admin)
+
+
 @app.get("/protected", response_model=ProtectedPayload)
-async def protected_endpoint(claims: dict[str, Any] = Depends(verify_token)) -> ProtectedPayload:
-    key_id = claims.pop("_kid", "unknown")
+async def protected_endpoint(token: VerifiedToken = Depends(verified_token)) -> ProtectedPayload:
     return ProtectedPayload(
         message="Protected action succeeded",
-        key_id=key_id,
-        claims=claims,
+        key_id=token.kid or "unknown",
+        claims=token.claims,
     )
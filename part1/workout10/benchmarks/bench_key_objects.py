@@ -0,0 +1,77 @@
+"""Measure the per-request cost of rebuilding JWKS keys versus reusing key objects.
+
+Usage:
+    python bench_key_objects.py --iterations 2000
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk, jwt
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from app import EXPECTED_AUDIENCE, EXPECTED_ISSUER  # noqa: E402
+from authn_verify import build_keys  # noqa: E402
+
+
+def _private_pem(private_key) -> bytes:
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+def _fixture(kid: str, alg: str, private_key) -> tuple[dict, str]:
+    pem = _private_pem(private_key)
+    public_jwk = jwk.construct(pem, alg).public_key().to_dict()
+    public_jwk.update({"kid": kid, "use": "sig", "alg": alg})
+    claims = {
+        "iss": EXPECTED_ISSUER,
+        "aud": EXPECTED_AUDIENCE,
+        "sub": "bench",
+        "exp": datetime.now(timezone.utc) + timedelta(hours=1),
+    }
+    token = jwt.encode(claims, pem.decode(), algorithm=alg, headers={"kid": kid})
+    return public_jwk, token
+
+
+def _time(label: str, iterations: int, verify) -> float:
+    verify()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        verify()
+    per_call_us = (time.perf_counter() - started) / iterations * 1e6
+    print(f"  {label:<22} {per_call_us:>9.1f} us/verify")
+    return per_call_us
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    fixtures = {
+        "RS256": _fixture("rsa-key", "RS256", rsa.generate_private_key(public_exponent=65537, key_size=2048)),
+        "ES256": _fixture("ec-key", "ES256", ec.generate_private_key(ec.SECP256R1())),
+    }
+    prebuilt = build_keys({"keys": [jwk_dict for jwk_dict, _ in fixtures.values()]})
+
+    for alg, (jwk_dict, token) in fixtures.items():
+        key = prebuilt[jwk_dict["kid"]]
+        options = {"audience": EXPECTED_AUDIENCE, "issuer": EXPECTED_ISSUER}
+        print(f"{alg}:")
+        raw = _time("raw JWK dict", args.iterations, lambda: jwt.decode(token, jwk_dict, algorithms=[alg], **options))
+        built = _time("prebuilt key object", args.iterations, lambda: jwt.decode(token, key.key, algorithms=[key.alg], **options))
+        print(f"  saving per request     {raw - built:>9.1f} us ({(1 - built / raw) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Measure /protected and /health latency under concurrent RS256/ES256 load for each offload strategy.
+
+Requests go through the app over an in-memory ASGI transport, so the
+numbers are event-loop behaviour without network noise. Each round fires a
+burst of concurrent /protected requests followed by one /health probe and
+times every response from the start of the burst. Inline, the probe waits
+for every signature check queued ahead of it; with an executor it should not.
+
+Usage:
+    python bench_offload.py --rounds 50 --concurrency 1 8 32
+    python bench_offload.py --strategies inline thread --workers 4 --max-queue 16
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk, jwt
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import app as workout10  # noqa: E402
+from authn_verify import SignatureOffload, VerificationPolicy, Verifier, Warmup, build_keys  # noqa: E402
+
+
+class StaticKeys:
+    def __init__(self, keys: dict) -> None:
+        self._keys = keys
+
+    async def get_or_refetch(self, kid: str):
+        return self._keys.get(kid)
+
+
+def _fixture(alg: str, key_size: int) -> tuple[StaticKeys, list[str]]:
+    if alg == "ES256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public_jwk = jwk.construct(pem, alg).public_key().to_dict()
+    public_jwk.update({"kid": "bench", "use": "sig", "alg": alg})
+    claims = {
+        "iss": workout10.EXPECTED_ISSUER,
+        "aud": workout10.EXPECTED_AUDIENCE,
+        "exp": datetime.now(timezone.utc) + timedelta(hours=1),
+    }
+    tokens = [
+        jwt.encode({**claims, "sub": f"user-{n}"}, pem, algorithm=alg, headers={"kid": "bench"}) for n in range(64)
+    ]
+    return StaticKeys(build_keys({"keys": [public_jwk]})), tokens
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+
+async def _run(client: httpx.AsyncClient, tokens: list[str], rounds: int, concurrency: int) -> dict:
+    """Fire bursts of ``concurrency`` requests plus one /health probe; time each from the burst start."""
+    latencies: list[float] = []
+    probes: list[float] = []
+    shed = 0
+
+    async def call(path: str, token: str | None, started: float, into: list[float]) -> int:
+        headers = {"Authorization": f"Bearer {token}"} if token else None
+        response = await client.get(path, headers=headers)
+        into.append(time.perf_counter() - started)
+        return response.status_code
+
+    elapsed = 0.0
+    for round_ in range(rounds):
+        started = time.perf_counter()
+        calls = [
+            call("/protected", tokens[(round_ * concurrency + n) % len(tokens)], started, latencies)
+            for n in range(concurrency)
+        ]
+        # The probe is queued last, behind the whole burst, as a cheap request arriving mid-load would be.
+        statuses = await asyncio.gather(*calls, call("/health", None, started, probes))
+        elapsed += time.perf_counter() - started
+        shed += statuses.count(503)
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": _percentile(latencies, 0.5),
+        "p99": _percentile(latencies, 0.99),
+        "health_p50": _percentile(probes, 0.5),
+        "health_p99": _percentile(probes, 0.99),
+        "shed": shed,
+    }
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    keys, tokens = _fixture(args.alg, args.key_size)
+    print(f"cpus: {os.cpu_count()}  {args.alg}  rounds per run: {args.rounds}")
+    print(
+        f"{'strategy':<9} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'health p50':>11} {'health p99':>11} {'503s':>5}"
+    )
+    for strategy in args.strategies:
+        offload = SignatureOffload(strategy, max_workers=args.workers, max_queue=args.max_queue)
+        await offload.start()
+        workout10.VERIFIER = Verifier(
+            VerificationPolicy(
+                keys=keys,
+                issuer=workout10.EXPECTED_ISSUER,
+                audience=workout10.EXPECTED_AUDIENCE,
+                offload=offload,
+            )
+        )
+        # The app's lifespan is not run here; warm this verifier so /health reports ready.
+        workout10.WARMUP = Warmup(workout10.VERIFIER)
+        await workout10.WARMUP.run()
+        transport = httpx.ASGITransport(app=workout10.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await _run(client, tokens, 4, 8)
+            for concurrency in args.concurrency:
+                result = await _run(client, tokens, args.rounds, concurrency)
+                print(
+                    f"{strategy:<9} {concurrency:>5} {result['rps']:>8.0f} {result['p50']:>8.2f} "
+                    f"{result['p99']:>8.2f} {result['health_p50']:>11.2f} {result['health_p99']:>11.2f} "
+                    f"{result['shed']:>5}"
+                )
+        offload.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--strategies", nargs="+", default=["inline", "thread", "process"])
+    parser.add_argument("--workers", type=int, default=None, help="Executor size; defaults to the CPU count")
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--alg", choices=["RS256", "ES256"], default="RS256")
+    parser.add_argument("--key-size", type=int, default=2048, help="RSA modulus size")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,57 @@
 from __future__ import annotations
 
 import os
-from typing import Any
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator
 
-from fastapi import Depends, FastAPI, HTTPException, status
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwt
+from fastapi import Depends, FastAPI, HTTPException, Response, status
 from pydantic import BaseModel
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "shared"))
+
+from authn_verify import (  # noqa: E402
+    BearerAuthMiddleware,
+    VerificationMetrics,
+    VerificationPolicy,
+    VerifiedToken,
+    Verifier,
+    Warmup,
+)
+from authn_verify.dependency import metrics_response, verified_token  # noqa: E402
+
 EXPECTED_ISSUER = os.environ.get("WORKOUT6_ISSUER", "https://example-issuer")
 EXPECTED_AUDIENCE = os.environ.get("WORKOUT6_AUDIENCE", "workout6-api")
 TOKEN_SECRET = os.environ.get("WORKOUT6_TOKEN_SECRET", "workout6-demo-secret")
 TOKEN_ALGORITHM = os.environ.get("WORKOUT6_TOKEN_ALG", "HS256")
 
-bearer_scheme = HTTPBearer(auto_error=False)
-app = FastAPI(title="AuthN Workout 6")
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await WARMUP.run()
+    yield
+
+
+app = FastAPI(title="AuthN Workout 6", lifespan=lifespan)
+
+METRICS = VerificationMetrics()
+
+# Failures stay generic here; workout 8 makes them descriptive.
+VERIFIER = Verifier(
+    VerificationPolicy(
+        algorithms=(TOKEN_ALGORITHM,),
+        secret=TOKEN_SECRET,
+        issuer=EXPECTED_ISSUER,
+        audience=EXPECTED_AUDIENCE,
+        detailed_errors=False,
+    ),
+    metrics=METRICS,
+)
+WARMUP = Warmup(VERIFIER)
+
+# No prefilter or failure limit yet; workout 8 adds both.
+app.add_middleware(BearerAuthMiddleware, verifier=VERIFIER, paths=("/protected",))
 
 
 class PublicPayload(BaseModel):
@@ -29,41 +66,22 @@ class ProtectedPayload(BaseModel):
     claims: dict[str, Any]
 
 
-async def verify_token(
-    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
-) -> dict[str, Any]:
-    if credentials is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing Authorization header",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    token = credentials.credentials
-
-    try:
-        claims = jwt.decode(
-            token,
-            TOKEN_SECRET,
-            algorithms=[TOKEN_ALGORITHM],
-            audience=EXPECTED_AUDIENCE,
-            issuer=EXPECTED_ISSUER,
-        )
-    except JWTError as exc:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token verification failed",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from exc
-
-    return claims
+async def verify_token(token: VerifiedToken = Depends(verified_token)) -> dict[str, Any]:
+    return token.claims
 
 
 @app.get("/health")
 async def health_check() -> dict[str, str]:
+    if not await WARMUP.check():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=WARMUP.detail)
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics() -> Response:
+    return metrics_response(METRICS)
+
+
 @app.get("/public", response_model=PublicPayload)
 async def public_endpoint() -> PublicPayload:
     return PublicPayload(message="Public hello", workout="token-assertions")
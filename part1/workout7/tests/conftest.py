@@ -0,0 +1,7 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+# jwt_lab is a script run from tools/, so import it the same way.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "tools"))
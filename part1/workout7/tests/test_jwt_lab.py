@@ -0,0 +1,249 @@
+"""``jwt_lab``: streaming decode statistics, and batch verification that answers every input line."""
+from __future__ import annotations
+
+import argparse
+import base64
+import io
+import json
+import sys
+import time
+from typing import Any
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import JWTError, jwk, jwt
+
+import jwt_lab
+from jwt_lab import (
+    _iter_token_bytes,
+    _mint_settings,
+    _read_tokens,
+    decode_stream_command,
+    mint_command,
+    verify_batch_command,
+)
+
+SECRET = "lab-secret"
+
+
+def _token(**claims: object) -> str:
+    return jwt.encode({"sub": "alice", "aud": "lab", "exp": int(time.time()) + 300, **claims}, SECRET)
+
+
+def _unsigned(header: dict[str, object], payload: object) -> bytes:
+    def segment(value: object) -> str:
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).rstrip(b"=").decode()
+
+    return f"{segment(header)}.{segment(payload)}.sig".encode()
+
+
+def test_decode_stream_statistics() -> None:
+    now = 1_000_000
+    tokens = [
+        _unsigned({"alg": "HS256"}, {"iss": "a", "aud": "api", "iat": now - 60, "exp": now + 240}),
+        _unsigned({"alg": "HS256"}, {"iss": "a", "aud": ["api", "web"], "iat": now, "exp": now - 1}),
+        _unsigned({"alg": "RS256", "kid": "k1"}, {"iss": "b", "exp": now + 7200}),
+        _unsigned({"alg": "RS256", "kid": "k1"}, {"iss": "b", "iat": now, "exp": now + 172800}),
+        _unsigned({"alg": "none"}, {"sub": "x"}),
+        _unsigned({"alg": "HS256"}, ["not", "an", "object"]),
+        b"two.parts",
+        b"a.b.c.d",
+        b"!!.??.sig",
+    ]
+    summary = decode_stream_command(tokens, now=now)
+    assert summary == {
+        "tokens": 9,
+        "malformed": 4,
+        "alg": {"HS256": 2, "RS256": 2, "none": 1},
+        "kid": {"-": 3, "k1": 2},
+        "iss": {"a": 2, "b": 2, "-": 1},
+        "aud": {"api": 2, "-": 3, "web": 1},
+        "lifetime": {"<=1m": 1, "<=5m": 1, ">1d": 1, "no iat": 1, "no exp": 1},
+        "expired_ratio": 0.25,
+    }
+
+
+def test_token_bytes_from_a_file(tmp_path: Any) -> None:
+    path = tmp_path / "tokens.jsonl"
+    path.write_bytes(b'raw.token.one\n\n{"token": "json.token.two"}\n{"jwt": "x"}\n')
+    assert list(_iter_token_bytes(str(path), "token")) == [b"raw.token.one", b"json.token.two", b""]
+    empty = tmp_path / "empty.txt"
+    empty.write_bytes(b"")
+    assert list(_iter_token_bytes(str(empty), "token")) == []
+
+
+def _batch(text: str, **options: object) -> tuple[list[dict[str, object]], dict[str, object]]:
+    out = io.StringIO()
+    settings = {"workers": 1, "chunk_size": 2, "ordered": True, "token_field": "token", **options}
+    summary = verify_batch_command(io.StringIO(text), out, SECRET, "HS256", "lab", None, **settings)
+    return [json.loads(line) for line in out.getvalue().splitlines()], summary
+
+
+def test_read_tokens() -> None:
+    text = "plain\n\n{\"token\": \"from-json\"}\n{\"jwt\": \"other-field\"}\n{not json\n[1]\n"
+    assert list(_read_tokens(io.StringIO(text), "token")) == [
+        (1, "plain"),
+        (3, "from-json"),
+        (4, ""),
+        (5, ""),
+        (6, "[1]"),
+    ]
+    assert list(_read_tokens(io.StringIO(text), "jwt"))[2] == (4, "other-field")
+
+
+def test_in_process_batch() -> None:
+    good, wrong_aud = _token(), _token(aud="other")
+    results, summary = _batch(f"{good}\n\n{wrong_aud}\n{{\"token\": \"{good}\"}}\ngarbage\n")
+    assert [result["line"] for result in results] == [1, 3, 4, 5]
+    assert [result["valid"] for result in results] == [True, False, True, False]
+    assert results[0]["claims"]["sub"] == "alice"
+    assert results[1]["error"] == "Invalid audience"
+    assert (summary["tokens"], summary["valid"], summary["invalid"]) == (4, 2, 2)
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_worker_pool_batch(ordered: bool) -> None:
+    tokens = [_token(jti=str(index)) if index % 3 else "garbage" for index in range(40)]
+    results, summary = _batch("\n".join(tokens) + "\n", workers=2, chunk_size=3, ordered=ordered)
+    lines = [result["line"] for result in results]
+    if ordered:
+        assert lines == list(range(1, 41))
+    assert sorted(lines) == list(range(1, 41))
+    assert all(result["valid"] == bool((result["line"] - 1) % 3) for result in results)
+    assert (summary["tokens"], summary["valid"]) == (40, 26)
+
+
+
+def _main(monkeypatch: pytest.MonkeyPatch, *argv: str) -> None:
+    monkeypatch.setattr(sys, "argv", ["jwt_lab.py", *argv])
+    jwt_lab.main()
+
+
+def test_verify_batch_reads_the_secret_from_a_file(monkeypatch: pytest.MonkeyPatch, tmp_path: Any) -> None:
+    (tmp_path / "secret.txt").write_text(SECRET)
+    (tmp_path / "tokens.txt").write_text(f"{_token()}\n")
+    _main(
+        monkeypatch, "verify-batch", "--secret", f"@{tmp_path / 'secret.txt'}", "--audience", "lab",
+        "--workers", "1", "--input", str(tmp_path / "tokens.txt"), "--output", str(tmp_path / "results.jsonl"),
+    )
+    assert json.loads((tmp_path / "results.jsonl").read_text())["valid"] is True
+
+
+@pytest.mark.parametrize("option", ["--workers", "--chunk-size"])
+@pytest.mark.parametrize("value", ["0", "-1", "many"])
+def test_verify_batch_options_must_be_positive(monkeypatch: pytest.MonkeyPatch, option: str, value: str) -> None:
+    with pytest.raises(SystemExit) as exited:
+        _main(monkeypatch, "verify-batch", "--secret", SECRET, option, value)
+    assert exited.value.code == 2
+
+def _mint_args(**overrides: object) -> argparse.Namespace:
+    options = {
+        "claims": '{"iss": "lab", "aud": "lab"}',
+        "secret": [SECRET],
+        "kid": None,
+        "algorithm": "HS256",
+        "lifetime": (300, 300),
+        "iat_spread": 0,
+        "nbf": False,
+        "subjects": 0,
+        "broken_ratio": 0.0,
+        "broken_kinds": None,
+        "format": "lines",
+        "seed": 7,
+        "now": time.time(),
+        **overrides,
+    }
+    return argparse.Namespace(**options)
+
+
+def _mint(count: int, workers: int = 1, chunk_size: int = 10, **overrides: object) -> tuple[bytes, dict[str, Any]]:
+    out = io.BytesIO()
+    summary = mint_command(out, count, _mint_settings(_mint_args(**overrides)), workers=workers, chunk_size=chunk_size)
+    return out.getvalue(), summary
+
+
+def test_minted_tokens_verify() -> None:
+    data, summary = _mint(25, lifetime=(60, 600), iat_spread=30, nbf=True, subjects=3)
+    tokens = data.decode().splitlines()
+    assert summary["tokens"] == len(tokens) == 25
+    claims = [jwt.decode(token, SECRET, algorithms=["HS256"], audience="lab") for token in tokens]
+    assert len({claim["jti"] for claim in claims}) == 25
+    assert {claim["sub"] for claim in claims} <= {"user-0", "user-1", "user-2"}
+    assert all(claim["iss"] == "lab" and claim["nbf"] == claim["iat"] for claim in claims)
+    assert all(60 <= claim["exp"] - claim["iat"] <= 600 for claim in claims)
+
+
+def test_workers_do_not_change_the_output() -> None:
+    now = time.time()
+    one, _ = _mint(50, workers=1, chunk_size=7, now=now)
+    three, _ = _mint(50, workers=3, chunk_size=7, now=now)
+    assert one == three
+    assert _mint(50, workers=1, chunk_size=7, now=now, seed=8)[0] != one
+
+
+def test_broken_tokens_fail_as_labelled() -> None:
+    data, summary = _mint(200, broken_ratio=0.5, format="jsonl", kid=["k1"])
+    records = [json.loads(line) for line in data.splitlines()]
+    errors = {
+        "signature": "Signature verification failed.",
+        "expired": "Signature has expired.",
+        "not_before": "The token is not yet valid (nbf)",
+        "audience": "Invalid audience",
+        # Signed by a key outside the set, so even a verifier that ignores kid rejects it.
+        "unknown_kid": "Signature verification failed.",
+        "malformed": None,
+    }
+    for record in records:
+        kind = record["broken"]
+        if kind is None:
+            assert jwt.decode(record["token"], SECRET, algorithms=["HS256"], audience="lab")["iss"] == "lab"
+            continue
+        if kind == "unknown_kid":
+            assert jwt.get_unverified_header(record["token"])["kid"] == "unknown-kid"
+        with pytest.raises(JWTError) as error:
+            jwt.decode(record["token"], SECRET, algorithms=["HS256"], audience="lab")
+        if errors[kind] is not None:
+            assert str(error.value) == errors[kind]
+    kinds = [record["broken"] for record in records if record["broken"]]
+    assert summary["broken"] == {kind: kinds.count(kind) for kind in sorted(set(kinds))}
+    assert set(kinds) == {"signature", "expired", "not_before", "audience", "unknown_kid", "malformed"}
+
+
+def test_unknown_kid_is_signed_by_a_stand_in_key() -> None:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public_key = jwk.construct(pem, "RS256").public_key()
+    data, _ = _mint(10, algorithm="RS256", secret=[pem], kid=["k1"], broken_ratio=1.0, broken_kinds=["unknown_kid"])
+    for token in data.decode().splitlines():
+        with pytest.raises(JWTError, match="Signature verification failed"):
+            jwt.decode(token, public_key.to_pem().decode(), algorithms=["RS256"], audience="lab")
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"claims": '{"jti": "fixed"}'},
+        {"claims": '{"sub": "alice"}', "subjects": 2},
+        {"claims": "[1]"},
+        {"claims": "{not json"},
+        {"kid": ["k1", "k2"]},
+        {"broken_kinds": ["sideways"]},
+        {"broken_kinds": ["unknown_kid"]},
+        {"claims": "{}", "broken_kinds": ["audience"]},
+        {"broken_ratio": 1.5},
+    ],
+)
+def test_mint_settings_are_validated(overrides: dict[str, object]) -> None:
+    with pytest.raises(SystemExit):
+        _mint_settings(_mint_args(**overrides))
+
+
+@pytest.mark.parametrize("option", ["--count", "--workers", "--chunk-size"])
+def test_mint_counts_must_be_positive(monkeypatch: pytest.MonkeyPatch, option: str) -> None:
+    argv = {"--count": "10", "--workers": "1", "--chunk-size": "5", option: "0"}
+    with pytest.raises(SystemExit) as exited:
+        _main(monkeypatch, "mint", "--secret", SECRET, *[item for pair in argv.items() for item in pair])
+    assert exited.value.code == 2
@@ -3,11 +3,21 @@ from __future__ import annotations
 
 import argparse
 import base64
+import hashlib
+import hmac
 import json
+import mmap
+import os
+import random
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 from datetime import datetime, timezone
-from typing import Any
+from itertools import islice
+from typing import IO, Any, Callable, Iterable, Iterator
 
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jwt
 
 
 def _b64url_decode(data: str) -> bytes:
@@ -33,6 +43,105 @@ def decode_command(token: str) -> None:
     print(signature)
 
 
+LIFETIME_BUCKETS = [(60, '<=1m'), (300, '<=5m'), (900, '<=15m'), (3600, '<=1h'), (86400, '<=1d')]
+LIFETIME_LABELS = [label for _, label in LIFETIME_BUCKETS] + ['>1d', 'no iat', 'no exp']
+
+
+def _lifetime_bucket(seconds: float) -> str:
+    for limit, label in LIFETIME_BUCKETS:
+        if seconds <= limit:
+            return label
+    return '>1d'
+
+
+def _iter_token_bytes(path: str, token_field: str) -> Iterator[bytes]:
+    """Yield raw token bytes from a file (memory-mapped) or stdin without loading it whole."""
+    if path == '-':
+        lines: Iterable[bytes] = sys.stdin.buffer
+        yield from _tokens_from_lines(lines, token_field)
+        return
+    with open(path, 'rb') as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from _tokens_from_lines(iter(mm.readline, b''), token_field)
+
+
+def _tokens_from_lines(lines: Iterable[bytes], token_field: str) -> Iterator[bytes]:
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(b'{'):
+            try:
+                line = str(json.loads(line).get(token_field, '')).encode()
+            except (json.JSONDecodeError, AttributeError, UnicodeDecodeError):
+                line = b''
+        yield line
+
+
+def decode_stream_command(tokens: Iterable[bytes], now: float | None = None) -> dict[str, Any]:
+    """Aggregate header and payload fields in one pass; signatures are never decoded."""
+    now = time.time() if now is None else now
+    by_alg: Counter[str] = Counter()
+    by_kid: Counter[str] = Counter()
+    by_iss: Counter[str] = Counter()
+    by_aud: Counter[str] = Counter()
+    lifetimes: Counter[str] = Counter()
+    headers: dict[bytes, tuple[str, str]] = {}
+    total = malformed = with_exp = expired = 0
+
+    for token in tokens:
+        total += 1
+        first = token.find(b'.')
+        second = token.find(b'.', first + 1)
+        if first < 0 or second < 0 or token.find(b'.', second + 1) >= 0:
+            malformed += 1
+            continue
+        header_b64 = token[:first]
+        try:
+            # Most dumps repeat a handful of headers, so decode each distinct one once.
+            alg_kid = headers.get(header_b64)
+            if alg_kid is None:
+                header = json.loads(_b64url_decode(header_b64.decode('ascii')))
+                alg_kid = (str(header.get('alg')), str(header.get('kid', '-')))
+                if len(headers) < 4096:
+                    headers[header_b64] = alg_kid
+            payload = json.loads(_b64url_decode(token[first + 1:second].decode('ascii')))
+        except (ValueError, AttributeError):
+            malformed += 1
+            continue
+        if not isinstance(payload, dict):
+            malformed += 1
+            continue
+
+        by_alg[alg_kid[0]] += 1
+        by_kid[alg_kid[1]] += 1
+        by_iss[str(payload.get('iss', '-'))] += 1
+        aud = payload.get('aud', '-')
+        for value in aud if isinstance(aud, list) else [aud]:
+            by_aud[str(value)] += 1
+
+        exp, iat = payload.get('exp'), payload.get('iat')
+        if isinstance(exp, (int, float)):
+            with_exp += 1
+            expired += exp < now
+            lifetimes[_lifetime_bucket(exp - iat) if isinstance(iat, (int, float)) else 'no iat'] += 1
+        else:
+            lifetimes['no exp'] += 1
+
+    return {
+        'tokens': total,
+        'malformed': malformed,
+        'alg': dict(by_alg.most_common()),
+        'kid': dict(by_kid.most_common()),
+        'iss': dict(by_iss.most_common()),
+        'aud': dict(by_aud.most_common()),
+        'lifetime': {label: lifetimes[label] for label in LIFETIME_LABELS if lifetimes[label]},
+        'expired_ratio': round(expired / with_exp, 4) if with_exp else None,
+    }
+
+
 def verify_command(token: str, secret: str, algorithm: str, audience: str | None, issuer: str | None) -> None:
     try:
         claims = jwt.decode(
@@ -53,12 +162,377 @@ def verify_command(token: str, secret: str, algorithm: str, audience: str | None
         print(f"Expires at: {exp.isoformat()}")
 
 
+# Per-worker verification settings, filled in once by _init_worker.
+_WORKER: dict[str, Any] = {}
+
+
+def _init_worker(secret: str, algorithm: str, audience: str | None, issuer: str | None) -> None:
+    _WORKER.update(
+        key=jwk.construct(secret, algorithm),
+        algorithms=[algorithm],
+        audience=audience,
+        issuer=issuer,
+    )
+
+
+def _verify_chunk(chunk: list[tuple[int, str]]) -> tuple[int, list[str]]:
+    valid = 0
+    results = []
+    for line_no, token in chunk:
+        try:
+            claims = jwt.decode(
+                token,
+                _WORKER['key'],
+                algorithms=_WORKER['algorithms'],
+                audience=_WORKER['audience'],
+                issuer=_WORKER['issuer'],
+            )
+            result = {'line': line_no, 'valid': True, 'claims': claims}
+            valid += 1
+        except JWTError as exc:
+            result = {'line': line_no, 'valid': False, 'error': str(exc)}
+        results.append(json.dumps(result, separators=(',', ':')))
+    return valid, results
+
+
+def _read_tokens(stream: IO[str], token_field: str) -> Iterator[tuple[int, str]]:
+    """Yield (line number, token) lazily; JSONL lines carry the token in ``token_field``."""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            try:
+                token = json.loads(line).get(token_field, '')
+            except (json.JSONDecodeError, AttributeError):
+                token = ''
+            yield line_no, str(token)
+        else:
+            yield line_no, line
+
+
+def verify_batch_command(
+    stream: IO[str],
+    out: IO[str],
+    secret: str,
+    algorithm: str,
+    audience: str | None,
+    issuer: str | None,
+    *,
+    workers: int,
+    chunk_size: int,
+    ordered: bool,
+    token_field: str,
+) -> dict[str, Any]:
+    tokens = _read_tokens(stream, token_field)
+    chunks = iter(lambda: list(islice(tokens, chunk_size)), [])
+    totals = {'tokens': 0, 'valid': 0, 'invalid': 0}
+    started = time.perf_counter()
+
+    def emit(result: tuple[int, list[str]]) -> None:
+        valid, lines = result
+        totals['tokens'] += len(lines)
+        totals['valid'] += valid
+        totals['invalid'] += len(lines) - valid
+        out.write('\n'.join(lines) + '\n')
+
+    if workers <= 1:
+        _init_worker(secret, algorithm, audience, issuer)
+        for chunk in chunks:
+            emit(_verify_chunk(chunk))
+    else:
+        # Bounded window of in-flight chunks keeps memory flat however large the input is.
+        window: deque[Future] = deque()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(secret, algorithm, audience, issuer),
+        ) as pool:
+            for chunk in chunks:
+                window.append(pool.submit(_verify_chunk, chunk))
+                if len(window) >= workers * 4:
+                    emit(_next_done(window, ordered))
+            while window:
+                emit(_next_done(window, ordered))
+
+    elapsed = time.perf_counter() - started
+    totals['seconds'] = round(elapsed, 3)
+    totals['tokens_per_second'] = round(totals['tokens'] / elapsed) if elapsed > 0 else 0
+    return totals
+
+
+def _next_done(window: deque[Future], ordered: bool) -> tuple[int, list[str]]:
+    if ordered:
+        return window.popleft().result()
+    done, _ = wait(window, return_when=FIRST_COMPLETED)
+    future = next(iter(done))
+    window.remove(future)
+    return future.result()
+
+
+HMAC_DIGESTS = {'HS256': hashlib.sha256, 'HS384': hashlib.sha384, 'HS512': hashlib.sha512}
+BROKEN_KINDS = ('signature', 'expired', 'not_before', 'audience', 'unknown_kid', 'malformed')
+EC_CURVES = {'ES256': 'SECP256R1', 'ES384': 'SECP384R1', 'ES512': 'SECP521R1'}
+# Claims mint sets on every token; a template may not fix them.
+MINTED_CLAIMS = ('jti', 'iat', 'exp', 'nbf')
+
+
+def _b64url_encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def _load_key(value: str) -> str:
+    """``@path`` reads a PEM or secret from a file; anything else is the key itself."""
+    if value.startswith('@'):
+        with open(value[1:], 'r', encoding='utf-8') as fh:
+            return fh.read()
+    return value
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f'expected a positive integer, got {value!r}')
+    return number
+
+
+def _range(value: str) -> tuple[int, int]:
+    low, _, high = value.partition(':')
+    low_n, high_n = int(low), int(high or low)
+    if low_n < 0 or high_n < low_n:
+        raise argparse.ArgumentTypeError(f'expected N or MIN:MAX with 0 <= MIN <= MAX, got {value!r}')
+    return low_n, high_n
+
+
+# Per-worker minting state, filled in once by _init_mint_worker.
+_MINT: dict[str, Any] = {}
+
+
+def _signer(secret: str, algorithm: str) -> Callable[[bytes], bytes]:
+    digest = HMAC_DIGESTS.get(algorithm)
+    if digest is not None:
+        # One keyed HMAC per worker; each token pays for a copy, not for rebuilding the key.
+        template = hmac.new(secret.encode(), digestmod=digest)
+
+        def sign(message: bytes) -> bytes:
+            mac = template.copy()
+            mac.update(message)
+            return mac.digest()
+
+        return sign
+    return jwk.construct(secret, algorithm).sign
+
+
+def _stand_in_secret(algorithm: str, seed: int) -> str:
+    """A signing key outside the real set, for unknown_kid tokens.
+
+    A verifier that ignores kid (a single-key ``jwt.decode`` does) must still
+    reject them. The HMAC secret follows from the seed; RSA and EC keys cannot,
+    so those are generated once per run and shared by every worker.
+    """
+    if algorithm in HMAC_DIGESTS:
+        return hashlib.sha256(f'jwt-lab-unknown-kid-{seed}'.encode()).hexdigest()
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    if algorithm.startswith(('RS', 'PS')):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm in EC_CURVES:
+        private_key = ec.generate_private_key(getattr(ec, EC_CURVES[algorithm])())
+    else:
+        raise SystemExit(f'Broken kind unknown_kid does not support {algorithm}')
+    return private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+
+
+def _header(algorithm: str, kid: str | None) -> bytes:
+    header = {'alg': algorithm, 'typ': 'JWT'}
+    if kid is not None:
+        header['kid'] = kid
+    return _b64url_encode(json.dumps(header, separators=(',', ':')).encode())
+
+
+def _claims_prefix(claims: dict[str, Any]) -> str:
+    """The template as JSON without its closing brace, ready for the per-token claims."""
+    return json.dumps(claims, separators=(',', ':'))[:-1] + (',' if claims else '')
+
+
+def _init_mint_worker(settings: dict[str, Any]) -> None:
+    algorithm = settings['algorithm']
+    kids = settings['kids'] or [None]
+    claims = settings['claims']
+    _MINT.clear()
+    _MINT.update(settings)
+    _MINT['keys'] = [
+        (_header(algorithm, kid), _signer(secret, algorithm)) for secret, kid in zip(settings['secrets'], kids)
+    ]
+    if settings['unknown_kid_secret'] is not None:
+        _MINT['unknown_kid_key'] = (
+            _header(algorithm, 'unknown-kid'), _signer(settings['unknown_kid_secret'], algorithm)
+        )
+    _MINT['prefix'] = _claims_prefix(claims)
+    _MINT['wrong_audience_prefix'] = _claims_prefix({**claims, 'aud': 'wrong-audience'})
+
+
+def _mint_chunk(start: int, count: int) -> tuple[bytes, Counter[str]]:
+    m = _MINT
+    # Seeded by chunk position: with --seed, --now, and --chunk-size fixed, --workers does not change the output.
+    rng = random.Random(m['seed'] * 1_000_003 + start)
+    keys, now, run_id, jsonl = m['keys'], m['now'], m['run_id'], m['format'] == 'jsonl'
+    lifetime_low, lifetime_high = m['lifetime']
+    spread, subjects, with_nbf = m['iat_spread'], m['subjects'], m['nbf']
+    broken_ratio, kinds = m['broken_ratio'], m['broken_kinds']
+    prefix = m['prefix']
+    lines = []
+    broken_counts: Counter[str] = Counter()
+
+    for index in range(start, start + count):
+        header, sign = keys[rng.randrange(len(keys))] if len(keys) > 1 else keys[0]
+        lifetime = rng.randint(lifetime_low, lifetime_high)
+        iat = now - int(rng.random() * spread)
+        exp = iat + lifetime
+        nbf = iat if with_nbf else None
+        claims_prefix = prefix
+        broken = kinds[rng.randrange(len(kinds))] if broken_ratio and rng.random() < broken_ratio else None
+        if broken == 'expired':
+            exp = now - rng.randint(1, 3600)
+            iat = exp - lifetime
+            nbf = iat if with_nbf else None
+        elif broken == 'not_before':
+            nbf = now + rng.randint(600, 3600)
+        elif broken == 'audience':
+            claims_prefix = m['wrong_audience_prefix']
+        elif broken == 'unknown_kid':
+            header, sign = m['unknown_kid_key']
+
+        payload = f'{claims_prefix}"jti":"{run_id}-{index}","iat":{iat},"exp":{exp}'
+        if nbf is not None:
+            payload += f',"nbf":{nbf}'
+        if subjects:
+            payload += f',"sub":"user-{rng.randrange(subjects)}"'
+        signing_input = header + b'.' + _b64url_encode((payload + '}').encode())
+        # A valid signature over different bytes: right shape and key, wrong MAC.
+        signature = sign(signing_input + b'~' if broken == 'signature' else signing_input)
+        token = signing_input + b'.' + _b64url_encode(signature)
+        if broken == 'malformed':
+            token = token[:rng.randrange(len(header) + 1, len(token) - 1)]
+
+        if broken is not None:
+            broken_counts[broken] += 1
+        if jsonl:
+            label = b'null' if broken is None else b'"' + broken.encode() + b'"'
+            lines.append(b'{"token":"' + token + b'","broken":' + label + b'}')
+        else:
+            lines.append(token)
+    return b'\n'.join(lines) + b'\n', broken_counts
+
+
+def mint_command(
+    out: IO[bytes],
+    count: int,
+    settings: dict[str, Any],
+    *,
+    workers: int,
+    chunk_size: int,
+) -> dict[str, Any]:
+    """Sign ``count`` tokens in chunks across ``workers`` processes and stream them to ``out`` in order."""
+    chunks = ((start, min(chunk_size, count - start)) for start in range(0, count, chunk_size))
+    broken: Counter[str] = Counter()
+    started = time.perf_counter()
+
+    def emit(result: tuple[bytes, Counter[str]]) -> None:
+        data, counts = result
+        out.write(data)
+        broken.update(counts)
+
+    if workers <= 1:
+        _init_mint_worker(settings)
+        for start, size in chunks:
+            emit(_mint_chunk(start, size))
+    else:
+        window: deque[Future] = deque()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_mint_worker,
+            initargs=(settings,),
+        ) as pool:
+            for start, size in chunks:
+                window.append(pool.submit(_mint_chunk, start, size))
+                if len(window) >= workers * 4:
+                    emit(window.popleft().result())
+            while window:
+                emit(window.popleft().result())
+
+    elapsed = time.perf_counter() - started
+    return {
+        'tokens': count,
+        'broken': dict(sorted(broken.items())),
+        'seconds': round(elapsed, 3),
+        'tokens_per_second': round(count / elapsed) if elapsed > 0 else 0,
+    }
+
+
+def _mint_settings(args: argparse.Namespace) -> dict[str, Any]:
+    try:
+        claims = json.loads(_load_key(args.claims))
+    except (OSError, json.JSONDecodeError) as exc:
+        raise SystemExit(f'--claims must be a JSON object or @file: {exc}') from exc
+    if not isinstance(claims, dict):
+        raise SystemExit('--claims must be a JSON object')
+    fixed = sorted(set(claims) & set(MINTED_CLAIMS + (('sub',) if args.subjects else ())))
+    if fixed:
+        raise SystemExit(f'mint sets these claims itself; drop them from --claims: {", ".join(fixed)}')
+    secrets = [_load_key(secret) for secret in args.secret]
+    if args.kid and len(args.kid) != len(secrets):
+        raise SystemExit('Give one --kid per --secret, or none')
+
+    kinds = list(args.broken_kinds or BROKEN_KINDS)
+    unknown = set(kinds) - set(BROKEN_KINDS)
+    if unknown:
+        raise SystemExit(f'Unknown --broken-kinds: {", ".join(sorted(unknown))}')
+    if 'aud' not in claims and 'audience' in kinds:
+        if args.broken_kinds:
+            raise SystemExit('Broken kind audience needs an aud claim in --claims')
+        kinds.remove('audience')
+    if not args.kid and 'unknown_kid' in kinds:
+        if args.broken_kinds:
+            raise SystemExit('Broken kind unknown_kid needs --kid')
+        kinds.remove('unknown_kid')
+    if not 0 <= args.broken_ratio <= 1:
+        raise SystemExit('--broken-ratio must be between 0 and 1')
+
+    seed = args.seed if args.seed is not None else random.SystemRandom().getrandbits(32)
+    unknown_kid = args.broken_ratio and 'unknown_kid' in kinds
+    return {
+        'algorithm': args.algorithm,
+        'secrets': secrets,
+        'kids': args.kid,
+        'claims': claims,
+        'lifetime': args.lifetime,
+        'iat_spread': args.iat_spread,
+        'nbf': args.nbf,
+        'subjects': args.subjects,
+        'broken_ratio': args.broken_ratio,
+        'broken_kinds': tuple(kinds),
+        'format': args.format,
+        'seed': seed,
+        'unknown_kid_secret': _stand_in_secret(args.algorithm, seed) if unknown_kid else None,
+        'run_id': f'{seed:08x}',
+        'now': int(args.now if args.now is not None else time.time()),
+    }
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description='JWT inspection lab tool')
     subparsers = parser.add_subparsers(dest='command', required=True)
 
     decode_parser = subparsers.add_parser('decode', help='Decode header/payload without verifying')
-    decode_parser.add_argument('--token', required=True, help='JWT string')
+    decode_source = decode_parser.add_mutually_exclusive_group(required=True)
+    decode_source.add_argument('--token', help='JWT string')
+    decode_source.add_argument('--stream', action='store_true', help='Aggregate statistics over many tokens instead')
+    decode_parser.add_argument('--input', default='-', help='With --stream: token file (memory-mapped), or - for stdin')
+    decode_parser.add_argument('--token-field', default='token', help='With --stream: token field in JSONL input')
 
     verify_parser = subparsers.add_parser('verify', help='Verify signature and claims')
     verify_parser.add_argument('--token', required=True, help='JWT string')
@@ -67,12 +541,73 @@ def main() -> None:
     verify_parser.add_argument('--audience', help='Expected audience claim')
     verify_parser.add_argument('--issuer', help='Expected issuer claim')
 
+    batch_parser = subparsers.add_parser('verify-batch', help='Verify many tokens, one per line or JSONL, in parallel')
+    batch_parser.add_argument('--input', default='-', help='File of tokens, or - for stdin (default)')
+    batch_parser.add_argument('--output', default='-', help='JSONL results file, or - for stdout (default)')
+    batch_parser.add_argument('--secret', required=True, help='Shared secret or public key PEM, or @file')
+    batch_parser.add_argument('--algorithm', default='HS256', help='JWT signing algorithm (default HS256)')
+    batch_parser.add_argument('--audience', help='Expected audience claim')
+    batch_parser.add_argument('--issuer', help='Expected issuer claim')
+    batch_parser.add_argument('--workers', type=_positive_int, default=os.cpu_count() or 1, help='Worker processes; 1 verifies in-process')
+    batch_parser.add_argument('--chunk-size', type=_positive_int, default=1000, help='Tokens sent to a worker at a time')
+    batch_parser.add_argument('--unordered', action='store_true', help='Emit results as chunks finish instead of in input order')
+    batch_parser.add_argument('--token-field', default='token', help='Field holding the token in JSONL input (default token)')
+
+    mint_parser = subparsers.add_parser('mint', help='Sign many tokens from a claims template, in parallel')
+    mint_parser.add_argument('--count', type=_positive_int, required=True, help='Tokens to mint')
+    mint_parser.add_argument('--output', default='-', help='Token file, or - for stdout (default)')
+    mint_parser.add_argument('--claims', default='{}', help='JSON claims template, or @file (default {})')
+    mint_parser.add_argument('--secret', action='append', required=True,
+                             help='Secret or private key PEM, or @file; repeat with --kid for several keys')
+    mint_parser.add_argument('--kid', action='append', help='kid header for the --secret in the same position')
+    mint_parser.add_argument('--algorithm', default='HS256', help='JWT signing algorithm (default HS256)')
+    mint_parser.add_argument('--lifetime', type=_range, default=(300, 300),
+                             help='exp - iat in seconds: N or MIN:MAX (default 300)')
+    mint_parser.add_argument('--iat-spread', type=int, default=0, help='Spread iat uniformly over this many seconds before now')
+    mint_parser.add_argument('--nbf', action='store_true', help='Add nbf = iat')
+    mint_parser.add_argument('--subjects', type=int, default=0, help='Set sub to one of this many user-N values')
+    mint_parser.add_argument('--broken-ratio', type=float, default=0.0, help='Share of tokens that must fail verification')
+    mint_parser.add_argument('--broken-kinds', type=lambda value: value.split(','),
+                             help=f'Comma-separated subset of {",".join(BROKEN_KINDS)} (default all that apply)')
+    mint_parser.add_argument('--format', choices=['lines', 'jsonl'], default='lines',
+                             help='One token per line, or JSONL with token and broken fields')
+    mint_parser.add_argument('--workers', type=_positive_int, default=os.cpu_count() or 1, help='Worker processes; 1 mints in-process')
+    mint_parser.add_argument('--chunk-size', type=_positive_int, default=10000, help='Tokens minted per worker task')
+    mint_parser.add_argument('--seed', type=int, help='Make the output reproducible')
+    mint_parser.add_argument('--now', type=float, help='Unix time to mint against (default: the current time)')
+
     args = parser.parse_args()
 
-    if args.command == 'decode':
+    if args.command == 'decode' and args.stream:
+        summary = decode_stream_command(_iter_token_bytes(args.input, args.token_field))
+        print(json.dumps(summary, indent=2))
+    elif args.command == 'decode':
         decode_command(args.token)
-    else:
+    elif args.command == 'verify':
         verify_command(args.token, args.secret, args.algorithm, args.audience, args.issuer)
+    elif args.command == 'mint':
+        settings = _mint_settings(args)
+        out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+        with out:
+            summary = mint_command(out, args.count, settings, workers=args.workers, chunk_size=args.chunk_size)
+        print(json.dumps(summary), file=sys.stderr)
+    else:
+        stream = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8')
+        out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+        with stream, out:
+            summary = verify_batch_command(
+                stream,
+                out,
+                _load_key(args.secret),
+                args.algorithm,
+                args.audience,
+                args.issuer,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+                ordered=not args.unordered,
+                token_field=args.token_field,
+            )
+        print(json.dumps(summary), file=sys.stderr)
 
 
 if __name__ == '__main__':
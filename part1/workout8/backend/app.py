@@ -2,23 +2,43 @@
 from __future__ import annotations
 
 import os
-from datetime import timedelta
-from typing import Any
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator
 
-from fastapi import Depends, FastAPI, HTTPException, status
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwt
-from jose.exceptions import ExpiredSignatureError, JWTClaimsError
+from fastapi import Depends, FastAPI, HTTPException, Response, status
 from pydantic import BaseModel
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "shared"))
+
+from authn_verify import (  # noqa: E402
+    Screening,
+    VerificationMetrics,
+    VerificationPolicy,
+    VerifiedToken,
+    Verifier,
+    Warmup,
+)
+from authn_verify.dependency import metrics_response, verified_token  # noqa: E402
+from authn_verify.shared_table import SharedVerifiedTokenCache  # noqa: E402
+
 TOKEN_SECRET = os.environ.get("WORKOUT8_TOKEN_SECRET", "workout8-demo-secret")
 TOKEN_ALG = os.environ.get("WORKOUT8_TOKEN_ALG", "HS256")
 EXPECTED_ISSUER = os.environ.get("WORKOUT8_ISSUER", "https://demo-issuer")
 EXPECTED_AUDIENCE = os.environ.get("WORKOUT8_AUDIENCE", "workout8-api")
 LEEWAY_SECONDS = int(os.environ.get("WORKOUT8_LEEWAY_SECONDS", "30"))
+VERIFIED_CACHE_SIZE = int(os.environ.get("WORKOUT8_VERIFIED_CACHE_SIZE", "0"))
+SHARED_STATE_DIR = os.environ.get("WORKOUT8_SHARED_STATE_DIR")
+
 
-bearer_scheme = HTTPBearer(auto_error=False)
-app = FastAPI(title="AuthN Workout 8")
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await WARMUP.run()
+    yield
+
+
+app = FastAPI(title="AuthN Workout 8", lifespan=lifespan)
 
 
 class ProtectedPayload(BaseModel):
@@ -26,70 +46,51 @@ class ProtectedPayload(BaseModel):
     claims: dict[str, Any]
 
 
-async def verify_token(
-    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
-) -> dict[str, Any]:
-    if credentials is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing Authorization header",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    token = credentials.credentials
-    try:
-        header = jwt.get_unverified_header(token)
-    except JWTError as exc:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token header",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from exc
-    alg = header.get("alg")
-    if alg != TOKEN_ALG:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Unexpected alg {alg}; expected {TOKEN_ALG}",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    try:
-        claims = jwt.decode(
-            token,
-            TOKEN_SECRET,
-            algorithms=[TOKEN_ALG],
-            audience=EXPECTED_AUDIENCE,
-            issuer=EXPECTED_ISSUER,
-            options={"leeway": timedelta(seconds=LEEWAY_SECONDS)},
-        )
-    except ExpiredSignatureError as exc:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token expired",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from exc
-    except JWTClaimsError as exc:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Claim verification failed: {exc}",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from exc
-    except JWTError as exc:
-        detail = "Signature verification failed" if "Signature verification failed" in str(exc) else "Token verification failed"
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=detail,
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from exc
-
-    return claims
+METRICS = VerificationMetrics()
+
+# Opt-in cache of verified claims; disabled unless WORKOUT8_VERIFIED_CACHE_SIZE > 0
+SHARED_VERIFIED_CACHE = (
+    SharedVerifiedTokenCache(
+        os.path.join(SHARED_STATE_DIR, "workout8-verified.tbl"), VERIFIED_CACHE_SIZE, LEEWAY_SECONDS
+    )
+    if SHARED_STATE_DIR and VERIFIED_CACHE_SIZE > 0
+    else None
+)
+SCREENING = Screening.from_env("WORKOUT8")
+VERIFIER = Verifier(
+    VerificationPolicy(
+        algorithms=(TOKEN_ALG,),
+        secret=TOKEN_SECRET,
+        issuer=EXPECTED_ISSUER,
+        audience=EXPECTED_AUDIENCE,
+        leeway_seconds=LEEWAY_SECONDS,
+        verified_cache_size=VERIFIED_CACHE_SIZE,
+        verified_cache=SHARED_VERIFIED_CACHE,
+        prefilter=SCREENING.prefilter,
+    ),
+    metrics=METRICS,
+)
+WARMUP = Warmup(VERIFIER)
+
+SCREENING.install(app, VERIFIER)
+
+
+async def verify_token(token: VerifiedToken = Depends(verified_token)) -> dict[str, Any]:
+    return token.claims
 
 
 @app.get("/health")
 async def health_check() -> dict[str, str]:
+    if not await WARMUP.check():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=WARMUP.detail)
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics() -> Response:
+    return metrics_response(METRICS)
+
+
 @app.get("/protected", response_model=ProtectedPayload)
 async def protected_endpoint(claims: dict[str, Any] = Depends(verify_token)) -> ProtectedPayload:
     return ProtectedPayload(message="Protected action succeeded", claims=claims)
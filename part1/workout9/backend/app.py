@@ -2,24 +2,73 @@
 from __future__ import annotations
 
 import os
-import time
-from datetime import timedelta
-from typing import Any
-
-from fastapi import Depends, FastAPI, HTTPException, status
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwt
-from jose.exceptions import ExpiredSignatureError, JWTClaimsError
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+from fastapi import Depends, FastAPI, HTTPException, Response, status
 from pydantic import BaseModel
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "shared"))
+
+from authn_verify import (  # noqa: E402
+    Screening,
+    VerificationMetrics,
+    VerificationPolicy,
+    VerifiedToken,
+    Verifier,
+    Warmup,
+    build_replay_cache,
+)
+from authn_verify.dependency import metrics_response, verified_token  # noqa: E402
+from authn_verify.shared_table import SharedVerifiedTokenCache, default_state_dir  # noqa: E402
+
 TOKEN_SECRET = os.environ.get("WORKOUT9_TOKEN_SECRET", "workout9-demo-secret")
 TOKEN_ALG = os.environ.get("WORKOUT9_TOKEN_ALG", "HS256")
 EXPECTED_ISSUER = os.environ.get("WORKOUT9_ISSUER", "https://demo-issuer")
 EXPECTED_AUDIENCE = os.environ.get("WORKOUT9_AUDIENCE", "workout9-api")
 LEEWAY_SECONDS = int(os.environ.get("WORKOUT9_LEEWAY_SECONDS", "30"))
+VERIFIED_CACHE_SIZE = int(os.environ.get("WORKOUT9_VERIFIED_CACHE_SIZE", "0"))
+SHARED_STATE_DIR = os.environ.get("WORKOUT9_SHARED_STATE_DIR")
+REPLAY_BACKEND = os.environ.get("WORKOUT9_REPLAY_BACKEND", "shared" if SHARED_STATE_DIR else "memory")
+REPLAY_SHARDS = int(os.environ.get("WORKOUT9_REPLAY_SHARDS", "16"))
+REPLAY_MAX_ENTRIES = int(os.environ.get("WORKOUT9_REPLAY_MAX_ENTRIES", "1000000"))
+REPLAY_OVERFLOW = os.environ.get("WORKOUT9_REPLAY_OVERFLOW", "reject")
+REDIS_URL = os.environ.get("WORKOUT9_REDIS_URL")
+REDIS_TIMEOUT_MS = float(os.environ.get("WORKOUT9_REDIS_TIMEOUT_MS", "50"))
+REPLAY_FAILURE_POLICY = os.environ.get("WORKOUT9_REPLAY_FAILURE_POLICY", "closed")
+REPLAY_BUCKET_SECONDS = float(os.environ.get("WORKOUT9_REPLAY_BUCKET_SECONDS", "300"))
+REPLAY_FP_RATE = float(os.environ.get("WORKOUT9_REPLAY_FP_RATE", "0.01"))
+
+
+def _worker_count() -> int:
+    """Workers this app is deployed with: ``WORKOUT9_WORKERS``, else ``WEB_CONCURRENCY``."""
+    # A worker cannot see the server's --workers flag, so the deployment has to say how many there are.
+    # uvicorn and gunicorn read WEB_CONCURRENCY as their default worker count.
+    name = "WORKOUT9_WORKERS" if "WORKOUT9_WORKERS" in os.environ else "WEB_CONCURRENCY"
+    value = os.environ.get(name, "1")
+    if not value.strip().isdigit() or int(value) < 1:
+        raise RuntimeError(f"{name} must be a whole number of workers, at least 1; got {value!r}")
+    return int(value)
+
+
+WORKERS = _worker_count()
 
-bearer_scheme = HTTPBearer(auto_error=False)
-app = FastAPI(title="AuthN Workout 9")
+if WORKERS > 1 and REPLAY_BACKEND in {"memory", "compact"}:
+    raise RuntimeError(
+        "Each worker would keep its own jti set and accept replays; "
+        "set WORKOUT9_SHARED_STATE_DIR or use the redis replay backend"
+    )
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await WARMUP.run()
+    yield
+
+
+app = FastAPI(title="AuthN Workout 9", lifespan=lifespan)
 
 
 class ProtectedPayload(BaseModel):
@@ -27,106 +76,73 @@ class ProtectedPayload(BaseModel):
     claims: dict[str, Any]
 
 
-# In-memory replay cache: jti -> expiry timestamp
-REPLAY_CACHE: dict[str, float] = {}
-
-
-def purge_replay_cache() -> None:
-    now = time.time()
-    expired = [jti for jti, expiry in REPLAY_CACHE.items() if expiry <= now]
-    for jti in expired:
-        REPLAY_CACHE.pop(jti, None)
-
-
-async def verify_token(
-    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
-) -> dict[str, Any]:
-    if credentials is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing Authorization header",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    token = credentials.credentials
-    try:
-        header = jwt.get_unverified_header(token)
-    except JWTError as exc:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token header",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from exc
-
-    if header.get("alg") != TOKEN_ALG:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Unexpected alg {header.get('alg')}; expected {TOKEN_ALG}",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    try:
-        claims = jwt.decode(
-            token,
-            TOKEN_SECRET,
-            algorithms=[TOKEN_ALG],
-            audience=EXPECTED_AUDIENCE,
-            issuer=EXPECTED_ISSUER,
-            options={"leeway": timedelta(seconds=LEEWAY_SECONDS)},
-        )
-    except ExpiredSignatureError as exc:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token expired",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from exc
-    except JWTClaimsError as exc:
-        detail = str(exc)
-        if "NotBefore" in detail:
-            detail = "Token not valid yet"
-        else:
-            detail = f"Claim verification failed: {detail}"
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=detail,
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from exc
-    except JWTError as exc:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token verification failed",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from exc
-
-    jti = claims.get("jti")
-    if not jti:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing jti claim",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    purge_replay_cache()
-    now = time.time()
-    expiry_ts = float(claims.get("exp", now))
-    existing_expiry = REPLAY_CACHE.get(jti)
-    if existing_expiry and existing_expiry > now:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Token replay detected",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    REPLAY_CACHE[jti] = expiry_ts
-
-    return claims
+# Replay cache: remembers each jti until its exp (plus leeway) passes
+REPLAY_CACHE = build_replay_cache(
+    REPLAY_BACKEND,
+    shards=REPLAY_SHARDS,
+    max_entries=REPLAY_MAX_ENTRIES,
+    overflow=REPLAY_OVERFLOW,
+    redis_url=REDIS_URL,
+    bucket_seconds=REPLAY_BUCKET_SECONDS,
+    fp_rate=REPLAY_FP_RATE,
+    redis_prefix="workout9:jti:",
+    redis_timeout=REDIS_TIMEOUT_MS / 1000,
+    failure_policy=REPLAY_FAILURE_POLICY,
+    shared_path=os.path.join(SHARED_STATE_DIR or default_state_dir(), "workout9-replay.tbl"),
+)
+
+
+METRICS = VerificationMetrics()
+
+# Opt-in cache of verified claims; disabled unless WORKOUT9_VERIFIED_CACHE_SIZE > 0
+SHARED_VERIFIED_CACHE = (
+    SharedVerifiedTokenCache(
+        os.path.join(SHARED_STATE_DIR, "workout9-verified.tbl"), VERIFIED_CACHE_SIZE, LEEWAY_SECONDS
+    )
+    if SHARED_STATE_DIR and VERIFIED_CACHE_SIZE > 0
+    else None
+)
+SCREENING = Screening.from_env("WORKOUT9")
+VERIFIER = Verifier(
+    VerificationPolicy(
+        algorithms=(TOKEN_ALG,),
+        secret=TOKEN_SECRET,
+        issuer=EXPECTED_ISSUER,
+        audience=EXPECTED_AUDIENCE,
+        leeway_seconds=LEEWAY_SECONDS,
+        replay=REPLAY_CACHE,
+        verified_cache_size=VERIFIED_CACHE_SIZE,
+        verified_cache=SHARED_VERIFIED_CACHE,
+        prefilter=SCREENING.prefilter,
+    ),
+    metrics=METRICS,
+)
+WARMUP = Warmup(VERIFIER)
+METRICS.poll("replay_entries", "gauge", "jti values currently remembered.", lambda: REPLAY_CACHE.stats().get("entries"))
+METRICS.poll(
+    "replay_accepted_unchecked_total", "counter", "Tokens accepted while the replay store was unavailable (fail-open).",
+    lambda: REPLAY_CACHE.stats().get("accepted_unchecked"),
+)
+
+SCREENING.install(app, VERIFIER)
+
+
+async def verify_token(token: VerifiedToken = Depends(verified_token)) -> dict[str, Any]:
+    return token.claims
 
 
 @app.get("/health")
 async def health_check() -> dict[str, str]:
+    if not await WARMUP.check():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=WARMUP.detail)
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics() -> Response:
+    return metrics_response(METRICS)
+
+
 @app.get("/protected", response_model=ProtectedPayload)
 async def protected_endpoint(claims: dict[str, Any] = Depends(verify_token)) -> ProtectedPayload:
     return ProtectedPayload(message="Protected action succeeded", claims=claims)
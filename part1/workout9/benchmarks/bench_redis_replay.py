@@ -0,0 +1,95 @@
+"""Measure the latency the redis replay backend adds, batched versus one SET per request.
+
+Runs against the in-process RESP stub unless --url points at a real server.
+
+Usage:
+    python bench_redis_replay.py --requests 4000 --concurrency 1 16 64
+    python bench_redis_replay.py --url redis://localhost:6379/0
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "shared"))
+
+from authn_verify.replay import RedisReplayCache  # noqa: E402
+from authn_verify.resp_stub import RespStubServer  # noqa: E402
+
+Check = Callable[[str, float], Awaitable[bool]]
+
+
+def per_call(cache: RedisReplayCache) -> Check:
+    """The previous backend: one ``SET NX PX`` round trip per request."""
+    client = cache._client  # noqa: SLF001 - share the connection pool
+
+    async def check(jti: str, expires_at: float) -> bool:
+        ttl_ms = max(1, int((expires_at - time.time()) * 1000))
+        return bool(await client.set(f"{cache._prefix}{jti}", b"1", nx=True, px=ttl_ms))  # noqa: SLF001
+
+    return check
+
+
+async def measure(check: Check, requests: int, concurrency: int) -> dict:
+    expires_at = time.time() + 600
+    latencies: list[float] = []
+
+    async def worker(count: int) -> None:
+        for _ in range(count):
+            started = time.perf_counter()
+            await check(uuid.uuid4().hex, expires_at)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "ops_per_sec": len(latencies) / elapsed,
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+    }
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    server = None
+    url = args.url
+    if url is None:
+        server = await RespStubServer(latency=args.latency_ms / 1000).start()
+        url = server.url
+    print(f"store: {url}")
+    print(f"{'mode':<10} {'conc':>5} {'ops/s':>10} {'p50 us':>9} {'p99 us':>9} {'mean batch':>11}")
+    try:
+        for concurrency in args.concurrency:
+            for mode in ("per-call", "batched"):
+                cache = RedisReplayCache.from_url(url, prefix=f"bench:{uuid.uuid4().hex}:", timeout=None)
+                check = per_call(cache) if mode == "per-call" else cache.check_and_store
+                await check("warmup", time.time() + 60)
+                result = await measure(check, args.requests, concurrency)
+                mean_batch = cache.stats()["mean_batch"] if mode == "batched" else 1
+                print(
+                    f"{mode:<10} {concurrency:>5} {result['ops_per_sec']:>10,.0f} "
+                    f"{result['p50_us']:>9.0f} {result['p99_us']:>9.0f} {mean_batch:>11}"
+                )
+                await cache._client.aclose()  # noqa: SLF001
+    finally:
+        if server is not None:
+            await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--url", help="Redis URL; defaults to an in-process stub")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Extra delay per stub round trip")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
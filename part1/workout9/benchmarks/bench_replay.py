@@ -0,0 +1,103 @@
+"""Compare memory and throughput of the workout 9 replay caches.
+
+Usage:
+    python bench_replay.py --entries 200000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "shared"))
+
+from authn_verify.replay import InMemoryReplayCache  # noqa: E402
+from authn_verify.replay_filter import CompactReplayFilter  # noqa: E402
+
+
+def dict_cache() -> Callable[[str, float], bool]:
+    """The original REPLAY_CACHE: jti -> expiry, without the per-request scan."""
+    cache: dict[str, float] = {}
+
+    def add(jti: str, expires_at: float) -> bool:
+        if jti in cache:
+            return False
+        cache[jti] = expires_at
+        return True
+
+    return add
+
+
+def measure(name: str, factory: Callable[[], Callable[[str, float], bool]], seeds: list[int], now: float) -> dict:
+    # Memory pass: build each jti inside the traced region, since the dict keeps
+    # the string alive and the filter does not.
+    gc.collect()
+    tracemalloc.start()
+    add = factory()
+    for seed in seeds:
+        add(str(uuid.UUID(int=seed)), now + 600)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del add
+
+    # Timing pass, untraced.
+    jtis = [str(uuid.UUID(int=seed)) for seed in seeds]
+    gc.collect()
+    add = factory()
+    started = time.perf_counter()
+    for jti in jtis:
+        add(jti, now + 600)
+    insert_s = time.perf_counter() - started
+
+    replays = jtis[:50_000]
+    started = time.perf_counter()
+    rejected = sum(not add(jti, now + 600) for jti in replays)
+    replay_s = time.perf_counter() - started
+    assert rejected == len(replays), f"{name} accepted a replay"
+
+    return {
+        "name": name,
+        "bytes_per_jti": retained / len(seeds),
+        "insert_ops": len(seeds) / insert_s,
+        "replay_ops": len(replays) / replay_s,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=200_000)
+    parser.add_argument("--fp-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    now = time.time()
+    seeds = [uuid.uuid4().int for _ in range(args.entries)]
+
+    def memory_cache() -> Callable[[str, float], bool]:
+        cache = InMemoryReplayCache(max_entries=args.entries * 2)
+        return lambda jti, exp: cache.add(jti, exp, now)
+
+    def compact_cache() -> Callable[[str, float], bool]:
+        cache = CompactReplayFilter(fp_rate=args.fp_rate, max_entries=args.entries * 2)
+        return lambda jti, exp: cache.add(jti, exp, now)
+
+    results = [
+        measure("dict (REPLAY_CACHE)", dict_cache, seeds, now),
+        measure("sharded heap", memory_cache, seeds, now),
+        measure(f"compact (fp={args.fp_rate})", compact_cache, seeds, now),
+    ]
+    baseline = results[0]["bytes_per_jti"]
+    print(f"{'backend':<22} {'B/jti':>8} {'vs dict':>8} {'insert/s':>11} {'replay/s':>11}")
+    for row in results:
+        print(
+            f"{row['name']:<22} {row['bytes_per_jti']:>8.1f} {baseline / row['bytes_per_jti']:>7.1f}x "
+            f"{row['insert_ops']:>11,.0f} {row['replay_ops']:>11,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Workout 9's start-up checks: which worker counts and replay backends it refuses."""
+from __future__ import annotations
+
+import importlib.util
+import sys
+from pathlib import Path
+from types import ModuleType
+
+import pytest
+
+APP = Path(__file__).resolve().parents[1] / "backend" / "app.py"
+
+
+def _load(monkeypatch: pytest.MonkeyPatch, **env: str) -> ModuleType:
+    for name in ("WORKOUT9_WORKERS", "WEB_CONCURRENCY", "WORKOUT9_SHARED_STATE_DIR", "WORKOUT9_REPLAY_BACKEND"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    spec = importlib.util.spec_from_file_location("workout9_app", APP)
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, spec.name, module)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_one_worker_by_default(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert _load(monkeypatch).WORKERS == 1
+
+
+def test_workers_setting_wins_over_web_concurrency(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert _load(monkeypatch, WORKOUT9_WORKERS="1", WEB_CONCURRENCY="4").WORKERS == 1
+
+
+@pytest.mark.parametrize("env", [{"WORKOUT9_WORKERS": "4"}, {"WEB_CONCURRENCY": "2"}])
+def test_in_process_replay_cache_is_refused_with_several_workers(
+    monkeypatch: pytest.MonkeyPatch, env: dict[str, str]
+) -> None:
+    with pytest.raises(RuntimeError, match="own jti set"):
+        _load(monkeypatch, **env)
+
+
+def test_shared_replay_cache_allows_several_workers(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    module = _load(monkeypatch, WORKOUT9_WORKERS="4", WORKOUT9_SHARED_STATE_DIR=str(tmp_path))
+    assert module.WORKERS == 4
+    assert module.REPLAY_BACKEND == "shared"
+
+
+@pytest.mark.parametrize(
+    "env,name",
+    [
+        ({"WORKOUT9_WORKERS": "four"}, "WORKOUT9_WORKERS"),
+        ({"WORKOUT9_WORKERS": "0"}, "WORKOUT9_WORKERS"),
+        ({"WORKOUT9_WORKERS": "-2"}, "WORKOUT9_WORKERS"),
+        ({"WEB_CONCURRENCY": ""}, "WEB_CONCURRENCY"),
+    ],
+)
+def test_invalid_worker_count(monkeypatch: pytest.MonkeyPatch, env: dict[str, str], name: str) -> None:
+    with pytest.raises(RuntimeError, match=f"^{name} must be a whole number"):
+        _load(monkeypatch, **env)
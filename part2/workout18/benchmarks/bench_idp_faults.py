@@ -0,0 +1,175 @@
+"""Measure Service B's /data latency while the IdP is slow, flaky, or down, with and without the introspection guard.
+
+Service B runs in-process over an in-memory ASGI transport, and its
+introspection client talks to a fault-injecting mock IdP. Each scenario
+sends ``--requests`` distinct opaque tokens at ``--concurrency`` in flight,
+so every request misses the cache and needs the IdP. ``unguarded`` is the
+old behaviour: one attempt, bounded only by the 5 s client timeout, and no
+breaker. ``guarded`` uses the app's configured budget, hedging, breaker,
+and stale cache.
+
+Usage:
+    python bench_idp_faults.py --requests 200 --concurrency 20
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+SERVICE_B = Path(__file__).resolve().parents[1] / "service_b"
+sys.path.insert(0, str(SERVICE_B))
+
+os.environ.update(
+    WORKOUT18_INTROSPECT_URL="http://idp/oauth2/introspect",
+    WORKOUT18_RESOURCE_CLIENT_ID="service-b",
+    WORKOUT18_RESOURCE_CLIENT_SECRET="service-b-secret",
+    WORKOUT18_FAILURE_BURST="0",
+)
+
+import app as service_b  # noqa: E402
+from introspection_cache import IntrospectionCache  # noqa: E402
+from resilience import CircuitBreaker, GuardedCall  # noqa: E402
+
+UNGUARDED_TIMEOUT = service_b.INTROSPECT_TIMEOUT_SECONDS
+
+
+class FaultyIdP:
+    """Answers introspection after ``latency`` seconds, with a slow tail and an error rate."""
+
+    def __init__(self, latency: float, tail_rate: float = 0.0, tail: float = 0.0, error_rate: float = 0.0) -> None:
+        self.latency = latency
+        self.tail_rate = tail_rate
+        self.tail = tail
+        self.error_rate = error_rate
+        self.calls = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if random.random() < self.error_rate:
+            raise httpx.ConnectError("connection refused", request=request)
+        delay = self.tail if random.random() < self.tail_rate else self.latency
+        # The unguarded client still has its transport timeout.
+        if delay >= UNGUARDED_TIMEOUT:
+            await asyncio.sleep(UNGUARDED_TIMEOUT)
+            raise httpx.ReadTimeout("timed out", request=request)
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={"active": True, "sub": "svc-a", "exp": int(time.time()) + 3600})
+
+
+SCENARIOS = {
+    "healthy": lambda: FaultyIdP(0.02),
+    "slow tail (5% at 800 ms)": lambda: FaultyIdP(0.02, tail_rate=0.05, tail=0.8),
+    "degraded (all 2 s)": lambda: FaultyIdP(2.0),
+    "down (connection refused)": lambda: FaultyIdP(0.001, error_rate=1.0),
+}
+
+
+def _configure(guarded: bool) -> None:
+    if guarded:
+        service_b.introspection_guard = GuardedCall(
+            CircuitBreaker(service_b.BREAKER_FAILURES, service_b.BREAKER_RESET_SECONDS),
+            budget=service_b.INTROSPECT_BUDGET_MS / 1000,
+            max_hedges=service_b.INTROSPECT_MAX_HEDGES,
+            hedge_quantile=service_b.INTROSPECT_HEDGE_QUANTILE,
+            hedge_min_delay=service_b.INTROSPECT_HEDGE_MIN_MS / 1000,
+        )
+    else:
+        service_b.introspection_guard = GuardedCall(
+            CircuitBreaker(failure_threshold=10**9), budget=UNGUARDED_TIMEOUT + 1, max_hedges=0
+        )
+    service_b.introspection_cache = IntrospectionCache(stale_ttl=service_b.CACHE_STALE_SECONDS if guarded else 0)
+    service_b.introspection_flight = service_b.SingleFlight()
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+
+async def _warm(client: httpx.AsyncClient, requests: int, concurrency: int) -> None:
+    """Teach the guard what healthy IdP latency looks like before the fault starts."""
+    await _drive(client, [f"warm-{uuid.uuid4().hex}" for _ in range(requests)], concurrency)
+
+
+async def _drive(client: httpx.AsyncClient, tokens: list[str], concurrency: int) -> tuple[list[float], Counter]:
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    queue = iter(tokens)
+
+    async def worker() -> None:
+        for token in queue:
+            started = time.perf_counter()
+            response = await client.get("/data", headers={"Authorization": f"Bearer {token}"})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses
+
+
+async def run(requests: int, concurrency: int) -> None:
+    print(
+        f"budget {service_b.INTROSPECT_BUDGET_MS:.0f} ms, hedges {service_b.INTROSPECT_MAX_HEDGES}, "
+        f"breaker {service_b.BREAKER_FAILURES} failures / {service_b.BREAKER_RESET_SECONDS:.0f} s"
+    )
+    print(f"{'scenario':<27} {'mode':<10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'IdP calls':>10}  statuses")
+    transport = httpx.ASGITransport(app=service_b.app)
+    for name, make_idp in SCENARIOS.items():
+        for guarded in (False, True):
+            _configure(guarded)
+            idp = FaultyIdP(0.02)
+            service_b.http_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: idp(request)))
+            async with httpx.AsyncClient(transport=transport, base_url="http://service-b") as client:
+                await _warm(client, 60, concurrency)
+                idp = make_idp()
+                tokens = [f"opaque-{uuid.uuid4().hex}" for _ in range(requests)]
+                latencies, statuses = await _drive(client, tokens, concurrency)
+            await service_b.http_client.aclose()
+            mode = "guarded" if guarded else "unguarded"
+            codes = " ".join(f"{code}:{count}" for code, count in sorted(statuses.items()))
+            print(
+                f"{name:<27} {mode:<10} {_percentile(latencies, 0.5):>8.1f} {_percentile(latencies, 0.99):>8.1f} "
+                f"{max(latencies) * 1000:>8.1f} {idp.calls:>10}  {codes}"
+            )
+    await _stale_demo(concurrency)
+
+
+async def _stale_demo(concurrency: int) -> None:
+    """Tokens seen shortly before an outage keep working from the stale cache."""
+    _configure(True)
+    service_b.introspection_cache = IntrospectionCache(max_ttl=0.05, stale_ttl=service_b.CACHE_STALE_SECONDS)
+    idp: Any = FaultyIdP(0.02)
+    service_b.http_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: idp(request)))
+    tokens = [f"opaque-{uuid.uuid4().hex}" for _ in range(50)]
+    transport = httpx.ASGITransport(app=service_b.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://service-b") as client:
+        await _drive(client, tokens, concurrency)
+        await asyncio.sleep(0.1)
+        idp = FaultyIdP(0.001, error_rate=1.0)
+        _, statuses = await _drive(client, tokens, concurrency)
+    await service_b.http_client.aclose()
+    codes = " ".join(f"{code}:{count}" for code, count in sorted(statuses.items()))
+    print(f"\nknown tokens after their cache TTL, IdP down: {codes} (stale answers: "
+          f"{service_b.introspection_cache.stats()['stale_hits']})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Concurrent load driver for the Service A -> Service B call path."""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def introspection_ms(response: httpx.Response) -> float | None:
+    """Read Service B's ``Server-Timing: introspect;dur=<ms>`` entry."""
+    header = response.headers.get("server-timing")
+    if not header:
+        return None
+    for metric in header.split(","):
+        name, _, params = metric.strip().partition(";")
+        if name != "introspect":
+            continue
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                try:
+                    return float(value)
+                except ValueError:
+                    return None
+    return None
+
+
+@dataclass
+class LoadReport:
+    elapsed: float = 0.0
+    latencies_ms: list[float] = field(default_factory=list)
+    introspection_ms: list[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    errors: Counter = field(default_factory=Counter)
+
+    @property
+    def total(self) -> int:
+        return sum(self.statuses.values()) + sum(self.errors.values())
+
+    def summary(self) -> dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+        introspection = sorted(self.introspection_ms)
+        return {
+            "requests": self.total,
+            "elapsed_s": round(self.elapsed, 3),
+            "throughput_rps": round(self.total / self.elapsed, 1) if self.elapsed else 0.0,
+            "latency_ms": {p: round(percentile(latencies, float(p[1:])), 2) for p in ("p50", "p95", "p99")},
+            "introspection_ms": {
+                p: round(percentile(introspection, float(p[1:])), 2) for p in ("p50", "p95", "p99")
+            },
+            "status_counts": dict(self.statuses),
+            "errors": dict(self.errors),
+        }
+
+
+async def run_load(
+    url: str,
+    token: str,
+    *,
+    concurrency: int = 16,
+    rps: float = 0.0,
+    duration: float = 10.0,
+    max_requests: int | None = None,
+    timeout: float = 10.0,
+) -> LoadReport:
+    """Drive ``GET url`` with a bearer token from ``concurrency`` workers.
+
+    With ``rps`` > 0 requests are scheduled on a fixed open-loop timetable and
+    latency is measured from the scheduled start, so a backed-up server shows
+    up as latency instead of silently lowering the offered load. With
+    ``rps`` = 0 each worker sends its next request as soon as the last one
+    returns.
+    """
+    report = LoadReport()
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    issued = 0
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def next_slot() -> float | None:
+        nonlocal issued
+        if max_requests is not None and issued >= max_requests:
+            return None
+        slot = start + issued / rps if rps > 0 else time.perf_counter()
+        if slot >= deadline:
+            return None
+        issued += 1
+        return slot
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        while (slot := next_slot()) is not None:
+            delay = slot - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                resp = await client.get(url, headers=headers)
+            except httpx.HTTPError as exc:
+                report.errors[type(exc).__name__] += 1
+                continue
+            report.latencies_ms.append((time.perf_counter() - slot) * 1000)
+            report.statuses[resp.status_code] += 1
+            spent = introspection_ms(resp)
+            if spent is not None:
+                report.introspection_ms.append(spent)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    report.elapsed = time.perf_counter() - start
+    return report
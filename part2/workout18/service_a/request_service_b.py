@@ -1,12 +1,18 @@
 """Service A: obtain a client_credentials token and call Service B."""
 from __future__ import annotations
 
+import argparse
+import asyncio
+import json
 import os
 import sys
 from typing import Any
 
 import requests
 
+from load_driver import run_load
+from token_manager import ClientCredentialsTokenManager
+
 ISSUER = os.environ.get("WORKOUT18_ISSUER")
 CLIENT_ID = os.environ.get("WORKOUT18_CLIENT_ID")
 CLIENT_SECRET = os.environ.get("WORKOUT18_CLIENT_SECRET")
@@ -18,32 +24,20 @@ if any(v is None for v in REQUIRED):
     sys.exit("WORKOUT18_ISSUER, WORKOUT18_CLIENT_ID, WORKOUT18_CLIENT_SECRET must be set")
 
 
+session = requests.Session()
+token_manager = ClientCredentialsTokenManager(
+    f"{ISSUER.rstrip('/')}/token",
+    CLIENT_ID,
+    CLIENT_SECRET,
+)
+
+
 def fetch_token() -> str:
-    token_url = f"{ISSUER.rstrip('/')}/token"
-    payload = {
-        "grant_type": "client_credentials",
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-    }
-    if SCOPE:
-        payload["scope"] = SCOPE
-
-    resp = requests.post(
-        token_url,
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        data=payload,
-        timeout=10,
-    )
-    resp.raise_for_status()
-    data = resp.json()
-    token = data.get("access_token")
-    if not token:
-        raise RuntimeError(f"Token response missing access_token: {data}")
-    return token
+    return token_manager.get_token(SCOPE or None)
 
 
 def call_service_b(token: str) -> dict[str, Any]:
-    resp = requests.get(
+    resp = session.get(
         SERVICE_B_URL,
         headers={"Authorization": f"Bearer {token}"},
         timeout=10,
@@ -58,7 +52,39 @@ def mask(token: str) -> str:
     return f"{token[:8]}…{token[-6:]}"
 
 
+def run_load_mode(args: argparse.Namespace) -> None:
+    token = fetch_token()
+    print(f"Access token (masked): {mask(token)}")
+    print(
+        f"Driving {SERVICE_B_URL} with concurrency={args.concurrency} "
+        f"rps={args.rps or 'unbounded'} duration={args.duration}s"
+    )
+    report = asyncio.run(
+        run_load(
+            SERVICE_B_URL,
+            token,
+            concurrency=args.concurrency,
+            rps=args.rps,
+            duration=args.duration,
+            max_requests=args.requests,
+        )
+    )
+    print(json.dumps(report.summary(), indent=2))
+
+
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Call Service B with a client_credentials token")
+    parser.add_argument("--load", action="store_true", help="Put the A->B path under concurrent load")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent workers in --load mode")
+    parser.add_argument("--rps", type=float, default=0.0, help="Target requests/sec (0 = as fast as possible)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Load duration in seconds")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    args = parser.parse_args()
+
+    if args.load:
+        run_load_mode(args)
+        return
+
     token = fetch_token()
     print(f"Access token (masked): {mask(token)}")
     data = call_service_b(token)
@@ -0,0 +1,202 @@
+"""Client-credentials token manager with caching and proactive refresh."""
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import httpx
+import requests
+
+TokenKey = tuple[str, str]
+
+
+@dataclass(frozen=True)
+class CachedToken:
+    access_token: str
+    expires_at: float
+    refresh_at: float
+
+
+class ClientCredentialsTokenManager:
+    """Cache client_credentials access tokens per (client, scope).
+
+    A cached token is served until ``refresh_at``, which sits
+    ``refresh_ratio`` of the token lifetime before expiry minus a random
+    jitter so a fleet of callers does not refresh in lockstep. Past
+    ``refresh_at`` the current token is still returned while one background
+    refresh runs; only a missing or expired token blocks the caller.
+    Concurrent refreshes for the same key are collapsed into one request;
+    refreshes for different keys run in parallel. ``requests.Session`` is
+    not thread-safe, so each thread that refreshes gets its own session
+    from ``session_factory``.
+    """
+
+    def __init__(
+        self,
+        token_url: str,
+        client_id: str,
+        client_secret: str,
+        *,
+        refresh_ratio: float = 0.2,
+        jitter_ratio: float = 0.05,
+        expiry_skew: float = 5.0,
+        default_lifetime: float = 300.0,
+        timeout: float = 10.0,
+        session_factory: Callable[[], requests.Session] = requests.Session,
+        async_client: httpx.AsyncClient | None = None,
+    ) -> None:
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_ratio = refresh_ratio
+        self.jitter_ratio = jitter_ratio
+        self.expiry_skew = expiry_skew
+        self.default_lifetime = default_lifetime
+        self.timeout = timeout
+        self._session_factory = session_factory
+        self._sessions = threading.local()
+        self._async_client = async_client
+        self._tokens: dict[TokenKey, CachedToken] = {}
+        self._lock = threading.Lock()
+        self._key_locks: dict[TokenKey, threading.Lock] = {}
+        self._background: set[TokenKey] = set()
+        self._async_inflight: dict[TokenKey, asyncio.Task] = {}
+        self.fetches = 0
+
+    # Sync API -----------------------------------------------------------
+
+    @property
+    def session(self) -> requests.Session:
+        """The calling thread's session, created on first use."""
+        session = getattr(self._sessions, "session", None)
+        if session is None:
+            session = self._sessions.session = self._session_factory()
+        return session
+
+    def get_token(self, scope: str | None = None) -> str:
+        key = (self.client_id, scope or "")
+        entry = self._tokens.get(key)
+        now = time.time()
+        if entry is not None and now < entry.refresh_at:
+            return entry.access_token
+        if entry is not None and now < entry.expires_at - self.expiry_skew:
+            self._refresh_in_background(key)
+            return entry.access_token
+        return self._refresh(key).access_token
+
+    def _refresh(self, key: TokenKey) -> CachedToken:
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another thread may have refreshed while we waited for the lock.
+            entry = self._tokens.get(key)
+            if entry is not None and time.time() < entry.refresh_at:
+                return entry
+            resp = self.session.post(
+                self.token_url,
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+                data=self._form(key[1]),
+                timeout=self.timeout,
+            )
+            resp.raise_for_status()
+            return self._store(key, resp.json())
+
+    def _refresh_in_background(self, key: TokenKey) -> None:
+        with self._lock:
+            if key in self._background:
+                return
+            self._background.add(key)
+
+        def run() -> None:
+            try:
+                self._refresh(key)
+            except (requests.RequestException, RuntimeError):
+                # The current token stays valid; the next caller retries.
+                pass
+            finally:
+                with self._lock:
+                    self._background.discard(key)
+                # The thread ends here; close its session rather than leave the connection to the collector.
+                session = getattr(self._sessions, "session", None)
+                if session is not None:
+                    session.close()
+
+        threading.Thread(target=run, name="token-refresh", daemon=True).start()
+
+    # Async API ----------------------------------------------------------
+
+    async def aget_token(self, scope: str | None = None) -> str:
+        key = (self.client_id, scope or "")
+        entry = self._tokens.get(key)
+        now = time.time()
+        if entry is not None and now < entry.refresh_at:
+            return entry.access_token
+        task = self._async_refresh_task(key)
+        if entry is not None and now < entry.expires_at - self.expiry_skew:
+            return entry.access_token
+        return (await asyncio.shield(task)).access_token
+
+    def _async_refresh_task(self, key: TokenKey) -> asyncio.Task:
+        task = self._async_inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._arefresh(key))
+            self._async_inflight[key] = task
+            task.add_done_callback(lambda done: self._async_done(key, done))
+        return task
+
+    async def _arefresh(self, key: TokenKey) -> CachedToken:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(timeout=self.timeout)
+        resp = await self._async_client.post(
+            self.token_url,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            data=self._form(key[1]),
+        )
+        resp.raise_for_status()
+        return self._store(key, resp.json())
+
+    def _async_done(self, key: TokenKey, task: asyncio.Task) -> None:
+        if self._async_inflight.get(key) is task:
+            del self._async_inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    # Shared helpers -----------------------------------------------------
+
+    def invalidate(self, scope: str | None = None) -> None:
+        self._tokens.pop((self.client_id, scope or ""), None)
+
+    def _form(self, scope: str) -> dict[str, str]:
+        payload = {
+            "grant_type": "client_credentials",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+        }
+        if scope:
+            payload["scope"] = scope
+        return payload
+
+    def _store(self, key: TokenKey, data: dict[str, Any]) -> CachedToken:
+        token = data.get("access_token")
+        if not token:
+            raise RuntimeError(f"Token response missing access_token: {data}")
+        lifetime = float(data.get("expires_in") or self.default_lifetime)
+        now = time.time()
+        jitter = random.uniform(0, lifetime * self.jitter_ratio)
+        entry = CachedToken(
+            access_token=token,
+            expires_at=now + lifetime,
+            refresh_at=now + lifetime * (1 - self.refresh_ratio) - jitter,
+        )
+        self._tokens[key] = entry
+        self.fetches += 1
+        return entry
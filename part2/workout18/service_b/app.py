@@ -1,44 +1,202 @@
-"""Service B: resource server that verifies tokens via introspection."""
+"""Service B: resource server that verifies tokens via introspection or local JWT checks."""
 from __future__ import annotations
 
 import os
-from typing import Any
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator
 
 import httpx
-from fastapi import Depends, FastAPI, HTTPException, status
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, Response, status
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "shared"))
+
+from introspection_cache import IntrospectionCache, SharedIntrospectionCache, token_digest  # noqa: E402
+from resilience import STATES, BudgetExceededError, CircuitBreaker, CircuitOpenError, GuardedCall  # noqa: E402
+from singleflight import SingleFlight  # noqa: E402
+
+from authn_verify import (  # noqa: E402
+    JwksManager,
+    OidcDiscovery,
+    Screening,
+    VerificationError,
+    VerificationMetrics,
+    VerificationPolicy,
+    VerifiedToken,
+    Verifier,
+    Warmup,
+)
+from authn_verify.dependency import metrics_response, verified_token  # noqa: E402
+from authn_verify.shared_table import shared_jwks_loader  # noqa: E402
 
 INTROSPECT_URL = os.environ.get("WORKOUT18_INTROSPECT_URL")
 RESOURCE_CLIENT_ID = os.environ.get("WORKOUT18_RESOURCE_CLIENT_ID")
 RESOURCE_CLIENT_SECRET = os.environ.get("WORKOUT18_RESOURCE_CLIENT_SECRET")
 EXPECTED_AUD = os.environ.get("WORKOUT18_EXPECTED_AUD")
+VERIFY_STRATEGY = os.environ.get("WORKOUT18_VERIFY_STRATEGY", "introspect")
+ISSUER = os.environ.get("WORKOUT18_ISSUER")
+JWKS_REFRESH_SECONDS = float(os.environ.get("WORKOUT18_JWKS_REFRESH_SECONDS", "300"))
+JWKS_MIN_REFETCH_SECONDS = float(os.environ.get("WORKOUT18_JWKS_MIN_REFETCH_SECONDS", "30"))
+LEEWAY_SECONDS = int(os.environ.get("WORKOUT18_LEEWAY_SECONDS", "30"))
+CACHE_ENABLED = os.environ.get("WORKOUT18_CACHE_ENABLED", "1") == "1"
+CACHE_MAX_TTL_SECONDS = float(os.environ.get("WORKOUT18_CACHE_MAX_TTL_SECONDS", "60"))
+CACHE_NEGATIVE_TTL_SECONDS = float(os.environ.get("WORKOUT18_CACHE_NEGATIVE_TTL_SECONDS", "5"))
+CACHE_MAX_ENTRIES = int(os.environ.get("WORKOUT18_CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.environ.get("WORKOUT18_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+CACHE_STALE_SECONDS = float(os.environ.get("WORKOUT18_CACHE_STALE_SECONDS", "120"))
+INTROSPECT_TIMEOUT_SECONDS = float(os.environ.get("WORKOUT18_INTROSPECT_TIMEOUT_SECONDS", "5"))
+INTROSPECT_BUDGET_MS = float(os.environ.get("WORKOUT18_INTROSPECT_BUDGET_MS", "1000"))
+INTROSPECT_MAX_HEDGES = int(os.environ.get("WORKOUT18_INTROSPECT_MAX_HEDGES", "1"))
+INTROSPECT_HEDGE_QUANTILE = float(os.environ.get("WORKOUT18_INTROSPECT_HEDGE_QUANTILE", "0.95"))
+INTROSPECT_HEDGE_MIN_MS = float(os.environ.get("WORKOUT18_INTROSPECT_HEDGE_MIN_MS", "10"))
+BREAKER_FAILURES = int(os.environ.get("WORKOUT18_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("WORKOUT18_BREAKER_RESET_SECONDS", "10"))
+HTTP2_ENABLED = os.environ.get("WORKOUT18_HTTP2", "1") == "1"
+HTTP_MAX_CONNECTIONS = int(os.environ.get("WORKOUT18_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("WORKOUT18_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("WORKOUT18_HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+SHARED_STATE_DIR = os.environ.get("WORKOUT18_SHARED_STATE_DIR")
+OPAQUE_TOKEN_PATTERN = os.environ.get("WORKOUT18_OPAQUE_TOKEN_PATTERN")
+ADMIN_ENABLED = os.environ.get("WORKOUT18_ADMIN_ENABLED", "0") == "1"
 
-if not INTROSPECT_URL or not RESOURCE_CLIENT_ID or not RESOURCE_CLIENT_SECRET:
+if VERIFY_STRATEGY not in {"introspect", "jwks", "auto"}:
+    raise RuntimeError("WORKOUT18_VERIFY_STRATEGY must be introspect, jwks, or auto")
+if VERIFY_STRATEGY != "jwks" and (not INTROSPECT_URL or not RESOURCE_CLIENT_ID or not RESOURCE_CLIENT_SECRET):
     raise RuntimeError("Service B requires WORKOUT18_INTROSPECT_URL, *_CLIENT_ID, *_CLIENT_SECRET")
+if VERIFY_STRATEGY != "introspect" and not ISSUER:
+    raise RuntimeError("The jwks and auto strategies require WORKOUT18_ISSUER for discovery")
 
-bearer_scheme = HTTPBearer(auto_error=False)
-app = FastAPI(title="Workout 18 - Service B")
+http_client: httpx.AsyncClient | None = None
 
 
-async def introspect_token(token: str) -> dict[str, Any]:
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        resp = await client.post(
+def build_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=INTROSPECT_TIMEOUT_SECONDS,
+        http2=HTTP2_ENABLED,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global http_client
+    if http_client is None:
+        http_client = build_http_client()
+    return http_client
+
+
+discovery = OidcDiscovery(ISSUER or "", get_http_client)
+jwks_manager = JwksManager(
+    shared_jwks_loader(discovery.load_jwks, os.path.join(SHARED_STATE_DIR, "workout18-jwks.tbl"))
+    if SHARED_STATE_DIR
+    else discovery.load_jwks,
+    refresh_interval=JWKS_REFRESH_SECONDS,
+    min_refetch_interval=JWKS_MIN_REFETCH_SECONDS,
+)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    global http_client
+    http_client = build_http_client()
+    if VERIFY_STRATEGY != "introspect":
+        await jwks_manager.start()
+    await warmup.run()
+    try:
+        yield
+    finally:
+        await jwks_manager.stop()
+        await http_client.aclose()
+        http_client = None
+
+
+app = FastAPI(title="Workout 18 - Service B", lifespan=lifespan)
+
+introspection_cache = (
+    SharedIntrospectionCache(
+        os.path.join(SHARED_STATE_DIR, "workout18-introspection.tbl"),
+        max_ttl=CACHE_MAX_TTL_SECONDS,
+        negative_ttl=CACHE_NEGATIVE_TTL_SECONDS,
+        max_entries=CACHE_MAX_ENTRIES,
+        stale_ttl=CACHE_STALE_SECONDS,
+    )
+    if SHARED_STATE_DIR
+    else IntrospectionCache(
+        max_ttl=CACHE_MAX_TTL_SECONDS,
+        negative_ttl=CACHE_NEGATIVE_TTL_SECONDS,
+        max_entries=CACHE_MAX_ENTRIES,
+        max_bytes=CACHE_MAX_BYTES,
+        stale_ttl=CACHE_STALE_SECONDS,
+    )
+)
+introspection_flight = SingleFlight()
+# Bounds how long a slow or failing IdP can hold a request, and stops calling it while it is down.
+introspection_guard = GuardedCall(
+    CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_SECONDS),
+    budget=INTROSPECT_BUDGET_MS / 1000,
+    max_hedges=INTROSPECT_MAX_HEDGES,
+    hedge_quantile=INTROSPECT_HEDGE_QUANTILE,
+    hedge_min_delay=INTROSPECT_HEDGE_MIN_MS / 1000,
+)
+
+
+async def _post_introspection(token: str) -> dict[str, Any]:
+    try:
+        resp = await get_http_client().post(
             INTROSPECT_URL,
             data={"token": token},
             auth=(RESOURCE_CLIENT_ID, RESOURCE_CLIENT_SECRET),
             headers={"Content-Type": "application/x-www-form-urlencoded"},
         )
+    except httpx.HTTPError as exc:
+        # Raised inside BearerAuthMiddleware, outside FastAPI's exception handlers, so not an HTTPException.
+        raise VerificationError(
+            "Introspection failed: IdP unreachable",
+            reason="introspection_failed",
+            status_code=status.HTTP_502_BAD_GATEWAY,
+        ) from exc
     if resp.status_code != 200:
-        raise HTTPException(
+        raise VerificationError(
+            f"Introspection failed: {resp.status_code}",
+            reason="introspection_failed",
             status_code=status.HTTP_502_BAD_GATEWAY,
-            detail=f"Introspection failed: {resp.status_code}",
         )
-    payload = resp.json()
-    if not payload.get("active"):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token inactive",
+    try:
+        payload = resp.json()
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        # A proxy error page or a truncated body is the IdP failing, not the token.
+        raise VerificationError(
+            "Introspection failed: invalid response",
+            reason="introspection_failed",
+            status_code=status.HTTP_502_BAD_GATEWAY,
         )
+    return payload
+
+
+async def _fetch_introspection(token: str) -> dict[str, Any]:
+    try:
+        return await introspection_guard(lambda: _post_introspection(token))
+    except CircuitOpenError as exc:
+        raise VerificationError(
+            "Introspection unavailable",
+            reason="introspection_unavailable",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        ) from exc
+    except BudgetExceededError as exc:
+        raise VerificationError(
+            "Introspection timed out",
+            reason="introspection_timeout",
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        ) from exc
+
+
+def check_audience(payload: dict[str, Any]) -> dict[str, Any]:
     if EXPECTED_AUD:
         audience = payload.get("aud")
         audiences = audience if isinstance(audience, list) else [audience]
@@ -50,23 +208,121 @@ async def introspect_token(token: str) -> dict[str, Any]:
     return payload
 
 
+async def _load_introspection(token: str, digest: bytes) -> dict[str, Any]:
+    try:
+        payload = await _fetch_introspection(token)
+    except VerificationError as exc:
+        # While the IdP is down or slow, an answer it gave recently beats failing the request.
+        stale = introspection_cache.get_stale(digest) if CACHE_ENABLED and exc.status_code >= 500 else None
+        if stale is None:
+            raise
+        return stale
+    if CACHE_ENABLED:
+        introspection_cache.put(digest, payload)
+    return payload
+
+
+async def introspect_token(token: str) -> dict[str, Any]:
+    digest = token_digest(token)
+    payload = introspection_cache.get(digest) if CACHE_ENABLED else None
+    if payload is None:
+        payload = await introspection_flight.do(digest, lambda: _load_introspection(token, digest))
+    return payload
+
+
+metrics = VerificationMetrics()
+metrics.watch_cache("introspection", introspection_cache.stats)
+metrics.poll("singleflight_coalesced_total", "counter", "Introspections that joined an in-flight call.",
+             lambda: introspection_flight.stats()["coalesced"])
+metrics.poll("jwks_refresh_failures_total", "counter", "Failed JWKS reloads.", lambda: jwks_manager.failures)
+metrics.poll("introspection_breaker_state", "gauge", "IdP circuit breaker: 0 closed, 1 half-open, 2 open.",
+             lambda: STATES.index(introspection_guard.breaker.state))
+for event in ("hedges", "hedge_wins", "retries", "budget_exceeded", "short_circuited"):
+    metrics.poll(
+        "introspection_guard_total",
+        "counter",
+        "Hedged and retried IdP calls, and calls cut short by budget or breaker.",
+        lambda event=event: introspection_guard.stats()[event],
+        f'event="{event}"',
+    )
+metrics.poll("introspection_stale_served_total", "counter", "Stale cached introspections served while the IdP failed.",
+             lambda: introspection_cache.stats()["stale_hits"])
+
+# Garbage is turned away here, before it can cost an introspection round trip.
+screening = Screening.from_env("WORKOUT18", opaque_pattern=OPAQUE_TOKEN_PATTERN)
+
+# Audience is checked below for both paths so a mismatch is always one 403.
+verifier = Verifier(
+    VerificationPolicy(
+        mode={"introspect": "introspect", "jwks": "jwt", "auto": "auto"}[VERIFY_STRATEGY],
+        keys=jwks_manager if VERIFY_STRATEGY != "introspect" else None,
+        issuer=ISSUER if VERIFY_STRATEGY != "introspect" else None,
+        leeway_seconds=LEEWAY_SECONDS,
+        introspector=introspect_token if VERIFY_STRATEGY != "jwks" else None,
+        prefilter=screening.prefilter,
+    ),
+    metrics=metrics,
+)
+# Primes the JWKS keys in jwks/auto mode; introspection has nothing local to warm.
+warmup = Warmup(verifier)
+
+
+# Authentication happens in the middleware; the audience decision stays with the route.
+screening.install(app, verifier, paths=("/data",))
+
+
 async def require_token(
-    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+    request: Request, response: Response, token: VerifiedToken = Depends(verified_token)
 ) -> dict[str, Any]:
-    if credentials is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing Authorization header",
-        )
-    token = credentials.credentials
-    return await introspect_token(token)
+    claims = check_audience(token.claims)
+    response.headers["Server-Timing"] = f"{token.source};dur={request.state.verify_seconds * 1000:.3f}"
+    return claims
 
 
 @app.get("/health")
 async def health() -> dict[str, str]:
+    if not await warmup.check():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=warmup.detail)
     return {"status": "ok"}
 
 
+# Operational endpoints carry no authentication, so they exist only when WORKOUT18_ADMIN_ENABLED=1.
+admin = APIRouter()
+
+
+@admin.get("/admin/keys")
+async def key_status() -> dict[str, Any]:
+    return {
+        "strategy": VERIFY_STRATEGY,
+        "jwks_uri": discovery.jwks_uri,
+        **jwks_manager.stats(),
+        "warmup": warmup.stats(),
+    }
+
+
+@admin.get("/admin/cache-stats")
+async def cache_stats() -> dict[str, Any]:
+    return {
+        "enabled": CACHE_ENABLED,
+        **introspection_cache.stats(),
+        "singleflight": introspection_flight.stats(),
+    }
+
+
+@admin.get("/admin/introspection")
+async def introspection_status() -> dict[str, Any]:
+    return introspection_guard.stats()
+
+
+@admin.get("/metrics")
+async def metrics_endpoint() -> Response:
+    return metrics_response(metrics)
+
+
+if ADMIN_ENABLED:
+    app.include_router(admin)
+
+
 @app.get("/data")
 async def protected_endpoint(claims: dict[str, Any] = Depends(require_token)) -> dict[str, Any]:
     return {
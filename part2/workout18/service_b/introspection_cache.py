@@ -0,0 +1,198 @@
+"""Bounded LRU cache for introspection responses, keyed by a token digest."""
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from authn_verify.shared_table import SharedTable
+
+
+def token_digest(token: str) -> bytes:
+    """Hash the raw token so the cache never holds bearer credentials."""
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+@dataclass
+class _Entry:
+    payload: dict[str, Any]
+    expires_at: float
+    stale_until: float
+    size: int
+
+
+class IntrospectionCache:
+    """LRU cache of introspection payloads.
+
+    Active results live until the smaller of ``max_ttl`` and the token's ``exp``.
+    Inactive results are cached for ``negative_ttl`` so a flood of dead tokens
+    does not turn into a flood of IdP calls. Eviction is LRU and is triggered
+    by either ``max_entries`` or the approximate ``max_bytes`` budget.
+
+    With ``stale_ttl`` above 0, an entry is kept that much longer after it
+    expires, and ``get_stale`` returns it while the IdP cannot be reached.
+    An active result is never served past the token's own ``exp``.
+    """
+
+    def __init__(
+        self,
+        max_ttl: float = 60.0,
+        negative_ttl: float = 5.0,
+        max_entries: int = 10_000,
+        max_bytes: int = 16 * 1024 * 1024,
+        stale_ttl: float = 0.0,
+    ) -> None:
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[bytes, _Entry] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    def get(self, digest: bytes) -> dict[str, Any] | None:
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        now = time.time()
+        if entry.expires_at <= now:
+            if entry.stale_until <= now:
+                self._remove(digest)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return entry.payload
+
+    def get_stale(self, digest: bytes) -> dict[str, Any] | None:
+        """Return an entry past its TTL but within ``stale_ttl``, for use when the IdP is down."""
+        entry = self._entries.get(digest)
+        if entry is None or entry.stale_until <= time.time():
+            return None
+        self.stale_hits += 1
+        return entry.payload
+
+    def put(self, digest: bytes, payload: dict[str, Any]) -> None:
+        ttl = self._ttl_for(payload)
+        if ttl <= 0:
+            return
+        size = len(digest) + len(json.dumps(payload, separators=(",", ":")))
+        if size > self.max_bytes:
+            return
+        if digest in self._entries:
+            self._remove(digest)
+        expires_at = time.time() + ttl
+        self._entries[digest] = _Entry(
+            payload=payload, expires_at=expires_at, stale_until=self._stale_until(payload, expires_at), size=size
+        )
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest, _ = next(iter(self._entries.items()))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "stale_hits": self.stale_hits,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _ttl_for(self, payload: dict[str, Any]) -> float:
+        if not payload.get("active"):
+            return self.negative_ttl
+        ttl = self.max_ttl
+        exp = payload.get("exp")
+        if exp is not None:
+            try:
+                ttl = min(ttl, float(exp) - time.time())
+            except (TypeError, ValueError):
+                return 0.0
+        return ttl
+
+    def _stale_until(self, payload: dict[str, Any], expires_at: float) -> float:
+        stale_until = expires_at + self.stale_ttl
+        if payload.get("active") and payload.get("exp") is not None:
+            # _ttl_for already rejected an exp that is not a number.
+            stale_until = min(stale_until, float(payload["exp"]))
+        return stale_until
+
+    def _remove(self, digest: bytes) -> None:
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+
+class SharedIntrospectionCache(IntrospectionCache):
+    """Introspection cache held in a ``SharedTable`` so every worker shares one copy.
+
+    TTLs follow ``IntrospectionCache``. Payloads are stored as JSON of at most
+    ``value_size`` bytes and larger ones are not cached. ``max_bytes`` is
+    replaced by the table's fixed size: ``max_entries`` slots of
+    ``value_size`` bytes each. Hit and miss counts are per worker. Entries
+    stay in the table until their stale deadline; ``get`` treats one as
+    fresh only until that deadline minus ``stale_ttl``.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_ttl: float = 60.0,
+        negative_ttl: float = 5.0,
+        max_entries: int = 10_000,
+        value_size: int = 2048,
+        stale_ttl: float = 0.0,
+    ) -> None:
+        super().__init__(max_ttl=max_ttl, negative_ttl=negative_ttl, max_entries=max_entries, stale_ttl=stale_ttl)
+        self._table = SharedTable(path, max_entries, value_size)
+
+    def get(self, digest: bytes) -> dict[str, Any] | None:
+        found = self._table.get(digest[:16])
+        if found is None or found[0] - self.stale_ttl <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(found[1])
+
+    def get_stale(self, digest: bytes) -> dict[str, Any] | None:
+        found = self._table.get(digest[:16])
+        if found is None:
+            return None
+        payload = json.loads(found[1])
+        if payload.get("active") and payload.get("exp") is not None and float(payload["exp"]) <= time.time():
+            return None
+        self.stale_hits += 1
+        return payload
+
+    def put(self, digest: bytes, payload: dict[str, Any]) -> None:
+        ttl = self._ttl_for(payload)
+        value = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        if ttl > 0 and len(value) <= self._table.value_size:
+            self._table.insert(digest[:16], time.time() + ttl + self.stale_ttl, value, replace=True)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            **self._table.stats(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,248 @@
+"""Latency budget, hedged attempts, and a circuit breaker for calls to the IdP."""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATES = (CLOSED, HALF_OPEN, OPEN)
+
+
+class CircuitOpenError(Exception):
+    """Raised without making a call while the breaker is open."""
+
+
+class BudgetExceededError(Exception):
+    """Raised when no attempt finished within the latency budget."""
+
+
+class CircuitBreaker:
+    """Stop calling a dependency that keeps failing, then probe it.
+
+    After ``failure_threshold`` failed calls in a row the breaker opens and
+    ``allow`` refuses every call for ``reset_timeout`` seconds. Then it is
+    half-open: one call goes through as a probe. Success closes the breaker
+    and failure opens it again. A probe that never reports back is replaced
+    after another ``reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0) -> None:
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started: float | None = None
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probe_started = None
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            now = time.monotonic()
+            if self._probe_started is None or now - self._probe_started >= self.reset_timeout:
+                self._probe_started = now
+                return True
+        self.rejected += 1
+        return False
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self) -> None:
+        self._state = CLOSED
+        self._failures = 0
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.opened += 1
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+            self._probe_started = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_after_seconds": round(self.retry_after(), 3),
+        }
+
+
+class LatencyWindow:
+    """The last ``size`` call latencies, with quantiles recomputed every ``refresh_every`` samples."""
+
+    def __init__(self, size: int = 256, refresh_every: int = 16, min_samples: int = 20) -> None:
+        self._samples: deque[float] = deque(maxlen=size)
+        self._refresh_every = refresh_every
+        self._min_samples = min_samples
+        self._since_refresh = 0
+        self._sorted: list[float] = []
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._since_refresh += 1
+        if self._since_refresh >= self._refresh_every or len(self._sorted) < self._min_samples:
+            self._sorted = sorted(self._samples)
+            self._since_refresh = 0
+
+    def quantile(self, fraction: float) -> float | None:
+        """None until ``min_samples`` latencies have been seen."""
+        if len(self._sorted) < self._min_samples:
+            return None
+        return self._sorted[min(len(self._sorted) - 1, int(len(self._sorted) * fraction))]
+
+
+class GuardedCall:
+    """Run an async call under a latency budget, with hedged attempts and a circuit breaker.
+
+    The first attempt starts at once. If it has not finished after the
+    hedge delay (the ``hedge_quantile`` of recent successful latencies,
+    clamped to ``hedge_min_delay`` and the budget), a second attempt starts
+    alongside it, up to ``max_hedges`` extra attempts. An attempt that fails
+    is replaced straight away while attempts remain. The first attempt to
+    succeed wins and the rest are cancelled.
+
+    No call outlives ``budget`` seconds: past it every attempt is cancelled
+    and ``BudgetExceededError`` is raised. When every attempt failed, the
+    last error is raised instead. Either way the breaker records one
+    failure, and while it is open calls raise ``CircuitOpenError`` without
+    running at all.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        *,
+        budget: float = 1.0,
+        max_hedges: int = 1,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.01,
+        latencies: LatencyWindow | None = None,
+    ) -> None:
+        self.breaker = breaker
+        self.budget = budget
+        self.max_hedges = max_hedges
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.latencies = latencies or LatencyWindow()
+        self._counts = {
+            "calls": 0,
+            "attempts": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "retries": 0,
+            "failures": 0,
+            "budget_exceeded": 0,
+            "short_circuited": 0,
+        }
+
+    def hedge_delay(self) -> float:
+        observed = self.latencies.quantile(self.hedge_quantile)
+        # Until there is a latency history, wait half the budget before hedging.
+        delay = self.budget / 2 if observed is None else observed
+        return min(max(delay, self.hedge_min_delay), self.budget)
+
+    async def __call__(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        counts = self._counts
+        if not self.breaker.allow():
+            counts["short_circuited"] += 1
+            raise CircuitOpenError(f"Circuit open; retry in {self.breaker.retry_after():.1f}s")
+        counts["calls"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.budget
+        started: dict[asyncio.Future, float] = {}
+        pending: set[asyncio.Future] = set()
+        last_error: BaseException | None = None
+
+        def launch() -> asyncio.Future:
+            task = asyncio.ensure_future(attempt())
+            task.add_done_callback(_consume)
+            started[task] = loop.time()
+            pending.add(task)
+            counts["attempts"] += 1
+            return task
+
+        first = launch()
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                can_launch = len(started) <= self.max_hedges
+                if not pending:
+                    if not can_launch:
+                        break
+                    counts["retries"] += 1
+                    launch()
+                    continue
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=min(remaining, self.hedge_delay()) if can_launch else remaining,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    if can_launch and loop.time() < deadline:
+                        counts["hedges"] += 1
+                        launch()
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    error = task.exception()
+                    if error is None:
+                        self.latencies.add(loop.time() - started[task])
+                        self.breaker.record_success()
+                        if task is not first:
+                            counts["hedge_wins"] += 1
+                        return task.result()
+                    last_error = error
+        finally:
+            for task in pending:
+                task.cancel()
+
+        self.breaker.record_failure()
+        if pending or last_error is None:
+            counts["budget_exceeded"] += 1
+            raise BudgetExceededError(f"No response within {self.budget * 1000:.0f} ms")
+        counts["failures"] += 1
+        raise last_error
+
+    def stats(self) -> dict[str, Any]:
+        delay = self.latencies.quantile(self.hedge_quantile)
+        return {
+            **self._counts,
+            "budget_ms": round(self.budget * 1000, 1),
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+            f"p{self.hedge_quantile * 100:g}_ms": None if delay is None else round(delay * 1000, 1),
+            "breaker": self.breaker.stats(),
+        }
+
+
+def _consume(task: asyncio.Future) -> None:
+    # A loser may fail just before it is cancelled; mark its error as retrieved.
+    if not task.cancelled():
+        task.exception()
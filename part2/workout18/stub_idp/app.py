@@ -0,0 +1,350 @@
+"""Stub identity provider: discovery, JWKS, client_credentials tokens, and introspection for offline load tests."""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import secrets
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager, suppress
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator
+from urllib.parse import urlsplit
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from fastapi import APIRouter, Depends, FastAPI, Form, HTTPException, status
+from fastapi.responses import JSONResponse, Response
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from jose import jwk, jwt
+
+ISSUER = os.environ.get("WORKOUT18_STUB_ISSUER", "http://127.0.0.1:9100/oauth2").rstrip("/")
+CLIENTS = os.environ.get("WORKOUT18_STUB_CLIENTS", "service-a:service-a-secret,service-b:service-b-secret")
+TOKEN_FORMAT = os.environ.get("WORKOUT18_STUB_TOKEN_FORMAT", "opaque")
+TOKEN_TTL_SECONDS = int(os.environ.get("WORKOUT18_STUB_TOKEN_TTL_SECONDS", "3600"))
+MAX_TOKENS = int(os.environ.get("WORKOUT18_STUB_MAX_TOKENS", "1000000"))
+SIGNING_ALG = os.environ.get("WORKOUT18_STUB_ALG", "RS256")
+JWKS_MAX_AGE_SECONDS = int(os.environ.get("WORKOUT18_STUB_JWKS_MAX_AGE_SECONDS", "300"))
+ROTATE_SECONDS = float(os.environ.get("WORKOUT18_STUB_ROTATE_SECONDS", "0"))
+
+ENDPOINTS = ("discovery", "jwks", "token", "introspect")
+
+if TOKEN_FORMAT not in {"opaque", "jwt"}:
+    raise RuntimeError("WORKOUT18_STUB_TOKEN_FORMAT must be opaque or jwt")
+if SIGNING_ALG not in {"RS256", "ES256"}:
+    raise RuntimeError("WORKOUT18_STUB_ALG must be RS256 or ES256")
+
+
+def _parse_clients(raw: str) -> dict[str, str]:
+    clients = {}
+    for entry in filter(None, (part.strip() for part in raw.split(","))):
+        client_id, sep, secret = entry.partition(":")
+        if not sep:
+            raise RuntimeError("WORKOUT18_STUB_CLIENTS entries must look like client_id:secret")
+        clients[client_id] = secret
+    return clients
+
+
+@dataclass
+class Fault:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+def _fault_from_env(endpoint: str) -> Fault:
+    """``WORKOUT18_STUB_<ENDPOINT>_<SETTING>`` overrides ``WORKOUT18_STUB_<SETTING>``."""
+
+    def setting(name: str, default: str) -> str:
+        fallback = os.environ.get(f"WORKOUT18_STUB_{name}", default)
+        return os.environ.get(f"WORKOUT18_STUB_{endpoint.upper()}_{name}", fallback)
+
+    return Fault(
+        latency_ms=float(setting("LATENCY_MS", "0")),
+        jitter_ms=float(setting("JITTER_MS", "0")),
+        error_rate=float(setting("ERROR_RATE", "0")),
+        error_status=int(setting("ERROR_STATUS", "503")),
+    )
+
+
+@dataclass
+class SigningKey:
+    kid: str
+    key: Any
+    public_jwk: dict[str, Any]
+    created_at: float
+    retired_at: float | None = None
+
+
+def _generate_key(alg: str) -> SigningKey:
+    if alg == "ES256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    now = time.time()
+    kid = f"stub-{int(now)}-{secrets.token_hex(3)}"
+    key = jwk.construct(pem, alg)
+    public_jwk = key.public_key().to_dict()
+    public_jwk.update({"kid": kid, "use": "sig", "alg": alg})
+    return SigningKey(kid=kid, key=key, public_jwk=public_jwk, created_at=now)
+
+
+class KeyRing:
+    """One signing key plus retired keys still published for verification.
+
+    As in workout 10, a rotated-out key stays in the JWKS until every token
+    it signed has expired, so verifiers holding old tokens keep working.
+    ``drop_previous`` skips that grace period to reproduce the failure mode
+    where a key disappears before its tokens do.
+    """
+
+    def __init__(self, alg: str, grace_seconds: float) -> None:
+        self.alg = alg
+        self.grace_seconds = grace_seconds
+        self.current = _generate_key(alg)
+        self._retired: list[SigningKey] = []
+        self.rotations = 0
+
+    def rotate(self, new_key: SigningKey, *, drop_previous: bool = False) -> None:
+        self.current.retired_at = time.time()
+        self._retired = [] if drop_previous else [*self._retired, self.current]
+        self.current = new_key
+        self.rotations += 1
+
+    def published(self) -> list[SigningKey]:
+        cutoff = time.time() - self.grace_seconds
+        self._retired = [key for key in self._retired if key.retired_at > cutoff]
+        return [self.current, *self._retired]
+
+    def jwks(self) -> dict[str, Any]:
+        return {"keys": [key.public_jwk for key in self.published()]}
+
+
+class TokenStore:
+    """Issued tokens in issue order, which is also expiry order with a fixed TTL.
+
+    Expired tokens are dropped from the front on every issue, so upkeep is
+    amortised O(1). Beyond ``max_tokens`` the oldest tokens are forgotten and
+    introspect as inactive.
+    """
+
+    def __init__(self, max_tokens: int) -> None:
+        self.max_tokens = max_tokens
+        self._tokens: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self.evicted = 0
+
+    def add(self, token: str, claims: dict[str, Any]) -> None:
+        now = time.time()
+        while self._tokens:
+            oldest = next(iter(self._tokens.values()))
+            if oldest["exp"] > now and len(self._tokens) < self.max_tokens:
+                break
+            if oldest["exp"] > now:
+                self.evicted += 1
+            self._tokens.popitem(last=False)
+        self._tokens[token] = claims
+
+    def get(self, token: str) -> dict[str, Any] | None:
+        claims = self._tokens.get(token)
+        if claims is None or claims["exp"] <= time.time():
+            return None
+        return claims
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+
+clients = _parse_clients(CLIENTS)
+faults = {endpoint: _fault_from_env(endpoint) for endpoint in ENDPOINTS}
+keyring = KeyRing(SIGNING_ALG, grace_seconds=TOKEN_TTL_SECONDS)
+token_store = TokenStore(MAX_TOKENS)
+counters: Counter[str] = Counter()
+
+
+async def rotate_keys(*, drop_previous: bool = False) -> SigningKey:
+    # RSA key generation takes tens of milliseconds; keep it off the event loop.
+    new_key = await asyncio.to_thread(_generate_key, keyring.alg)
+    keyring.rotate(new_key, drop_previous=drop_previous)
+    return new_key
+
+
+async def _rotate_periodically() -> None:
+    while True:
+        await asyncio.sleep(ROTATE_SECONDS)
+        await rotate_keys()
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    task = asyncio.create_task(_rotate_periodically()) if ROTATE_SECONDS > 0 else None
+    try:
+        yield
+    finally:
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+
+app = FastAPI(title="Workout 18 - Stub IdP", lifespan=lifespan)
+router = APIRouter(prefix=urlsplit(ISSUER).path)
+basic_auth = HTTPBasic(auto_error=False)
+
+
+async def inject_faults(endpoint: str) -> None:
+    counters[f"{endpoint}_requests"] += 1
+    fault = faults[endpoint]
+    if fault.latency_ms or fault.jitter_ms:
+        await asyncio.sleep(max(0.0, fault.latency_ms + random.uniform(-fault.jitter_ms, fault.jitter_ms)) / 1000)
+    if fault.error_rate and random.random() < fault.error_rate:
+        counters[f"{endpoint}_injected_errors"] += 1
+        raise HTTPException(status_code=fault.error_status, detail="Injected failure")
+
+
+def authenticate_client(
+    credentials: HTTPBasicCredentials | None,
+    client_id: str | None,
+    client_secret: str | None,
+) -> str:
+    """Accept client_secret_basic or client_secret_post, as Verify does."""
+    if credentials is not None:
+        client_id, client_secret = credentials.username, credentials.password
+    expected = clients.get(client_id or "")
+    if expected is None or not secrets.compare_digest(expected, client_secret or ""):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="invalid_client",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return client_id
+
+
+def mint_token(client_id: str, scope: str) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": ISSUER,
+        "sub": client_id,
+        "aud": [client_id],
+        "client_id": client_id,
+        "scope": scope,
+        "iat": now,
+        "exp": now + TOKEN_TTL_SECONDS,
+        "jti": uuid.uuid4().hex,
+    }
+    if TOKEN_FORMAT == "jwt":
+        signing_key = keyring.current
+        token = jwt.encode(claims, signing_key.key, algorithm=keyring.alg, headers={"kid": signing_key.kid})
+    else:
+        token = secrets.token_urlsafe(32)
+    token_store.add(token, claims)
+    return token
+
+
+@router.get("/.well-known/openid-configuration")
+async def openid_configuration() -> dict[str, Any]:
+    await inject_faults("discovery")
+    return {
+        "issuer": ISSUER,
+        "jwks_uri": f"{ISSUER}/jwks",
+        "token_endpoint": f"{ISSUER}/token",
+        "introspection_endpoint": f"{ISSUER}/introspect",
+        "grant_types_supported": ["client_credentials"],
+        "token_endpoint_auth_methods_supported": ["client_secret_basic", "client_secret_post"],
+        "id_token_signing_alg_values_supported": [keyring.alg],
+    }
+
+
+@router.get("/jwks")
+async def jwks() -> JSONResponse:
+    await inject_faults("jwks")
+    return JSONResponse(keyring.jwks(), headers={"Cache-Control": f"public, max-age={JWKS_MAX_AGE_SECONDS}"})
+
+
+@router.post("/token")
+async def issue_token(
+    grant_type: str = Form(...),
+    scope: str = Form(""),
+    client_id: str | None = Form(None),
+    client_secret: str | None = Form(None),
+    credentials: HTTPBasicCredentials | None = Depends(basic_auth),
+) -> dict[str, Any]:
+    await inject_faults("token")
+    caller = authenticate_client(credentials, client_id, client_secret)
+    if grant_type != "client_credentials":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="unsupported_grant_type")
+    counters["tokens_issued"] += 1
+    return {
+        "access_token": mint_token(caller, scope),
+        "token_type": "Bearer",
+        "expires_in": TOKEN_TTL_SECONDS,
+        "scope": scope,
+    }
+
+
+@router.post("/introspect")
+async def introspect(
+    token: str = Form(...),
+    client_id: str | None = Form(None),
+    client_secret: str | None = Form(None),
+    credentials: HTTPBasicCredentials | None = Depends(basic_auth),
+) -> dict[str, Any]:
+    await inject_faults("introspect")
+    authenticate_client(credentials, client_id, client_secret)
+    claims = token_store.get(token)
+    if claims is None:
+        return {"active": False}
+    return {"active": True, "token_type": "Bearer", **claims}
+
+
+app.include_router(router)
+
+
+@app.get("/health")
+async def health() -> dict[str, str]:
+    return {"status": "ok"}
+
+
+@app.post("/admin/rotate-keys")
+async def rotate_keys_endpoint(drop_previous: bool = False) -> dict[str, Any]:
+    new_key = await rotate_keys(drop_previous=drop_previous)
+    return {"current_kid": new_key.kid, "published_kids": [key.kid for key in keyring.published()]}
+
+
+@app.get("/admin/faults")
+async def get_faults() -> dict[str, Any]:
+    return {endpoint: asdict(fault) for endpoint, fault in faults.items()}
+
+
+@app.put("/admin/faults/{endpoint}")
+async def set_fault(endpoint: str, fault: Fault) -> dict[str, Any]:
+    if endpoint not in faults:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown endpoint {endpoint}")
+    faults[endpoint] = fault
+    return asdict(fault)
+
+
+@app.get("/admin/stats")
+async def stats() -> dict[str, Any]:
+    return {
+        "token_format": TOKEN_FORMAT,
+        "live_tokens": len(token_store),
+        "evicted_tokens": token_store.evicted,
+        "current_kid": keyring.current.kid,
+        "published_kids": [key.kid for key in keyring.published()],
+        "rotations": keyring.rotations,
+        **counters,
+    }
+
+
+@app.post("/admin/reset-stats")
+async def reset_stats() -> Response:
+    counters.clear()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+# Each service runs from its own directory, so its modules import each other by bare name; do the same here.
+ROOT = Path(__file__).resolve().parents[1]
+for service in ("service_a", "service_b"):
+    sys.path.insert(0, str(ROOT / service))
+# Service B's modules also import authn_verify, which app.py puts on the path at startup.
+sys.path.insert(0, str(ROOT.parents[1] / "shared"))
@@ -0,0 +1,130 @@
+"""``IntrospectionCache``: how long an answer is kept, and what gets evicted."""
+from __future__ import annotations
+
+import time
+from typing import Any
+
+import pytest
+
+import introspection_cache
+from introspection_cache import IntrospectionCache, SharedIntrospectionCache, token_digest
+
+NOW = 1_000_000.0
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [NOW]
+    monkeypatch.setattr(introspection_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_digest_hides_the_token() -> None:
+    digest = token_digest("secret-token")
+    assert len(digest) == 32
+    assert b"secret-token" not in digest
+    assert digest == token_digest("secret-token")
+
+
+def test_active_entry_lives_until_exp(clock: list[float]) -> None:
+    cache = IntrospectionCache(max_ttl=60)
+    cache.put(b"a", {"active": True, "exp": NOW + 10})
+    clock[0] = NOW + 9
+    assert cache.get(b"a") == {"active": True, "exp": NOW + 10}
+    clock[0] = NOW + 10
+    assert cache.get(b"a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_active_entry_is_capped_at_max_ttl(clock: list[float]) -> None:
+    cache = IntrospectionCache(max_ttl=60)
+    cache.put(b"a", {"active": True, "exp": NOW + 3600})
+    cache.put(b"b", {"active": True})
+    clock[0] = NOW + 61
+    assert cache.get(b"a") is None
+    assert cache.get(b"b") is None
+
+
+def test_expired_or_malformed_exp_is_not_cached(clock: list[float]) -> None:
+    cache = IntrospectionCache()
+    cache.put(b"a", {"active": True, "exp": NOW - 1})
+    cache.put(b"b", {"active": True, "exp": "soon"})
+    assert cache.stats()["entries"] == 0
+
+
+def test_inactive_entry_uses_negative_ttl(clock: list[float]) -> None:
+    cache = IntrospectionCache(negative_ttl=5)
+    cache.put(b"a", {"active": False})
+    clock[0] = NOW + 4
+    assert cache.get(b"a") == {"active": False}
+    clock[0] = NOW + 5
+    assert cache.get(b"a") is None
+
+
+def test_evicts_least_recently_used(clock: list[float]) -> None:
+    cache = IntrospectionCache(max_entries=2)
+    cache.put(b"a", {"active": True})
+    cache.put(b"b", {"active": True})
+    assert cache.get(b"a") is not None
+    cache.put(b"c", {"active": True})
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+def test_byte_budget(clock: list[float]) -> None:
+    payload = {"active": True, "sub": "x" * 100}
+    cache = IntrospectionCache(max_bytes=300)
+    for digest in (b"a", b"b", b"c"):
+        cache.put(digest, payload)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] <= 300
+    cache.put(b"d", {"active": True, "sub": "x" * 400})
+    assert cache.get(b"d") is None
+
+
+def test_shared_cache_is_seen_by_every_worker(tmp_path: Any) -> None:
+    path = str(tmp_path / "introspection.tbl")
+    first = SharedIntrospectionCache(path, negative_ttl=5, max_entries=100, value_size=64)
+    second = SharedIntrospectionCache(path, negative_ttl=5, max_entries=100, value_size=64)
+    first.put(b"a" * 32, {"active": True, "exp": time.time() + 60})
+    first.put(b"b" * 32, {"active": False})
+    first.put(b"c" * 32, {"active": True, "sub": "x" * 100})
+    assert second.get(b"a" * 32)["active"] is True
+    assert second.get(b"b" * 32) == {"active": False}
+    assert second.get(b"c" * 32) is None
+    assert (second.stats()["hits"], second.stats()["misses"]) == (2, 1)
+
+
+def test_stale_entry_is_kept_for_outages(clock: list[float]) -> None:
+    cache = IntrospectionCache(max_ttl=10, negative_ttl=5, stale_ttl=60)
+    cache.put(b"a", {"active": True})
+    cache.put(b"b", {"active": True, "exp": NOW + 30})
+    cache.put(b"c", {"active": False})
+    assert cache.get_stale(b"a") == {"active": True}
+    clock[0] = NOW + 20
+    assert [cache.get(digest) for digest in (b"a", b"b", b"c")] == [None, None, None]
+    assert cache.get_stale(b"a") == {"active": True}
+    assert cache.get_stale(b"c") == {"active": False}
+    # Never past the token's own exp.
+    clock[0] = NOW + 30
+    assert cache.get_stale(b"b") is None
+    clock[0] = NOW + 70
+    assert cache.get_stale(b"a") is None
+    assert cache.stats()["stale_hits"] == 3
+
+
+def test_shared_stale_entry(tmp_path: Any, clock: list[float]) -> None:
+    path = str(tmp_path / "introspection.tbl")
+    cache = SharedIntrospectionCache(path, max_ttl=10, max_entries=100, value_size=64, stale_ttl=60)
+    cache.put(b"a" * 32, {"active": True})
+    cache.put(b"b" * 32, {"active": True, "exp": NOW + 30})
+    clock[0] = NOW + 20
+    assert cache.get(b"a" * 32) is None
+    assert cache.get_stale(b"a" * 32) == {"active": True}
+    clock[0] = NOW + 30
+    assert cache.get_stale(b"b" * 32) is None
+    clock[0] = NOW + 70
+    assert cache.get_stale(b"a" * 32) is None
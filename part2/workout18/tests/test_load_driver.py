@@ -0,0 +1,66 @@
+"""``load_driver``: the report's percentiles and what ``run_load`` counts."""
+from __future__ import annotations
+
+import asyncio
+import functools
+
+import httpx
+import pytest
+
+import load_driver
+from load_driver import LoadReport, introspection_ms, percentile, run_load
+
+
+def test_percentile() -> None:
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([7.0], 99) == 7
+    assert percentile([], 50) == 0
+
+
+@pytest.mark.parametrize(
+    "header,expected",
+    [
+        ("introspect;dur=12.5", 12.5),
+        ("cache;desc=hit, introspect;desc=idp;dur=3", 3.0),
+        ("cache;dur=1", None),
+        ("introspect;dur=fast", None),
+    ],
+)
+def test_introspection_ms(header: str, expected: float | None) -> None:
+    assert introspection_ms(httpx.Response(200, headers={"server-timing": header})) == expected
+    assert introspection_ms(httpx.Response(200)) is None
+
+
+def test_summary() -> None:
+    report = LoadReport(elapsed=2.0, latencies_ms=[1.0, 2.0, 3.0, 4.0])
+    report.statuses[200] = 3
+    report.errors["ConnectError"] = 1
+    summary = report.summary()
+    assert summary["requests"] == 4
+    assert summary["throughput_rps"] == 2.0
+    assert summary["latency_ms"]["p50"] == 2.0
+    assert summary["status_counts"] == {200: 3}
+    assert summary["errors"] == {"ConnectError": 1}
+
+
+def test_run_load_counts_every_request(monkeypatch: pytest.MonkeyPatch) -> None:
+    seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers["authorization"])
+        if len(seen) % 4 == 0:
+            raise httpx.ConnectError("refused", request=request)
+        status = 401 if len(seen) % 4 == 3 else 200
+        return httpx.Response(status, headers={"server-timing": "introspect;dur=2"})
+
+    client = functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(load_driver.httpx, "AsyncClient", client)
+    report = asyncio.run(run_load("http://service-b/data", "tok", concurrency=4, max_requests=20, duration=30))
+    assert seen == ["Bearer tok"] * 20
+    assert report.total == 20
+    assert report.statuses == {200: 10, 401: 5}
+    assert report.errors == {"ConnectError": 5}
+    assert report.introspection_ms == [2.0] * 15
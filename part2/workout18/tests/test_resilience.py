@@ -0,0 +1,150 @@
+"""``GuardedCall`` and ``CircuitBreaker``: how long a call to the IdP may take, and when it is not made at all."""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+
+import pytest
+
+import resilience
+from resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    BudgetExceededError,
+    CircuitBreaker,
+    CircuitOpenError,
+    GuardedCall,
+    LatencyWindow,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_breaker_opens_probes_and_closes(clock: list[float]) -> None:
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 10
+    clock[0] += 10
+    assert breaker.state == HALF_OPEN
+    # One probe at a time.
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock[0] += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.stats()["opened"] == 2
+    assert breaker.stats()["rejected"] == 2
+
+
+def test_lost_probe_is_replaced(clock: list[float]) -> None:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5)
+    breaker.record_failure()
+    clock[0] += 5
+    assert breaker.allow()
+    clock[0] += 4
+    assert not breaker.allow()
+    clock[0] += 1
+    assert breaker.allow()
+
+
+def test_latency_window() -> None:
+    window = LatencyWindow(size=100, refresh_every=10, min_samples=20)
+    for value in range(19):
+        window.add(value / 1000)
+    assert window.quantile(0.95) is None
+    window.add(0.019)
+    assert window.quantile(0.5) == 0.010
+    assert window.quantile(0.95) == 0.019
+
+
+class _Attempts:
+    """Each call sleeps for the next delay, then returns its number or raises."""
+
+    def __init__(self, *delays: float, failures: tuple[int, ...] = ()) -> None:
+        self.delays = list(delays)
+        self.failures = failures
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self) -> int:
+        self.started += 1
+        number = self.started
+        try:
+            await asyncio.sleep(self.delays[min(number, len(self.delays)) - 1])
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if number in self.failures:
+            raise RuntimeError(f"attempt {number} failed")
+        return number
+
+
+def _run(guard: GuardedCall, attempt: Any) -> Any:
+    async def run() -> Any:
+        try:
+            return await guard(attempt)
+        except Exception as exc:
+            return exc
+
+    return asyncio.run(run())
+
+
+def test_fast_answer_makes_one_attempt() -> None:
+    guard = GuardedCall(CircuitBreaker(), budget=1.0)
+    attempts = _Attempts(0.0)
+    assert _run(guard, attempts) == 1
+    stats = guard.stats()
+    assert (stats["calls"], stats["attempts"], stats["hedges"]) == (1, 1, 0)
+
+
+def test_slow_attempt_is_hedged() -> None:
+    guard = GuardedCall(CircuitBreaker(), budget=1.0, hedge_min_delay=0.02, latencies=LatencyWindow(min_samples=1))
+    guard.latencies.add(0.02)
+    attempts = _Attempts(0.5, 0.0)
+    assert _run(guard, attempts) == 2
+    assert attempts.cancelled == 1
+    stats = guard.stats()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+
+
+def test_failed_attempt_is_retried_at_once() -> None:
+    guard = GuardedCall(CircuitBreaker(), budget=1.0)
+    attempts = _Attempts(0.0, failures=(1,))
+    assert _run(guard, attempts) == 2
+    assert guard.stats()["retries"] == 1
+
+
+def test_every_attempt_failing_raises_the_last_error() -> None:
+    breaker = CircuitBreaker(failure_threshold=1)
+    guard = GuardedCall(breaker, budget=1.0, max_hedges=1)
+    error = _run(guard, _Attempts(0.0, failures=(1, 2)))
+    assert isinstance(error, RuntimeError)
+    assert str(error) == "attempt 2 failed"
+    assert breaker.state == OPEN
+    assert isinstance(_run(guard, _Attempts(0.0)), CircuitOpenError)
+    stats = guard.stats()
+    assert (stats["failures"], stats["short_circuited"]) == (1, 1)
+
+
+def test_budget_cancels_every_attempt() -> None:
+    guard = GuardedCall(CircuitBreaker(), budget=0.05, max_hedges=1)
+    attempts = _Attempts(1.0)
+    started = time.perf_counter()
+    assert isinstance(_run(guard, attempts), BudgetExceededError)
+    assert time.perf_counter() - started < 0.5
+    assert (attempts.started, attempts.cancelled) == (2, 2)
+    assert guard.stats()["budget_exceeded"] == 1
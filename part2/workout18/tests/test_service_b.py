@@ -0,0 +1,256 @@
+"""Service B end to end against a mock IdP: which path verifies a token, and what the caller sees."""
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Iterator
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi.testclient import TestClient
+from jose import jwk, jwt
+
+ISSUER = "https://idp.test/oauth2"
+AUDIENCE = "service-b"
+SERVICE_B = Path(__file__).resolve().parents[1] / "service_b" / "app.py"
+
+_PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+PRIVATE_PEM = _PRIVATE_KEY.private_bytes(
+    serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+).decode()
+
+
+class _IdP:
+    """Discovery, JWKS, and introspection, answered in-process."""
+
+    def __init__(self) -> None:
+        self.calls: Counter = Counter()
+        self.down = False
+        self.active: dict[str, dict[str, Any]] = {}
+        self.jwk = {**jwk.construct(PRIVATE_PEM, "RS256").public_key().to_dict(), "kid": "k1"}
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.calls[path] += 1
+        if path == "/oauth2/introspect":
+            token = parse_qs(request.content.decode())["token"][0]
+            if token == "idp-down" or self.down:
+                return httpx.Response(503)
+            if token == "idp-html":
+                return httpx.Response(200, text="<html>Bad gateway</html>")
+            if token == "idp-list":
+                return httpx.Response(200, json=["active"])
+            if token == "idp-slow":
+                return self._slow()
+            return httpx.Response(200, json=self.active.get(token, {"active": False}))
+        if path == "/oauth2/.well-known/openid-configuration":
+            return httpx.Response(200, json={"issuer": ISSUER, "jwks_uri": f"{ISSUER}/jwks"})
+        if path == "/oauth2/jwks":
+            return httpx.Response(200, json={"keys": [self.jwk]})
+        return httpx.Response(404)
+
+    @staticmethod
+    async def _slow() -> httpx.Response:
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={"active": False})
+
+    def opaque(self, token: str, **claims: Any) -> str:
+        self.active[token] = {"active": True, "iss": ISSUER, "sub": "service-a", "aud": [AUDIENCE], **claims}
+        return token
+
+    @staticmethod
+    def jwt(**claims: Any) -> str:
+        payload = {"iss": ISSUER, "sub": "service-a", "aud": AUDIENCE, "exp": int(time.time()) + 300, **claims}
+        return jwt.encode(payload, PRIVATE_PEM, algorithm="RS256", headers={"kid": "k1"})
+
+
+@pytest.fixture
+def idp() -> _IdP:
+    return _IdP()
+
+
+@pytest.fixture
+def service_b(idp: _IdP, monkeypatch: pytest.MonkeyPatch) -> Iterator[Callable[..., TestClient]]:
+    """Import Service B with the given environment and run it against ``idp``."""
+    clients: list[TestClient] = []
+
+    def start(**env: str) -> TestClient:
+        settings = {
+            "WORKOUT18_INTROSPECT_URL": f"{ISSUER}/introspect",
+            "WORKOUT18_RESOURCE_CLIENT_ID": "service-b",
+            "WORKOUT18_RESOURCE_CLIENT_SECRET": "secret",
+            "WORKOUT18_EXPECTED_AUD": AUDIENCE,
+            "WORKOUT18_ISSUER": ISSUER,
+            **env,
+        }
+        for name, value in settings.items():
+            monkeypatch.setenv(name, value)
+        spec = importlib.util.spec_from_file_location("service_b_app", SERVICE_B)
+        module = importlib.util.module_from_spec(spec)
+        monkeypatch.setitem(sys.modules, spec.name, module)
+        spec.loader.exec_module(module)
+        monkeypatch.setattr(module, "build_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(idp)))
+        client = TestClient(module.app)
+        client.__enter__()
+        clients.append(client)
+        return client
+
+    yield start
+    for client in clients:
+        client.__exit__(None, None, None)
+
+
+def _get(client: TestClient, token: str) -> httpx.Response:
+    return client.get("/data", headers={"Authorization": f"Bearer {token}"})
+
+
+def test_introspection(service_b: Callable[..., TestClient], idp: _IdP) -> None:
+    client = service_b()
+    resp = _get(client, idp.opaque("opaque-1", scope="read"))
+    assert resp.status_code == 200
+    assert resp.json()["scopes"] == "read"
+    assert resp.headers["server-timing"].startswith("introspect;dur=")
+    # Even a JWT is introspected under the default strategy.
+    assert _get(client, idp.jwt()).status_code == 401
+    assert idp.calls["/oauth2/introspect"] == 2
+    assert idp.calls["/oauth2/jwks"] == 0
+
+
+def test_inactive_token(service_b: Callable[..., TestClient]) -> None:
+    resp = _get(service_b(), "revoked")
+    assert resp.status_code == 401
+    assert resp.json()["detail"] == "Token inactive"
+
+
+def test_inactive_answers_are_not_kept_without_the_cache(service_b: Callable[..., TestClient], idp: _IdP) -> None:
+    client = service_b(WORKOUT18_CACHE_ENABLED="0")
+    # Without a failure limit, repeated 401s from one address are not turned into 429s either.
+    assert [_get(client, "pending").status_code for _ in range(30)] == [401] * 30
+    idp.opaque("pending")
+    assert _get(client, "pending").status_code == 200
+    assert idp.calls["/oauth2/introspect"] == 31
+
+
+def test_idp_failure_is_a_502(service_b: Callable[..., TestClient]) -> None:
+    resp = _get(service_b(), "idp-down")
+    assert resp.status_code == 502
+    assert resp.json() == {"detail": "Introspection failed: 503"}
+    assert "www-authenticate" not in resp.headers
+
+
+@pytest.mark.parametrize("token", ["idp-html", "idp-list"])
+def test_unparseable_introspection_is_a_502(service_b: Callable[..., TestClient], token: str) -> None:
+    resp = _get(service_b(), token)
+    assert resp.status_code == 502
+    assert resp.json() == {"detail": "Introspection failed: invalid response"}
+
+
+def test_slow_idp_is_cut_off_by_the_budget(service_b: Callable[..., TestClient]) -> None:
+    client = service_b(WORKOUT18_INTROSPECT_BUDGET_MS="50")
+    started = time.perf_counter()
+    resp = _get(client, "idp-slow")
+    assert time.perf_counter() - started < 0.5
+    assert resp.status_code == 504
+    assert resp.json() == {"detail": "Introspection timed out"}
+
+
+def test_breaker_stops_calling_a_failing_idp(service_b: Callable[..., TestClient], idp: _IdP) -> None:
+    client = service_b(
+        WORKOUT18_BREAKER_FAILURES="1", WORKOUT18_BREAKER_RESET_SECONDS="60", WORKOUT18_ADMIN_ENABLED="1"
+    )
+    idp.down = True
+    assert _get(client, "opaque-1").status_code == 502
+    calls = idp.calls["/oauth2/introspect"]
+    resp = _get(client, "opaque-2")
+    assert resp.status_code == 503
+    assert resp.json() == {"detail": "Introspection unavailable"}
+    assert idp.calls["/oauth2/introspect"] == calls
+    assert client.get("/admin/introspection").json()["breaker"]["state"] == "open"
+
+
+def test_stale_answer_is_served_while_the_idp_is_down(service_b: Callable[..., TestClient], idp: _IdP) -> None:
+    client = service_b(WORKOUT18_CACHE_MAX_TTL_SECONDS="0.05", WORKOUT18_ADMIN_ENABLED="1")
+    token = idp.opaque("opaque-1")
+    assert _get(client, token).status_code == 200
+    time.sleep(0.1)
+    idp.down = True
+    assert _get(client, token).status_code == 200
+    assert "authn_verify_introspection_stale_served_total 1" in client.get("/metrics").text
+    with_no_stale = service_b(WORKOUT18_CACHE_MAX_TTL_SECONDS="0.05", WORKOUT18_CACHE_STALE_SECONDS="0")
+    idp.down = False
+    assert _get(with_no_stale, token).status_code == 200
+    time.sleep(0.1)
+    idp.down = True
+    assert _get(with_no_stale, token).status_code == 502
+
+
+def test_jwks_strategy_never_introspects(service_b: Callable[..., TestClient], idp: _IdP) -> None:
+    client = service_b(WORKOUT18_VERIFY_STRATEGY="jwks", WORKOUT18_ADMIN_ENABLED="1")
+    resp = _get(client, idp.jwt(scope="read"))
+    assert resp.status_code == 200
+    assert resp.json()["subject"] == "service-a"
+    assert resp.headers["server-timing"].startswith("jwt;dur=")
+    assert _get(client, idp.jwt(iss="https://elsewhere")).status_code == 401
+    assert _get(client, idp.jwt(exp=int(time.time()) - 3600)).json()["detail"] == "Token expired"
+    assert idp.calls["/oauth2/introspect"] == 0
+    keys = client.get("/admin/keys").json()
+    assert keys["jwks_uri"] == f"{ISSUER}/jwks"
+    # The lifespan warmed the verifier, so /health is ready before the first request.
+    assert keys["warmup"]["keys"] == ["k1"]
+    assert client.get("/health").status_code == 200
+
+
+def test_audience_is_checked_on_both_paths(service_b: Callable[..., TestClient], idp: _IdP) -> None:
+    client = service_b(WORKOUT18_VERIFY_STRATEGY="auto")
+    for token in (idp.jwt(aud="other"), idp.opaque("opaque-other", aud=["other"])):
+        resp = _get(client, token)
+        assert resp.status_code == 403
+        assert resp.json()["detail"] == "Audience mismatch"
+
+
+def test_auto_strategy_routes_by_token_shape(service_b: Callable[..., TestClient], idp: _IdP) -> None:
+    client = service_b(WORKOUT18_VERIFY_STRATEGY="auto")
+    assert _get(client, idp.jwt()).headers["server-timing"].startswith("jwt;")
+    assert _get(client, idp.opaque("opaque-1")).headers["server-timing"].startswith("introspect;")
+    assert idp.calls["/oauth2/introspect"] == 1
+
+
+def test_metrics(service_b: Callable[..., TestClient], idp: _IdP) -> None:
+    client = service_b(WORKOUT18_ADMIN_ENABLED="1")
+    token = idp.opaque("opaque-1")
+    for _ in range(3):
+        _get(client, token)
+    _get(client, "revoked")
+    text = client.get("/metrics").text
+    assert 'authn_verify_outcomes_total{source="introspect",reason="ok"} 3' in text
+    assert 'authn_verify_outcomes_total{source="introspect",reason="inactive"} 1' in text
+    assert 'authn_verify_cache_hits_total{cache="introspection"} 2' in text
+    assert "authn_verify_singleflight_coalesced_total 0" in text
+
+
+@pytest.mark.parametrize("path", ["/metrics", "/admin/keys", "/admin/cache-stats", "/admin/introspection"])
+def test_admin_endpoints_are_off_by_default(service_b: Callable[..., TestClient], path: str) -> None:
+    assert service_b().get(path).status_code == 404
+    assert service_b(WORKOUT18_ADMIN_ENABLED="1").get(path).status_code == 200
+
+
+def test_workers_share_the_introspection_cache(
+    service_b: Callable[..., TestClient], idp: _IdP, tmp_path: Path
+) -> None:
+    # Two imports of the app stand in for two uvicorn workers on one host.
+    workers = [service_b(WORKOUT18_SHARED_STATE_DIR=str(tmp_path)) for _ in range(2)]
+    token = idp.opaque("opaque-1")
+    assert [_get(worker, token).status_code for worker in workers] == [200, 200]
+    assert idp.calls["/oauth2/introspect"] == 1
+
+
+def test_strategy_is_validated(service_b: Callable[..., TestClient]) -> None:
+    with pytest.raises(RuntimeError):
+        service_b(WORKOUT18_VERIFY_STRATEGY="guess")
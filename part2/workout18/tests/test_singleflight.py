@@ -0,0 +1,88 @@
+"""``SingleFlight``: concurrent callers for one key share one call."""
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result() -> None:
+    flight = SingleFlight()
+    started = 0
+
+    async def fetch() -> str:
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.01)
+        return "payload"
+
+    async def run() -> list[str]:
+        return await asyncio.gather(*(flight.do("token", fetch) for _ in range(10)))
+
+    assert asyncio.run(run()) == ["payload"] * 10
+    assert started == 1
+    assert flight.stats() == {"inflight": 0, "calls": 1, "coalesced": 9}
+
+
+def test_keys_do_not_share_calls() -> None:
+    flight = SingleFlight()
+
+    async def run() -> list[str]:
+        return await asyncio.gather(flight.do("a", _value("a")), flight.do("b", _value("b")))
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert flight.stats()["calls"] == 2
+
+
+def test_a_finished_call_is_not_reused() -> None:
+    flight = SingleFlight()
+
+    async def run() -> list[str]:
+        return [await flight.do("a", _value("first")), await flight.do("a", _value("second"))]
+
+    assert asyncio.run(run()) == ["first", "second"]
+
+
+def test_every_waiter_sees_the_error() -> None:
+    flight = SingleFlight()
+
+    async def fail() -> str:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("idp down")
+
+    async def run() -> list[object]:
+        return await asyncio.gather(*(flight.do("a", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert [str(result) for result in results] == ["idp down"] * 3
+    assert flight.stats()["inflight"] == 0
+
+
+def test_cancelled_waiter_does_not_cancel_the_call() -> None:
+    flight = SingleFlight()
+
+    async def slow() -> str:
+        await asyncio.sleep(0.05)
+        return "payload"
+
+    async def run() -> str:
+        first = asyncio.ensure_future(flight.do("a", slow))
+        second = asyncio.ensure_future(flight.do("a", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "payload"
+
+
+def _value(value: str) -> Callable[[], Awaitable[str]]:
+    async def fetch() -> str:
+        await asyncio.sleep(0)
+        return value
+
+    return fetch
@@ -0,0 +1,128 @@
+"""The stub IdP: client authentication, token issue and introspection, key rotation, and injected faults."""
+from __future__ import annotations
+
+import importlib.util
+import sys
+import time
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+
+ISSUER = "http://stub.test/oauth2"
+STUB_IDP = Path(__file__).resolve().parents[1] / "stub_idp" / "app.py"
+SERVICE_A = ("service-a", "service-a-secret")
+
+
+@pytest.fixture
+def stub_idp(monkeypatch: pytest.MonkeyPatch) -> Iterator[Callable[..., tuple[ModuleType, TestClient]]]:
+    clients: list[TestClient] = []
+
+    def start(**env: str) -> tuple[ModuleType, TestClient]:
+        monkeypatch.setenv("WORKOUT18_STUB_ISSUER", ISSUER)
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        spec = importlib.util.spec_from_file_location("stub_idp_app", STUB_IDP)
+        module = importlib.util.module_from_spec(spec)
+        # Fault is a dataclass request body; FastAPI resolves it through sys.modules.
+        monkeypatch.setitem(sys.modules, spec.name, module)
+        spec.loader.exec_module(module)
+        client = TestClient(module.app)
+        client.__enter__()
+        clients.append(client)
+        return module, client
+
+    yield start
+    for client in clients:
+        client.__exit__(None, None, None)
+
+
+def _issue(client: TestClient, scope: str = "read") -> str:
+    resp = client.post("/oauth2/token", data={"grant_type": "client_credentials", "scope": scope}, auth=SERVICE_A)
+    assert resp.status_code == 200
+    return resp.json()["access_token"]
+
+
+def _introspect(client: TestClient, token: str) -> dict[str, object]:
+    return client.post("/oauth2/introspect", data={"token": token}, auth=("service-b", "service-b-secret")).json()
+
+
+def test_discovery(stub_idp: Callable[..., tuple[ModuleType, TestClient]]) -> None:
+    _, client = stub_idp()
+    metadata = client.get("/oauth2/.well-known/openid-configuration").json()
+    assert metadata["issuer"] == ISSUER
+    assert metadata["jwks_uri"] == f"{ISSUER}/jwks"
+    resp = client.get("/oauth2/jwks")
+    assert resp.headers["cache-control"] == "public, max-age=300"
+    assert [key["alg"] for key in resp.json()["keys"]] == ["RS256"]
+
+
+def test_opaque_tokens_introspect_until_they_expire(stub_idp: Callable[..., tuple[ModuleType, TestClient]]) -> None:
+    module, client = stub_idp()
+    token = _issue(client)
+    claims = _introspect(client, token)
+    assert claims["active"] is True
+    assert (claims["sub"], claims["scope"], claims["iss"]) == ("service-a", "read", ISSUER)
+    assert _introspect(client, "never-issued") == {"active": False}
+    module.token_store._tokens[token]["exp"] = time.time() - 1
+    assert _introspect(client, token) == {"active": False}
+
+
+def test_client_authentication(stub_idp: Callable[..., tuple[ModuleType, TestClient]]) -> None:
+    _, client = stub_idp()
+    form = {"grant_type": "client_credentials", "client_id": "service-a", "client_secret": "service-a-secret"}
+    assert client.post("/oauth2/token", data=form).status_code == 200
+    assert client.post("/oauth2/token", data={**form, "client_secret": "wrong"}).status_code == 401
+    resp = client.post("/oauth2/token", data={"grant_type": "password"}, auth=SERVICE_A)
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "unsupported_grant_type"
+    assert client.post("/oauth2/introspect", data={"token": "x"}).status_code == 401
+
+
+def test_jwt_tokens_verify_against_the_published_keys(
+    stub_idp: Callable[..., tuple[ModuleType, TestClient]],
+) -> None:
+    _, client = stub_idp(WORKOUT18_STUB_TOKEN_FORMAT="jwt", WORKOUT18_STUB_ALG="ES256")
+    token = _issue(client)
+    keys = {key["kid"]: key for key in client.get("/oauth2/jwks").json()["keys"]}
+    kid = jwt.get_unverified_header(token)["kid"]
+    claims = jwt.decode(token, keys[kid], algorithms=["ES256"], audience="service-a", issuer=ISSUER)
+    assert claims["scope"] == "read"
+
+
+def test_rotation_keeps_retired_keys_published(stub_idp: Callable[..., tuple[ModuleType, TestClient]]) -> None:
+    module, client = stub_idp()
+    first = module.keyring.current.kid
+    rotated = client.post("/admin/rotate-keys").json()
+    assert rotated["published_kids"] == [rotated["current_kid"], first]
+    dropped = client.post("/admin/rotate-keys", params={"drop_previous": True}).json()
+    assert dropped["published_kids"] == [dropped["current_kid"]]
+    assert client.get("/admin/stats").json()["rotations"] == 2
+
+
+def test_injected_faults(stub_idp: Callable[..., tuple[ModuleType, TestClient]]) -> None:
+    _, client = stub_idp(WORKOUT18_STUB_ERROR_RATE="1", WORKOUT18_STUB_TOKEN_ERROR_RATE="0")
+    assert client.get("/oauth2/jwks").status_code == 503
+    token = _issue(client)
+    fault = {"latency_ms": 0, "jitter_ms": 0, "error_rate": 1, "error_status": 500}
+    assert client.put("/admin/faults/token", json=fault).status_code == 200
+    assert client.post("/oauth2/token", data={"grant_type": "client_credentials"}, auth=SERVICE_A).status_code == 500
+    assert client.put("/admin/faults/userinfo", json=fault).status_code == 404
+    client.put("/admin/faults/introspect", json={**fault, "error_rate": 0})
+    assert _introspect(client, token)["active"] is True
+    stats = client.get("/admin/stats").json()
+    assert (stats["jwks_injected_errors"], stats["token_injected_errors"], stats["tokens_issued"]) == (1, 1, 1)
+    assert client.post("/admin/reset-stats").status_code == 204
+    assert "tokens_issued" not in client.get("/admin/stats").json()
+
+
+def test_token_store_forgets_the_oldest_beyond_its_limit(
+    stub_idp: Callable[..., tuple[ModuleType, TestClient]],
+) -> None:
+    _, client = stub_idp(WORKOUT18_STUB_MAX_TOKENS="2")
+    tokens = [_issue(client) for _ in range(3)]
+    assert [_introspect(client, token)["active"] for token in tokens] == [False, True, True]
+    assert client.get("/admin/stats").json()["evicted_tokens"] == 1
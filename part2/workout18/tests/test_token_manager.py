@@ -0,0 +1,174 @@
+"""``ClientCredentialsTokenManager``: one token fetch per key and lifetime, refreshed ahead of expiry."""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+
+from token_manager import CachedToken, ClientCredentialsTokenManager
+
+
+class _Response:
+    def __init__(self, data: dict[str, Any]) -> None:
+        self._data = data
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> dict[str, Any]:
+        return self._data
+
+
+class _Session:
+    """Stands in for ``requests.Session``; every post issues a new token."""
+
+    def __init__(self, idp: "_IdP") -> None:
+        self.idp = idp
+        self.thread = threading.get_ident()
+        self.closed = False
+
+    def post(self, url: str, headers: dict[str, str], data: dict[str, str], timeout: float) -> _Response:
+        # requests.Session is not thread-safe, so a session must stay on the thread that made it.
+        assert threading.get_ident() == self.thread
+        return self.idp.issue(data)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class _IdP:
+    """Hands out sessions and counts the token requests made through them."""
+
+    def __init__(self, delay: float = 0.0, **extra: Any) -> None:
+        self.delay = delay
+        self.extra = extra
+        self.forms: list[dict[str, str]] = []
+        self.sessions: list[_Session] = []
+        self._lock = threading.Lock()
+
+    def session(self) -> _Session:
+        session = _Session(self)
+        self.sessions.append(session)
+        return session
+
+    def issue(self, data: dict[str, str]) -> _Response:
+        time.sleep(self.delay)
+        with self._lock:
+            self.forms.append(data)
+            number = len(self.forms)
+        return _Response({"access_token": f"token-{number}", "expires_in": 300, **self.extra})
+
+
+def _manager(idp: _IdP, **options: Any) -> ClientCredentialsTokenManager:
+    return ClientCredentialsTokenManager(
+        "https://idp/token", "client", "secret", session_factory=idp.session, jitter_ratio=0, **options
+    )
+
+
+def _age(manager: ClientCredentialsTokenManager, scope: str, refresh_in: float, expires_in: float) -> None:
+    entry = manager._tokens[("client", scope)]
+    now = time.time()
+    manager._tokens[("client", scope)] = CachedToken(entry.access_token, now + expires_in, now + refresh_in)
+
+
+def test_token_is_cached_per_scope() -> None:
+    idp = _IdP()
+    manager = _manager(idp)
+    assert manager.get_token() == "token-1"
+    assert manager.get_token() == "token-1"
+    assert manager.get_token("read") == "token-2"
+    assert manager.get_token("read") == "token-2"
+    assert manager.fetches == 2
+    assert idp.forms[0] == {"grant_type": "client_credentials", "client_id": "client", "client_secret": "secret"}
+    assert idp.forms[1]["scope"] == "read"
+
+
+def test_refresh_at_is_ahead_of_expiry() -> None:
+    manager = _manager(_IdP(), refresh_ratio=0.2)
+    before = time.time()
+    manager.get_token()
+    entry = manager._tokens[("client", "")]
+    assert entry.expires_at == pytest.approx(before + 300, abs=1)
+    assert entry.refresh_at == pytest.approx(before + 240, abs=1)
+
+
+def test_due_token_is_served_while_refreshing_in_background() -> None:
+    idp = _IdP()
+    manager = _manager(idp)
+    manager.get_token()
+    _age(manager, "", refresh_in=-1, expires_in=60)
+    assert manager.get_token() == "token-1"
+    deadline = time.time() + 5
+    while manager.fetches < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert manager.get_token() == "token-2"
+    # The refresh thread used a session of its own and closed it when it finished.
+    assert [session.closed for session in idp.sessions] == [False, True]
+
+
+def test_expired_token_blocks_for_a_new_one() -> None:
+    manager = _manager(_IdP(), expiry_skew=5)
+    manager.get_token()
+    _age(manager, "", refresh_in=-10, expires_in=4)
+    assert manager.get_token() == "token-2"
+
+
+def test_concurrent_callers_share_one_fetch() -> None:
+    idp = _IdP(delay=0.05)
+    manager = _manager(idp)
+    tokens: list[str] = []
+    threads = [threading.Thread(target=lambda: tokens.append(manager.get_token())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tokens == ["token-1"] * 8
+    assert len(idp.forms) == 1
+
+
+def test_scopes_refresh_in_parallel() -> None:
+    idp = _IdP(delay=0.2)
+    manager = _manager(idp)
+    threads = [threading.Thread(target=manager.get_token, args=(f"scope-{index}",)) for index in range(4)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # One key's refresh does not wait for another's, and each thread posts through its own session.
+    assert time.perf_counter() - started < 0.6
+    assert manager.fetches == 4
+    assert len({session.thread for session in idp.sessions}) == len(idp.sessions) == 4
+
+
+def test_response_without_access_token() -> None:
+    manager = _manager(_IdP(access_token=""))
+    with pytest.raises(RuntimeError):
+        manager.get_token()
+
+
+def test_async_callers_share_one_fetch() -> None:
+    forms: list[dict[str, list[str]]] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        forms.append(parse_qs((await request.aread()).decode()))
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"access_token": f"token-{len(forms)}", "expires_in": 300})
+
+    async def run() -> list[str]:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        manager = _manager(_IdP(), async_client=client)
+        try:
+            tokens = await asyncio.gather(*(manager.aget_token("read") for _ in range(5)))
+            return [*tokens, await manager.aget_token("read")]
+        finally:
+            await manager.aclose()
+
+    assert asyncio.run(run()) == ["token-1"] * 6
+    assert len(forms) == 1
+    assert forms[0]["scope"] == ["read"]
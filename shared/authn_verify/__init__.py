@@ -0,0 +1,64 @@
+"""Policy-driven token verification shared by the workout backends.
+
+FastAPI helpers live in ``authn_verify.dependency`` so the core engine can be
+imported without a web framework installed.
+"""
+from __future__ import annotations
+
+from .cache import VerifiedTokenCache
+from .engine import VerifiedToken, Verifier, looks_like_jwt
+from .errors import VerificationError
+from .jwks import JwksManager, OidcDiscovery, VerificationKey, build_keys, jwks_loader
+from .metrics import VerificationMetrics
+from .middleware import BearerAuthMiddleware
+from .offload import OffloadBusy, SignatureOffload
+from .policy import KeyProvider, VerificationPolicy, VerifiedCache
+from .prefilter import FailureLimiter, TokenPrefilter
+from .replay import (
+    FAIL_CLOSED,
+    FAIL_OPEN,
+    OVERFLOW_EVICT,
+    OVERFLOW_REJECT,
+    InMemoryReplayCache,
+    RedisReplayCache,
+    ReplayCache,
+    ReplayCacheFull,
+    ReplayStoreUnavailable,
+    build_replay_cache,
+)
+from .screening import Screening
+from .warmup import Warmup
+
+__all__ = [
+    "FAIL_CLOSED",
+    "FAIL_OPEN",
+    "OVERFLOW_EVICT",
+    "OVERFLOW_REJECT",
+    "BearerAuthMiddleware",
+    "FailureLimiter",
+    "InMemoryReplayCache",
+    "JwksManager",
+    "KeyProvider",
+    "OffloadBusy",
+    "OidcDiscovery",
+    "RedisReplayCache",
+    "ReplayCache",
+    "ReplayCacheFull",
+    "ReplayStoreUnavailable",
+    "Screening",
+    "SignatureOffload",
+    "TokenPrefilter",
+    "VerificationError",
+    "VerificationKey",
+    "VerificationMetrics",
+    "VerificationPolicy",
+    "VerifiedCache",
+    "VerifiedToken",
+    "VerifiedTokenCache",
+    "Verifier",
+    "Warmup",
+    "build_keys",
+    "build_replay_cache",
+    "jwks_loader",
+    "looks_like_jwt",
+]
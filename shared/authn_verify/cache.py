@@ -0,0 +1,71 @@
+"""Opt-in LRU cache of verified token claims."""
+from __future__ import annotations
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class _Entry:
+    claims: dict[str, Any]
+    kid: str | None
+    not_before: float | None
+    expires_at: float
+
+
+class VerifiedTokenCache:
+    """Remember claims of tokens that already passed full verification.
+
+    Entries are keyed by a SHA-256 digest of the token string, so a hit means
+    the exact same bytes were verified before and the HMAC does not need to be
+    recomputed. Claims are held until ``exp - leeway``; on every hit ``nbf``
+    and ``exp`` are checked against the clock again, and anything outside the
+    window falls back to full verification. Tokens without ``exp`` are never
+    cached.
+    """
+
+    def __init__(self, max_entries: int, leeway_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.leeway_seconds = leeway_seconds
+        self._entries: OrderedDict[bytes, _Entry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> tuple[dict[str, Any], str | None] | None:
+        """Return ``(claims, kid)`` for a verified token, or None on a miss."""
+        digest = hashlib.sha256(token.encode("utf-8")).digest()
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        now = time.time()
+        if now >= entry.expires_at:
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        if entry.not_before is not None and entry.not_before > now + self.leeway_seconds:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return dict(entry.claims), entry.kid
+
+    def put(self, token: str, claims: dict[str, Any], kid: str | None = None) -> None:
+        try:
+            expires_at = float(claims["exp"]) - self.leeway_seconds
+            not_before = float(claims["nbf"]) if "nbf" in claims else None
+        except (KeyError, TypeError, ValueError):
+            return
+        if expires_at <= time.time():
+            return
+        digest = hashlib.sha256(token.encode("utf-8")).digest()
+        self._entries[digest] = _Entry(claims=dict(claims), kid=kid, not_before=not_before, expires_at=expires_at)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,43 @@
+"""FastAPI glue for the verification engine."""
+from __future__ import annotations
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from .engine import VerifiedToken
+from .errors import VerificationError
+from .metrics import VerificationMetrics
+from .middleware import STATE_KEY
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def to_http_exception(exc: VerificationError) -> HTTPException:
+    headers = {"WWW-Authenticate": "Bearer"} if exc.status_code < 500 else None
+    return HTTPException(status_code=exc.status_code, detail=exc.detail, headers=headers)
+
+
+async def bearer_token(
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+) -> str:
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing Authorization header",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return credentials.credentials
+
+
+async def verified_token(request: Request) -> VerifiedToken:
+    """The token ``BearerAuthMiddleware`` verified before this request was routed."""
+    # async so FastAPI calls it inline; a plain def would be sent to the threadpool.
+    token = getattr(request.state, STATE_KEY, None)
+    if token is None:
+        # Fail closed: a route that expects the middleware must never run without it.
+        raise RuntimeError(f"BearerAuthMiddleware does not cover {request.url.path}")
+    return token
+
+
+def metrics_response(metrics: VerificationMetrics) -> Response:
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,391 @@
+"""Verification engine that runs only the checks a policy enables."""
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from jose import jwk
+from jose.backends.base import Key
+from jose.exceptions import JOSEError
+
+from .cache import VerifiedTokenCache
+from .errors import GENERIC_DETAIL, VerificationError
+from .metrics import NULL_TIMER, StageTimer, VerificationMetrics
+from .offload import OffloadBusy
+from .policy import VerificationPolicy
+from .replay import ReplayCacheFull, ReplayStoreUnavailable
+
+ClaimCheck = Callable[[dict[str, Any], float], None]
+
+_HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+_HEADER_CACHE_SIZE = 64
+
+
+@dataclass(frozen=True)
+class VerifiedToken:
+    claims: dict[str, Any]
+    kid: str | None = None
+    source: str = "jwt"
+
+
+def _b64decode(segment: str) -> bytes:
+    # Same padding rule as jose.utils.base64url_decode, so both paths accept the same inputs.
+    data = segment.encode("ascii")
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+def _decode_segment(segment: str) -> Any:
+    return json.loads(_b64decode(segment))
+
+
+def looks_like_jwt(token: str) -> bool:
+    """True for compact JWS tokens; opaque reference tokens fail this check."""
+    if token.count(".") != 2:
+        return False
+    try:
+        header = _decode_segment(token.partition(".")[0])
+    except ValueError:
+        return False
+    return isinstance(header, dict) and bool(header.get("alg"))
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _compile_claim_checks(policy: VerificationPolicy) -> list[ClaimCheck]:
+    # Failures keep the messages jwt.decode gave, so the backends' 401 details do not change.
+    leeway = policy.leeway_seconds
+    checks: list[ClaimCheck] = []
+
+    if policy.verify_exp:
+
+        def check_exp(claims: dict[str, Any], now: float) -> None:
+            exp = claims.get("exp")
+            if exp is None:
+                return
+            if not _is_number(exp):
+                raise VerificationError(
+                    "Claim verification failed: Expiration Time claim (exp) must be an integer.", reason="claims"
+                )
+            if exp < now - leeway:
+                raise VerificationError("Token expired", reason="expired")
+
+        checks.append(check_exp)
+
+    if policy.verify_nbf:
+
+        def check_nbf(claims: dict[str, Any], now: float) -> None:
+            nbf = claims.get("nbf")
+            if nbf is None:
+                return
+            if not _is_number(nbf):
+                raise VerificationError(
+                    "Claim verification failed: Not Before claim (nbf) must be an integer.", reason="claims"
+                )
+            if nbf > now + leeway:
+                raise VerificationError(
+                    "Claim verification failed: The token is not yet valid (nbf)", reason="not_before"
+                )
+
+        checks.append(check_nbf)
+
+    if policy.issuer is not None:
+        issuer = policy.issuer
+
+        def check_iss(claims: dict[str, Any], _: float) -> None:
+            if claims.get("iss") != issuer:
+                raise VerificationError("Claim verification failed: Invalid issuer", reason="issuer")
+
+        checks.append(check_iss)
+
+    if policy.audience is not None:
+        audience = policy.audience
+
+        def check_aud(claims: dict[str, Any], _: float) -> None:
+            aud = claims.get("aud")
+            audiences = [aud] if isinstance(aud, str) else aud
+            if aud is not None and not (isinstance(audiences, list) and all(isinstance(a, str) for a in audiences)):
+                # An aud list with anything but strings in it is malformed, even if it names the audience too.
+                raise VerificationError("Claim verification failed: Invalid claim format in token", reason="audience")
+            if audiences is None or audience not in audiences:
+                raise VerificationError("Claim verification failed: Invalid audience", reason="audience")
+
+        checks.append(check_aud)
+
+    def check_types(claims: dict[str, Any], _: float) -> None:
+        # The registered-claim type checks jwt.decode always made, so a malformed token is not a valid one.
+        iat = claims.get("iat")
+        if iat is not None and not _is_number(iat):
+            raise VerificationError(
+                "Claim verification failed: Issued At claim (iat) must be an integer.", reason="claims"
+            )
+        sub = claims.get("sub")
+        if sub is not None and not isinstance(sub, str):
+            raise VerificationError("Claim verification failed: Subject must be a string.", reason="claims")
+        jti = claims.get("jti")
+        if jti is not None and not isinstance(jti, str):
+            raise VerificationError("Claim verification failed: JWT ID must be a string.", reason="claims")
+
+    checks.append(check_types)
+
+    for name in policy.required_claims:
+
+        def check_present(claims: dict[str, Any], _: float, name: str = name) -> None:
+            if claims.get(name) in (None, ""):
+                raise VerificationError(f"Missing {name} claim", reason="missing_claim")
+
+        checks.append(check_present)
+
+    return checks
+
+
+class Verifier:
+    """Verify bearer tokens against a ``VerificationPolicy`` compiled once.
+
+    Construction validates the policy, builds static keys, and keeps only the
+    claim checks the policy enables, so a request pays for exactly those
+    checks plus one signature verification. The header and payload are
+    decoded once each; signatures are checked with prebuilt key objects.
+    With a static HMAC secret and ``fast_hmac``, the signature is checked
+    with a prebuilt ``hmac`` object instead of a jose key, and recently seen
+    headers skip decoding.
+
+    With ``metrics``, each stage (cache, header, key, signature, claims,
+    replay, introspect) is timed and every outcome is counted by reason.
+    Without it, the timers are no-ops.
+    """
+
+    def __init__(self, policy: VerificationPolicy, metrics: VerificationMetrics | None = None) -> None:
+        policy.validate()
+        self.policy = policy
+        self._mode = policy.mode
+        self._algorithms = frozenset(policy.algorithms or ())
+        self._expected_algs = ", ".join(policy.algorithms or ())
+        self._static_keys: dict[str, Key] = (
+            {alg: jwk.construct(policy.secret, alg) for alg in policy.algorithms or ()}
+            if policy.secret is not None
+            else {}
+        )
+        self._hmac: dict[str, Any] = {}
+        if policy.secret is not None and policy.fast_hmac:
+            secret = policy.secret.encode("utf-8") if isinstance(policy.secret, str) else policy.secret
+            self._hmac = {
+                alg: hmac.new(secret, digestmod=_HMAC_DIGESTS[alg])
+                for alg in policy.algorithms or ()
+                if alg in _HMAC_DIGESTS
+            }
+        self._headers: dict[str, tuple[str, str | None]] = {}
+        self._keys = policy.keys
+        self._offload = policy.offload
+        self._prefilter = policy.prefilter
+        self._claim_checks = _compile_claim_checks(policy)
+        self._cache = policy.verified_cache
+        if self._cache is None and policy.verified_cache_size > 0:
+            self._cache = VerifiedTokenCache(policy.verified_cache_size, policy.leeway_seconds)
+        self._replay = policy.replay
+        self._introspector = policy.introspector
+        self._metrics = metrics
+        if metrics is not None and self._cache is not None:
+            metrics.watch_cache("verified", self._cache.stats)
+        if metrics is not None and self._prefilter is not None:
+            prefilter = self._prefilter.stats
+            for key in ("too_large", "shape", "negative_hits", "unknown_kid_hits"):
+                metrics.poll(
+                    "prefilter_rejected_total", "counter", "Tokens turned away before verification, by check.",
+                    lambda key=key: prefilter()[key], f'check="{key}"',
+                )
+        if metrics is not None and self._offload is not None:
+            offload = self._offload.stats
+            metrics.poll(
+                "offload_in_flight", "gauge", "Signature checks running or queued off the event loop.",
+                lambda: offload()["in_flight"],
+            )
+            metrics.poll(
+                "offload_total", "counter", "Signature checks sent to the offload executor.",
+                lambda: offload()["offloaded"],
+            )
+            metrics.poll(
+                "offload_rejected_total", "counter", "Signature checks shed because the queue was full.",
+                lambda: offload()["rejected"],
+            )
+
+    def uses_jwt(self, token: str) -> bool:
+        """Whether ``token`` takes the local JWT path under this policy."""
+        return self._mode == "jwt" or (self._mode == "auto" and looks_like_jwt(token))
+
+    async def verify(self, token: str) -> VerifiedToken:
+        metrics = self._metrics
+        if metrics is None:
+            return await self._verify(token, NULL_TIMER)
+        started = time.perf_counter()
+        try:
+            verified = await self._verify(token, metrics.timer())
+        except VerificationError as exc:
+            source = "jwt" if self.uses_jwt(token) else "introspect"
+            metrics.observe_outcome(source, exc.reason, time.perf_counter() - started)
+            raise
+        metrics.observe_outcome(verified.source, "ok", time.perf_counter() - started)
+        return verified
+
+    async def _verify(self, token: str, timer: StageTimer) -> VerifiedToken:
+        try:
+            if self._prefilter is None:
+                return await self._verify_checked(token, timer)
+            self._prefilter.check(token, self._mode)
+            timer.lap("prefilter")
+            try:
+                return await self._verify_checked(token, timer)
+            except VerificationError as exc:
+                self._prefilter.remember(token, exc)
+                raise
+        except VerificationError as exc:
+            if self.policy.detailed_errors or exc.status_code != 401:
+                raise
+            raise VerificationError(GENERIC_DETAIL, reason=exc.reason) from exc
+
+    async def _verify_checked(self, token: str, timer: StageTimer) -> VerifiedToken:
+        if not self.uses_jwt(token):
+            return await self._introspect(token, timer)
+        verified = await self._verify_jwt(token, timer)
+        if self._replay is not None:
+            await self._check_replay(verified.claims)
+            timer.lap("replay")
+        return verified
+
+    def observe_rejection(self, reason: str) -> None:
+        """Count a request turned away before verification, such as by a rate limiter."""
+        if self._metrics is not None:
+            self._metrics.observe_outcome("middleware", reason, 0.0)
+
+    def stats(self) -> dict[str, Any]:
+        stats: dict[str, Any] = {"mode": self._mode, "claim_checks": len(self._claim_checks)}
+        if self._cache is not None:
+            stats["verified_cache"] = self._cache.stats()
+        if self._replay is not None:
+            stats["replay"] = self._replay.stats()
+        if self._offload is not None:
+            stats["offload"] = self._offload.stats()
+        if self._prefilter is not None:
+            stats["prefilter"] = self._prefilter.stats()
+        return stats
+
+    async def _verify_jwt(self, token: str, timer: StageTimer) -> VerifiedToken:
+        if self._cache is not None:
+            hit = self._cache.get(token)
+            timer.lap("cache")
+            if hit is not None:
+                return VerifiedToken(claims=hit[0], kid=hit[1])
+
+        if token.count(".") != 2:
+            raise VerificationError("Invalid token header", reason="header")
+        signing_input, _, signature_b64 = token.rpartition(".")
+        header_b64, _, payload_b64 = signing_input.partition(".")
+        cached = self._headers.get(header_b64)
+        alg, kid = cached or self._parse_header(header_b64)
+        timer.lap("header")
+
+        # Only allowed algs get a template, so a hit has already passed the alg allow-list.
+        template = self._hmac.get(alg)
+        offload = self._offload is not None and self._offload.wants(alg, len(token))
+        if template is not None and not offload:
+            timer.lap("key")
+            try:
+                mac = template.copy()
+                mac.update(signing_input.encode("ascii"))
+                valid = hmac.compare_digest(mac.digest(), _b64decode(signature_b64))
+            except ValueError:
+                valid = False
+        else:
+            key = await self._resolve_key(alg, kid)
+            timer.lap("key")
+            try:
+                signature = _b64decode(signature_b64)
+                if offload:
+                    valid = await self._offload.verify(key, alg, signing_input.encode("ascii"), signature)
+                else:
+                    valid = key.verify(signing_input.encode("ascii"), signature)
+            except (JOSEError, ValueError):
+                valid = False
+            except OffloadBusy as exc:
+                raise VerificationError("Verifier busy", reason="overloaded", status_code=503) from exc
+        if not valid:
+            raise VerificationError("Signature verification failed", reason="signature")
+        if cached is None:
+            # Only signed headers are kept, so forged ones cannot crowd out the handful (one per alg/kid) a
+            # service really sees; the oldest goes first, so keys retired by a rotation age out.
+            if len(self._headers) >= _HEADER_CACHE_SIZE:
+                del self._headers[next(iter(self._headers))]
+            self._headers[header_b64] = (alg, kid)
+        timer.lap("signature")
+
+        try:
+            claims = _decode_segment(payload_b64)
+        except ValueError as exc:
+            raise VerificationError(GENERIC_DETAIL, reason="malformed") from exc
+        if not isinstance(claims, dict):
+            raise VerificationError(GENERIC_DETAIL, reason="malformed")
+
+        now = time.time()
+        for check in self._claim_checks:
+            check(claims, now)
+
+        if self._cache is not None:
+            self._cache.put(token, claims, kid)
+        timer.lap("claims")
+        return VerifiedToken(claims=claims, kid=kid)
+
+    def _parse_header(self, header_b64: str) -> tuple[str, str | None]:
+        try:
+            header = _decode_segment(header_b64)
+        except ValueError as exc:
+            raise VerificationError("Invalid token header", reason="header") from exc
+        if not isinstance(header, dict):
+            raise VerificationError("Invalid token header", reason="header")
+        alg = header.get("alg")
+        kid = header.get("kid")
+        if not isinstance(alg, str) or not isinstance(kid, (str, type(None))):
+            raise VerificationError("Invalid token header", reason="header")
+        return alg, kid
+
+    async def _resolve_key(self, alg: str, kid: str | None) -> Key:
+        if self._algorithms and alg not in self._algorithms:
+            raise VerificationError(f"Unexpected alg {alg}; expected {self._expected_algs}", reason="alg")
+        if self._keys is None:
+            return self._static_keys[alg]
+
+        if not kid:
+            raise VerificationError("Missing kid header", reason="kid")
+        key = await self._keys.get_or_refetch(kid)
+        if key is None:
+            raise VerificationError(f"Unknown signing key: {kid}", reason="unknown_kid")
+        if alg != key.alg:
+            raise VerificationError(f"Unexpected alg {alg} for key {kid}; expected {key.alg}", reason="alg")
+        return key.key
+
+    async def _check_replay(self, claims: dict[str, Any]) -> None:
+        jti = claims.get("jti")
+        if not jti:
+            raise VerificationError("Missing jti claim", reason="missing_claim")
+        # The token is accepted until exp + leeway, so remember it that long too.
+        expires_at = float(claims.get("exp", time.time())) + self.policy.leeway_seconds
+        try:
+            first_use = await self._replay.check_and_store(str(jti), expires_at)
+        except ReplayCacheFull as exc:
+            raise VerificationError("Replay cache full", reason="replay_full", status_code=503) from exc
+        except ReplayStoreUnavailable as exc:
+            raise VerificationError("Replay store unavailable", reason="replay_unavailable", status_code=503) from exc
+        if not first_use:
+            raise VerificationError("Token replay detected", reason="replay", status_code=409)
+
+    async def _introspect(self, token: str, timer: StageTimer) -> VerifiedToken:
+        payload = await self._introspector(token)
+        timer.lap("introspect")
+        if not payload.get("active"):
+            raise VerificationError("Token inactive", reason="inactive")
+        return VerifiedToken(claims=payload, source="introspect")
@@ -0,0 +1,19 @@
+"""Errors raised by the verification engine."""
+from __future__ import annotations
+
+GENERIC_DETAIL = "Token verification failed"
+
+
+class VerificationError(Exception):
+    """A token was rejected.
+
+    ``detail`` is the client-facing message, ``status_code`` the HTTP status
+    it maps to, and ``reason`` a short stable code (``expired``,
+    ``signature``, ``replay``, ...) for logs and metrics.
+    """
+
+    def __init__(self, detail: str, *, reason: str, status_code: int = 401) -> None:
+        super().__init__(detail)
+        self.detail = detail
+        self.reason = reason
+        self.status_code = status_code
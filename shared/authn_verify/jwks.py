@@ -0,0 +1,224 @@
+"""JWKS sources and a background-refreshed key set."""
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Dict, Mapping
+
+from jose import jwk
+from jose.backends.base import Key
+from jose.exceptions import JOSEError
+
+EC_CURVE_ALGS = {"P-256": "ES256", "P-384": "ES384", "P-521": "ES512"}
+MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+JwksDocument = tuple[Dict[str, Any], float | None]
+
+
+@dataclass(frozen=True)
+class VerificationKey:
+    """A JWKS entry turned into a ready-to-use verifier, pinned to one alg."""
+
+    kid: str
+    alg: str
+    key: Key
+
+
+def _key_alg(jwk_dict: Dict[str, Any]) -> str | None:
+    if jwk_dict.get("alg"):
+        return jwk_dict["alg"]
+    if jwk_dict.get("kty") == "RSA":
+        return "RS256"
+    if jwk_dict.get("kty") == "EC":
+        return EC_CURVE_ALGS.get(jwk_dict.get("crv", ""))
+    return None
+
+
+def build_keys(raw: Dict[str, Any]) -> Dict[str, VerificationKey]:
+    """Construct each signing key once so requests never rebuild it from JWK parameters."""
+    keys: Dict[str, VerificationKey] = {}
+    for entry in raw.get("keys", []):
+        if entry.get("use") not in {None, "sig"} or not entry.get("kid"):
+            continue
+        alg = _key_alg(entry)
+        if alg is None:
+            continue
+        try:
+            key = jwk.construct(entry, alg)
+        except (JOSEError, KeyError, TypeError, ValueError):
+            # A malformed key must not take the rest of the key set down with it.
+            continue
+        keys[entry["kid"]] = VerificationKey(kid=entry["kid"], alg=alg, key=key)
+    return keys
+
+
+def jwks_loader(
+    inline: str | None = None,
+    path: str | None = None,
+    url: str | None = None,
+    timeout: float = 5.0,
+) -> Callable[[], Awaitable[JwksDocument]]:
+    """Return a coroutine function that fetches the raw JWKS and its max-age, if any."""
+
+    async def load_inline() -> JwksDocument:
+        return json.loads(inline or "{}"), None
+
+    async def load_file() -> JwksDocument:
+        def read() -> Dict[str, Any]:
+            with open(path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+
+        return await asyncio.to_thread(read), None
+
+    async def load_url() -> JwksDocument:
+        import httpx
+
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            resp = await client.get(url)
+        return _jwks_document(resp)
+
+    if inline:
+        return load_inline
+    if path:
+        return load_file
+    if url:
+        return load_url
+    return load_inline
+
+
+def _jwks_document(resp: Any) -> JwksDocument:
+    resp.raise_for_status()
+    match = MAX_AGE_RE.search(resp.headers.get("cache-control", ""))
+    return resp.json(), float(match.group(1)) if match else None
+
+
+class OidcDiscovery:
+    """Resolve ``jwks_uri`` from ``/.well-known/openid-configuration`` and fetch the JWKS.
+
+    ``get_client`` returns the caller's pooled ``httpx.AsyncClient`` so key
+    fetches share its connections. Use ``load_jwks`` as a ``JwksManager`` loader.
+    """
+
+    def __init__(self, issuer: str, get_client: Callable[[], Any]) -> None:
+        self.configured_issuer = issuer
+        self.issuer: str | None = None
+        self.jwks_uri: str | None = None
+        self._get_client = get_client
+
+    async def load_jwks(self) -> JwksDocument:
+        client = self._get_client()
+        if self.jwks_uri is None:
+            resp = await client.get(f"{self.configured_issuer.rstrip('/')}/.well-known/openid-configuration")
+            resp.raise_for_status()
+            metadata = resp.json()
+            self.jwks_uri = metadata["jwks_uri"]
+            self.issuer = metadata.get("issuer", self.configured_issuer)
+        return _jwks_document(await client.get(self.jwks_uri))
+
+
+class JwksManager:
+    """Serve a JWKS snapshot that is refreshed off the request path.
+
+    Readers only ever see a complete key set: a refresh builds a new mapping
+    and swaps the reference in one assignment. If a refresh fails, the stale
+    set keeps serving. Refreshes run on ``refresh_interval`` (or the source's
+    ``Cache-Control: max-age``), and a token with an unknown ``kid`` triggers
+    at most one refetch per ``min_refetch_interval``, shared by every request
+    that is waiting for it.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[JwksDocument]],
+        refresh_interval: float = 300.0,
+        min_refetch_interval: float = 30.0,
+    ) -> None:
+        self._loader = loader
+        self.refresh_interval = refresh_interval
+        self.min_refetch_interval = min_refetch_interval
+        self._keys: Mapping[str, VerificationKey] = MappingProxyType({})
+        self._raw: Dict[str, Any] | None = None
+        self._inflight: asyncio.Task | None = None
+        self._background: asyncio.Task | None = None
+        self._next_delay = refresh_interval
+        self._last_unknown_refetch = float("-inf")
+        self.loaded_at: float | None = None
+        self.refreshes = 0
+        self.failures = 0
+
+    @property
+    def keys(self) -> Mapping[str, VerificationKey]:
+        return self._keys
+
+    def get(self, kid: str) -> VerificationKey | None:
+        return self._keys.get(kid)
+
+    async def get_or_refetch(self, kid: str) -> VerificationKey | None:
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+        now = time.monotonic()
+        if self._inflight is None and now - self._last_unknown_refetch < self.min_refetch_interval:
+            return None
+        self._last_unknown_refetch = now
+        await self.refresh()
+        return self._keys.get(kid)
+
+    async def refresh(self) -> bool:
+        """Reload the key set; concurrent callers share one fetch."""
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._reload())
+            self._inflight.add_done_callback(self._reload_done)
+        return await asyncio.shield(self._inflight)
+
+    async def start(self) -> None:
+        await self.refresh()
+        self._background = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._background is not None:
+            self._background.cancel()
+            try:
+                await self._background
+            except asyncio.CancelledError:
+                pass
+            self._background = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "keys": sorted(self._keys),
+            "loaded_at": self.loaded_at,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "next_refresh_seconds": self._next_delay,
+        }
+
+    async def _reload(self) -> bool:
+        try:
+            raw, max_age = await self._loader()
+            keys = build_keys(raw) if raw != self._raw else None
+        except Exception:  # noqa: BLE001 - any source failure keeps the stale set
+            self.failures += 1
+            self._next_delay = self.min_refetch_interval
+            return False
+        if keys is not None:
+            self._keys = MappingProxyType(keys)
+            self._raw = raw
+        self.loaded_at = time.time()
+        self.refreshes += 1
+        delay = max_age if max_age is not None else self.refresh_interval
+        self._next_delay = max(delay, self.min_refetch_interval)
+        return True
+
+    def _reload_done(self, task: asyncio.Task) -> None:
+        if self._inflight is task:
+            self._inflight = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._next_delay)
+            await self.refresh()
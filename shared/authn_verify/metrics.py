@@ -0,0 +1,152 @@
+"""Verification latency and outcome metrics in the Prometheus text format."""
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import Counter
+from time import perf_counter
+from typing import Any, Callable
+
+# Verification stages are microseconds locally and milliseconds over the network.
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.total}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class _Histograms(dict):
+    """Histogram per label value, created on first use."""
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        super().__init__()
+        self.buckets = buckets
+
+    def __missing__(self, key: str) -> Histogram:
+        histogram = self[key] = Histogram(self.buckets)
+        return histogram
+
+
+class StageTimer:
+    """Attribute the time since the previous lap to a named stage."""
+
+    __slots__ = ("_stages", "_last")
+
+    def __init__(self, stages: _Histograms) -> None:
+        self._stages = stages
+        self._last = perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = perf_counter()
+        self._stages[stage].observe(now - self._last)
+        self._last = now
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def lap(self, stage: str) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class VerificationMetrics:
+    """Per-stage histograms, outcome counters, and polled cache gauges.
+
+    The hot path only bumps integers: a histogram observation is one bisect
+    over a fixed bucket tuple. Cache and replay statistics are read from
+    their ``stats()`` when ``/metrics`` is scraped, never per request.
+    """
+
+    def __init__(self, prefix: str = "authn_verify", buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.prefix = prefix
+        self._stages = _Histograms(buckets)
+        self._durations = _Histograms(buckets)
+        self._outcomes: Counter[tuple[str, str]] = Counter()
+        self._polled: list[tuple[str, str, str, str, Callable[[], float | None]]] = []
+
+    def timer(self) -> StageTimer:
+        return StageTimer(self._stages)
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        self._stages[stage].observe(seconds)
+
+    def observe_outcome(self, source: str, reason: str, seconds: float) -> None:
+        self._outcomes[(source, reason)] += 1
+        self._durations[source].observe(seconds)
+
+    def poll(self, name: str, kind: str, help_text: str, read: Callable[[], float | None], labels: str = "") -> None:
+        """Report ``read()`` as ``prefix_name`` at scrape time; None values are skipped."""
+        self._polled.append((name, kind, help_text, labels, read))
+
+    def watch_cache(self, cache: str, stats: Callable[[], dict[str, Any]]) -> None:
+        """Expose hits, misses, hit ratio, and size from a cache's ``stats()``."""
+        labels = f'cache="{cache}"'
+        self.poll("cache_hits_total", "counter", "Cache hits.", lambda: stats().get("hits"), labels)
+        self.poll("cache_misses_total", "counter", "Cache misses.", lambda: stats().get("misses"), labels)
+        self.poll("cache_hit_ratio", "gauge", "Cache hits / lookups.", lambda: _hit_ratio(stats()), labels)
+        self.poll("cache_entries", "gauge", "Entries currently cached.", lambda: stats().get("entries"), labels)
+
+    def render(self) -> str:
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds Time spent in each verification stage.",
+            f"# TYPE {p}_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(self._stages.items()):
+            lines.extend(histogram.render(f"{p}_stage_seconds", f'stage="{stage}"'))
+        lines += [
+            f"# HELP {p}_duration_seconds End-to-end verification time by path.",
+            f"# TYPE {p}_duration_seconds histogram",
+        ]
+        for source, histogram in sorted(self._durations.items()):
+            lines.extend(histogram.render(f"{p}_duration_seconds", f'source="{source}"'))
+        lines += [
+            f"# HELP {p}_outcomes_total Verification results by path and reason (ok or the failure reason).",
+            f"# TYPE {p}_outcomes_total counter",
+        ]
+        for (source, reason), count in sorted(self._outcomes.items()):
+            lines.append(f'{p}_outcomes_total{{source="{source}",reason="{reason}"}} {count}')
+
+        # Group samples by metric name; the exposition format wants each family contiguous.
+        families: dict[str, list[str]] = {}
+        for name, kind, help_text, labels, read in self._polled:
+            value = read()
+            if value is None:
+                continue
+            family = families.setdefault(name, [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} {kind}"])
+            family.append(f"{p}_{name}{{{labels}}} {value}" if labels else f"{p}_{name} {value}")
+        for family in families.values():
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+
+def _hit_ratio(stats: dict[str, Any]) -> float | None:
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    return round(stats.get("hits", 0) / lookups, 6) if lookups else None
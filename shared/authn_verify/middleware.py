@@ -0,0 +1,144 @@
+"""Pure-ASGI bearer authentication that rejects bad requests before routing."""
+from __future__ import annotations
+
+import json
+import math
+import time
+from typing import Any, Awaitable, Callable, Iterable, MutableMapping
+
+from .engine import Verifier
+from .errors import VerificationError
+from .prefilter import FailureLimiter
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+STATE_KEY = "verified_token"
+TIMING_KEY = "verify_seconds"
+MISSING_HEADER = "Missing Authorization header"
+RATE_LIMITED = "Too many failed authentication attempts"
+_RESPONSE_CACHE_SIZE = 256
+
+
+def _response(status_code: int, detail: str, challenge: bool = True) -> tuple[Message, Message]:
+    # Byte-for-byte what Starlette's JSONResponse renders for an HTTPException.
+    body = json.dumps({"detail": detail}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    if challenge and status_code < 500:
+        headers.append((b"www-authenticate", b"Bearer"))
+    return (
+        {"type": "http.response.start", "status": status_code, "headers": headers},
+        {"type": "http.response.body", "body": body},
+    )
+
+
+class BearerAuthMiddleware:
+    """Verify the bearer token of requests to ``paths`` before the app routes them.
+
+    The ``authorization`` header is read straight from the scope. Missing,
+    malformed, and unverifiable tokens are answered here with prebuilt
+    response messages, in the same ``{"detail": ...}`` shape and headers as
+    ``to_http_exception``, so a flood of junk tokens never reaches routing,
+    dependency resolution, or ``HTTPException``. A verified token is stored
+    as ``scope["state"]["verified_token"]`` (``request.state.verified_token``)
+    with the time verification took under ``verify_seconds``.
+
+    ``paths`` entries match exactly, or as a prefix when they end in ``/``.
+    Other paths pass through untouched.
+
+    With a ``limiter``, every 401 is charged to the client's address
+    (``scope["client"]``, or whatever ``client_key`` returns), and a client
+    whose failure budget is spent gets a 429 with ``Retry-After`` before its
+    token is even looked at.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        verifier: Verifier,
+        paths: Iterable[str] = ("/protected",),
+        limiter: FailureLimiter | None = None,
+        client_key: Callable[[Scope], str] | None = None,
+    ) -> None:
+        self.app = app
+        self.verifier = verifier
+        self.limiter = limiter
+        self._client_key = client_key or _client_address
+        paths = tuple(paths)
+        self._exact = frozenset(path for path in paths if not path.endswith("/"))
+        self._prefixes = tuple(path for path in paths if path.endswith("/"))
+        self._responses: dict[tuple[int, str], tuple[Message, Message]] = {}
+        self._missing = _response(401, MISSING_HEADER)
+        self._limited = _response(429, RATE_LIMITED, challenge=False)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._protects(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter
+        client = self._client_key(scope) if limiter is not None else ""
+        if limiter is not None and not limiter.allow(client):
+            self.verifier.observe_rejection("rate_limited")
+            await self._reject(send, self._rate_limited(math.ceil(limiter.retry_after(client))))
+            return
+
+        header = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                header = value
+                break
+        # The same scheme check as HTTPBearer: "Bearer" in any case, then a non-empty credential.
+        scheme, _, credentials = (header or b"").partition(b" ")
+        if not credentials or scheme.lower() != b"bearer":
+            if limiter is not None:
+                limiter.failure(client)
+            await self._reject(send, self._missing)
+            return
+
+        started = time.perf_counter()
+        try:
+            verified = await self.verifier.verify(credentials.decode("latin-1"))
+        except VerificationError as exc:
+            # Only the caller's own failures count against it, not a 503 from an outage.
+            if limiter is not None and exc.status_code == 401:
+                limiter.failure(client)
+            await self._reject(send, self._rejection(exc))
+            return
+        state = scope.setdefault("state", {})
+        state[STATE_KEY] = verified
+        state[TIMING_KEY] = time.perf_counter() - started
+        await self.app(scope, receive, send)
+
+    def _protects(self, path: str) -> bool:
+        return path in self._exact or (bool(self._prefixes) and path.startswith(self._prefixes))
+
+    def _rejection(self, exc: VerificationError) -> tuple[Message, Message]:
+        key = (exc.status_code, exc.detail)
+        response = self._responses.get(key)
+        if response is None:
+            response = _response(*key)
+            # Details are mostly fixed strings; the few that echo a kid or alg must not grow this without bound.
+            if len(self._responses) < _RESPONSE_CACHE_SIZE:
+                self._responses[key] = response
+        return response
+
+    def _rate_limited(self, retry_after: int) -> tuple[Message, Message]:
+        start, body = self._limited
+        headers = [*start["headers"], (b"retry-after", str(max(1, retry_after)).encode())]
+        return {**start, "headers": headers}, body
+
+    @staticmethod
+    async def _reject(send: Send, response: tuple[Message, Message]) -> None:
+        start, body = response
+        # Outer middleware (CORS, for one) may add headers in place, so each send gets its own list.
+        await send({**start, "headers": list(start["headers"])})
+        await send(body)
+
+
+def _client_address(scope: Scope) -> str:
+    client = scope.get("client")
+    return client[0] if client else ""
@@ -0,0 +1,165 @@
+"""Run signature checks inline, on a thread pool, or on a process pool."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+from jose import jwk
+from jose.backends.base import Key
+
+INLINE = "inline"
+THREAD = "thread"
+PROCESS = "process"
+STRATEGIES = (INLINE, THREAD, PROCESS)
+
+ASYMMETRIC_ALGS = frozenset(
+    {"RS256", "RS384", "RS512", "PS256", "PS384", "PS512", "ES256", "ES384", "ES512"}
+)
+
+# Keys rebuilt inside each pool process, by fingerprint of their public JWK.
+_WORKER_KEYS: dict[str, Key] = {}
+_WORKER_KEYS_MAX = 64
+
+
+class OffloadBusy(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+def _verify_in_worker(fingerprint: str, material: dict[str, Any], alg: str, message: bytes, signature: bytes) -> bool:
+    key = _WORKER_KEYS.get(fingerprint)
+    if key is None:
+        if len(_WORKER_KEYS) >= _WORKER_KEYS_MAX:
+            _WORKER_KEYS.clear()
+        key = _WORKER_KEYS[fingerprint] = jwk.construct(material, alg)
+    return key.verify(message, signature)
+
+
+def _noop() -> None:
+    return None
+
+
+class SignatureOffload:
+    """Decide where each signature check runs, and bound how many may wait.
+
+    Checks for algs in ``algorithms`` (RSA and EC by default), and for any
+    token of at least ``large_token_bytes``, go to the executor; everything
+    else runs inline, since an HMAC is cheaper than the hop to a thread.
+    ``thread`` suits crypto backends that release the GIL; ``process``
+    sidesteps the GIL entirely at the cost of pickling each message and
+    rebuilding each key once per worker process.
+
+    At most ``max_workers`` checks run at once and ``max_queue`` more wait.
+    Past that, ``verify`` raises ``OffloadBusy`` so the caller can shed load
+    with a 503 instead of letting the queue, and every request's latency,
+    grow without bound.
+    """
+
+    def __init__(
+        self,
+        strategy: str = THREAD,
+        *,
+        algorithms: frozenset[str] | tuple[str, ...] = ASYMMETRIC_ALGS,
+        large_token_bytes: int | None = 16384,
+        max_workers: int | None = None,
+        max_queue: int = 64,
+    ) -> None:
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown offload strategy: {strategy}")
+        if max_queue < 0:
+            raise ValueError("max_queue must be at least 0")
+        self.strategy = strategy
+        self._algorithms = frozenset(algorithms)
+        self._large_token_bytes = large_token_bytes
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._limit = self._max_workers + max_queue
+        self._executor: Executor | None = None
+        self._fingerprints: weakref.WeakKeyDictionary[Key, tuple[str, dict[str, Any]]] = weakref.WeakKeyDictionary()
+        self._in_flight = 0
+        self._peak = 0
+        self._offloaded = 0
+        self._rejected = 0
+        self._fallbacks = 0
+
+    def wants(self, alg: str, token_length: int) -> bool:
+        """Whether a check for this alg and token size should leave the event loop."""
+        if self.strategy == INLINE:
+            return False
+        if alg in self._algorithms:
+            return True
+        return self._large_token_bytes is not None and token_length >= self._large_token_bytes
+
+    async def start(self) -> None:
+        """Create the pool and, for processes, spawn every worker now rather than on the first request."""
+        executor = self._ensure_executor()
+        if self.strategy == PROCESS:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(executor, _noop) for _ in range(self._max_workers)))
+
+    def close(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    async def verify(self, key: Key, alg: str, message: bytes, signature: bytes) -> bool:
+        if self._in_flight >= self._limit:
+            self._rejected += 1
+            raise OffloadBusy(f"{self._in_flight} signature checks already running or queued")
+        self._in_flight += 1
+        self._peak = max(self._peak, self._in_flight)
+        self._offloaded += 1
+        try:
+            loop = asyncio.get_running_loop()
+            executor = self._ensure_executor()
+            if self.strategy == THREAD:
+                return await loop.run_in_executor(executor, key.verify, message, signature)
+            fingerprint, material = self._material(key)
+            try:
+                return await loop.run_in_executor(
+                    executor, _verify_in_worker, fingerprint, material, alg, message, signature
+                )
+            except BrokenProcessPool:
+                # A crashed worker poisons the whole pool; answer this request inline and rebuild.
+                self._fallbacks += 1
+                self.close(wait=False)
+                return key.verify(message, signature)
+        finally:
+            self._in_flight -= 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "strategy": self.strategy,
+            "max_workers": self._max_workers,
+            "limit": self._limit,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak,
+            "offloaded": self._offloaded,
+            "rejected": self._rejected,
+            "fallbacks": self._fallbacks,
+        }
+
+    def _ensure_executor(self) -> Executor:
+        if self._executor is None:
+            if self.strategy == PROCESS:
+                # Spawned, not forked: forking a process that runs an event loop and threads is unsafe.
+                self._executor = ProcessPoolExecutor(
+                    self._max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(self._max_workers, thread_name_prefix="authn-verify")
+        return self._executor
+
+    def _material(self, key: Key) -> tuple[str, dict[str, Any]]:
+        cached = self._fingerprints.get(key)
+        if cached is None:
+            material = key.to_dict()
+            fingerprint = hashlib.blake2b(json.dumps(material, sort_keys=True).encode(), digest_size=16).hexdigest()
+            cached = (fingerprint, material)
+            self._fingerprints[key] = cached
+        return cached
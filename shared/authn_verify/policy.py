@@ -0,0 +1,78 @@
+"""Declarative description of what a resource server checks on each token."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Protocol
+
+from .jwks import VerificationKey
+from .offload import SignatureOffload
+from .prefilter import TokenPrefilter
+from .replay import ReplayCache
+
+MODES = ("jwt", "introspect", "auto")
+
+
+class KeyProvider(Protocol):
+    async def get_or_refetch(self, kid: str) -> VerificationKey | None:
+        """Return the key for ``kid``, refetching the key set if it is unknown."""
+        ...
+
+
+class VerifiedCache(Protocol):
+    def get(self, token: str) -> tuple[dict[str, Any], str | None] | None:
+        ...
+
+    def put(self, token: str, claims: dict[str, Any], kid: str | None = None) -> None:
+        ...
+
+    def stats(self) -> dict[str, Any]:
+        ...
+
+
+@dataclass(frozen=True)
+class VerificationPolicy:
+    """Everything a ``Verifier`` enforces, fixed at startup.
+
+    ``mode`` picks the path: ``jwt`` verifies locally, ``introspect`` asks the
+    issuer through ``introspector``, and ``auto`` sends JWT-shaped tokens down
+    the local path and opaque ones to introspection. Locally verified tokens
+    are signed by ``secret`` (one static key, any of ``algorithms``) or by a
+    ``keys`` provider such as ``JwksManager`` that pins one alg per ``kid``.
+    Unset checks are left out of the compiled pipeline entirely.
+    ``verified_cache_size`` builds an in-process cache of verified claims,
+    unless ``verified_cache`` supplies one, e.g. a ``SharedVerifiedTokenCache``.
+    ``fast_hmac`` checks HS256/384/512 signatures under a static secret with
+    the standard library instead of jose key objects; results are identical.
+    ``offload`` moves slow (RSA/EC) signature checks off the event loop, and
+    ``prefilter`` rejects garbage before any decoding or introspection.
+    """
+
+    mode: str = "jwt"
+    algorithms: tuple[str, ...] | None = None
+    secret: str | bytes | None = None
+    keys: KeyProvider | None = None
+    issuer: str | None = None
+    audience: str | None = None
+    leeway_seconds: float = 0
+    verify_exp: bool = True
+    verify_nbf: bool = True
+    required_claims: tuple[str, ...] = ()
+    replay: ReplayCache | None = None
+    verified_cache_size: int = 0
+    verified_cache: VerifiedCache | None = None
+    introspector: Callable[[str], Awaitable[dict[str, Any]]] | None = None
+    detailed_errors: bool = True
+    fast_hmac: bool = True
+    offload: SignatureOffload | None = None
+    prefilter: TokenPrefilter | None = None
+
+    def validate(self) -> None:
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown verification mode: {self.mode}")
+        if self.mode != "introspect":
+            if (self.secret is None) == (self.keys is None):
+                raise ValueError("JWT verification needs exactly one of secret or keys")
+            if self.secret is not None and not self.algorithms:
+                raise ValueError("A static secret needs an explicit algorithms allow-list")
+        if self.mode != "jwt" and self.introspector is None:
+            raise ValueError(f"Mode {self.mode} needs an introspector")
@@ -0,0 +1,188 @@
+"""Cheap rejections that run before any decoding, signature, or introspection work."""
+from __future__ import annotations
+
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from .errors import VerificationError
+
+# Compact JWS: three base64url segments (jose tolerates trailing padding, so this does too).
+JWT_SHAPE = re.compile(r"[A-Za-z0-9_-]+={0,2}\.[A-Za-z0-9_-]+={0,2}\.[A-Za-z0-9_-]*={0,2}")
+# RFC 6750 b64token, the syntax of any bearer credential, JWT or opaque.
+BEARER_SHAPE = re.compile(r"[A-Za-z0-9\-._~+/]+=*")
+
+# Rejections that stay true for the same token; not_before, replay, and outages can change.
+# Header and payload parse failures are left out: finding them again costs no more than a lookup.
+# "inactive" is left out too: it is the issuer's answer, and the introspection cache owns how long to trust it.
+CACHEABLE_REASONS = frozenset({"alg", "signature", "expired", "issuer", "audience", "claims", "missing_claim"})
+
+
+def _digest(value: str) -> bytes:
+    return hashlib.blake2b(value.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+class _ExpiringLru:
+    """At most ``size`` keys, least recently used evicted first, each valid until its own deadline."""
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, now: float) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any, expires_at: float) -> None:
+        if self._size <= 0:
+            return
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TokenPrefilter:
+    """Turn away oversized, malformed, and recently rejected tokens for microseconds of work.
+
+    ``check`` runs before the verifier decodes anything: a size limit, a
+    shape check for tokens bound for introspection, then two negative
+    caches. Those tokens must be an RFC 6750 bearer credential and, if
+    ``opaque_pattern`` is given, match what the issuer's tokens look like,
+    so garbage never reaches the issuer.
+    Tokens rejected for a reason that cannot change (bad signature, expired,
+    wrong audience, ...) are remembered by digest for ``negative_ttl`` seconds and
+    answered with the same error. Header segments that named an unknown
+    ``kid`` are remembered for ``unknown_kid_ttl``, kept short so a key
+    rotation is not hidden for longer than one JWKS refetch interval.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_token_bytes: int = 8192,
+        opaque_pattern: str | None = None,
+        negative_cache_size: int = 4096,
+        negative_ttl: float = 300.0,
+        unknown_kid_ttl: float = 10.0,
+    ) -> None:
+        self.max_token_bytes = max_token_bytes
+        self._opaque = re.compile(opaque_pattern) if opaque_pattern else None
+        self._rejected = _ExpiringLru(negative_cache_size)
+        self._unknown_kids = _ExpiringLru(min(negative_cache_size, 1024))
+        self._negative_ttl = negative_ttl
+        self._unknown_kid_ttl = unknown_kid_ttl
+        self._counts = {"too_large": 0, "shape": 0, "negative_hits": 0, "unknown_kid_hits": 0}
+        # The digest ``check`` computed, reused by ``remember`` when the same token is rejected.
+        self._last: tuple[str, bytes] = ("", b"")
+
+    def check(self, token: str, mode: str) -> None:
+        """Raise ``VerificationError`` if ``token`` cannot pass a verifier in ``mode``."""
+        if len(token) > self.max_token_bytes:
+            self._counts["too_large"] += 1
+            raise VerificationError("Token too large", reason="too_large")
+        # In jwt mode the engine's header parse is the shape check, and no cheaper than a regex would be.
+        jwt_shaped = mode == "jwt" or (mode == "auto" and JWT_SHAPE.fullmatch(token) is not None)
+        if not jwt_shaped:
+            if BEARER_SHAPE.fullmatch(token) is None or (
+                self._opaque is not None and self._opaque.fullmatch(token) is None
+            ):
+                self._counts["shape"] += 1
+                raise VerificationError("Invalid token format", reason="malformed")
+
+        now = time.monotonic()
+        if self._rejected:
+            digest = _digest(token)
+            self._last = (token, digest)
+            cached = self._rejected.get(digest, now)
+            if cached is not None:
+                self._counts["negative_hits"] += 1
+                raise VerificationError(cached[0], reason=cached[1], status_code=cached[2])
+        if jwt_shaped and self._unknown_kids:
+            kid_error = self._unknown_kids.get(_digest(token.partition(".")[0]), now)
+            if kid_error is not None:
+                self._counts["unknown_kid_hits"] += 1
+                raise VerificationError(kid_error, reason="unknown_kid")
+
+    def remember(self, token: str, exc: VerificationError) -> None:
+        """Record a rejection from the full verifier so the next copy of ``token`` is cheap."""
+        now = time.monotonic()
+        if exc.reason in CACHEABLE_REASONS:
+            last_token, digest = self._last
+            if last_token is not token:
+                digest = _digest(token)
+            self._rejected.put(digest, (exc.detail, exc.reason, exc.status_code), now + self._negative_ttl)
+        elif exc.reason == "unknown_kid":
+            self._unknown_kids.put(_digest(token.partition(".")[0]), exc.detail, now + self._unknown_kid_ttl)
+
+    def stats(self) -> dict[str, Any]:
+        return {**self._counts, "rejected_entries": len(self._rejected), "unknown_kid_entries": len(self._unknown_kids)}
+
+
+class FailureLimiter:
+    """Token bucket per client, spent by failed verifications.
+
+    Each client may fail ``burst`` times in a row and then ``rate`` times per
+    second. While its bucket is empty, its requests are turned away before
+    any verification work. Buckets live in an LRU of ``max_clients``; an
+    evicted client starts again with a full bucket, so memory stays bounded
+    however many addresses an attacker uses.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 20, max_clients: int = 10000) -> None:
+        if rate <= 0 or burst < 1:
+            raise ValueError("FailureLimiter needs a positive rate and a burst of at least 1")
+        self.rate = rate
+        self.burst = float(burst)
+        self._max_clients = max_clients
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+        self._blocked = 0
+        self._evicted = 0
+
+    def allow(self, client: str) -> bool:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            return True
+        if self._refill(bucket, time.monotonic()) >= 1.0:
+            return True
+        self._blocked += 1
+        return False
+
+    def retry_after(self, client: str) -> float:
+        """Seconds until ``client`` may try again."""
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            return 0.0
+        return max(0.0, (1.0 - self._refill(bucket, time.monotonic())) / self.rate)
+
+    def failure(self, client: str) -> None:
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [self.burst, now]
+            if len(self._buckets) > self._max_clients:
+                self._buckets.popitem(last=False)
+                self._evicted += 1
+        else:
+            self._buckets.move_to_end(client)
+            self._refill(bucket, now)
+        bucket[0] = max(0.0, bucket[0] - 1.0)
+
+    def stats(self) -> dict[str, Any]:
+        return {"clients": len(self._buckets), "blocked": self._blocked, "evicted": self._evicted}
+
+    def _refill(self, bucket: list[float], now: float) -> float:
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        return bucket[0]
@@ -0,0 +1,260 @@
+"""Pluggable jti replay caches."""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import threading
+import time
+from typing import Any, Protocol
+
+OVERFLOW_REJECT = "reject"
+OVERFLOW_EVICT = "evict"
+FAIL_CLOSED = "closed"
+FAIL_OPEN = "open"
+
+
+class ReplayCacheFull(Exception):
+    """Raised when the cache is at capacity and the overflow policy is ``reject``."""
+
+
+class ReplayStoreUnavailable(Exception):
+    """Raised when a remote replay store is too slow or unreachable and the policy fails closed."""
+
+
+class ReplayCache(Protocol):
+    async def check_and_store(self, jti: str, expires_at: float) -> bool:
+        """Record ``jti`` until ``expires_at``; return False if it is already live."""
+        ...
+
+    def stats(self) -> dict[str, Any]:
+        ...
+
+
+class _Shard:
+    __slots__ = ("entries", "heap", "lock")
+
+    def __init__(self) -> None:
+        self.entries: dict[str, float] = {}
+        self.heap: list[tuple[float, str]] = []
+        self.lock = threading.Lock()
+
+
+class InMemoryReplayCache:
+    """Lock-sharded replay cache with heap-ordered expiry.
+
+    Each shard keeps a dict for O(1) membership and a min-heap of
+    ``(expires_at, jti)`` so purging only touches entries that have actually
+    expired (amortized O(log n) per insert) instead of scanning every live
+    ``jti``. ``max_entries`` is a hard bound across all shards; when a shard
+    is full, ``overflow="reject"`` fails closed with ``ReplayCacheFull`` and
+    ``overflow="evict"`` drops the entry closest to expiry.
+    """
+
+    def __init__(self, shards: int = 16, max_entries: int = 1_000_000, overflow: str = OVERFLOW_REJECT) -> None:
+        if overflow not in {OVERFLOW_REJECT, OVERFLOW_EVICT}:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self._shards = [_Shard() for _ in range(shards)]
+        self._shard_capacity = max(1, max_entries // shards)
+        self.overflow = overflow
+        self.evictions = 0
+        self.rejections = 0
+
+    async def check_and_store(self, jti: str, expires_at: float) -> bool:
+        return self.add(jti, expires_at)
+
+    def add(self, jti: str, expires_at: float, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        shard = self._shards[hash(jti) % len(self._shards)]
+        with shard.lock:
+            self._purge(shard, now)
+            if jti in shard.entries:
+                return False
+            if len(shard.entries) >= self._shard_capacity:
+                if self.overflow == OVERFLOW_REJECT:
+                    self.rejections += 1
+                    raise ReplayCacheFull("Replay cache is full")
+                self._evict_one(shard)
+            shard.entries[jti] = expires_at
+            heapq.heappush(shard.heap, (expires_at, jti))
+            return True
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": "memory",
+            "entries": len(self),
+            "capacity": self._shard_capacity * len(self._shards),
+            "shards": len(self._shards),
+            "overflow": self.overflow,
+            "evictions": self.evictions,
+            "rejections": self.rejections,
+        }
+
+    @staticmethod
+    def _purge(shard: _Shard, now: float) -> None:
+        heap = shard.heap
+        while heap and heap[0][0] <= now:
+            expires_at, jti = heapq.heappop(heap)
+            if shard.entries.get(jti) == expires_at:
+                del shard.entries[jti]
+
+    def _evict_one(self, shard: _Shard) -> None:
+        while shard.heap:
+            expires_at, jti = heapq.heappop(shard.heap)
+            if shard.entries.get(jti) == expires_at:
+                del shard.entries[jti]
+                self.evictions += 1
+                return
+
+
+class RedisReplayCache:
+    """Replay cache backed by any Redis-protocol server, shared by every node.
+
+    ``SET key 1 NX PX ttl`` records the jti and reports whether it was new in
+    one atomic command, and the server expires keys on its own. Concurrent
+    checks are batched: the first caller schedules a flush, everything that
+    arrives before it runs goes out in one non-transactional pipeline, and
+    callers that arrive while a pipeline is in flight form the next one. A
+    busy node therefore pays one round trip per batch, not per request.
+
+    Each check waits at most ``timeout`` seconds. When the store is slow or
+    down, ``failure_policy="closed"`` raises ``ReplayStoreUnavailable`` and
+    ``"open"`` accepts the token unchecked, trading replay protection for
+    availability. The memory bound and overflow behaviour come from the
+    server's ``maxmemory`` and ``maxmemory-policy`` (use ``noeviction`` to
+    fail closed). ``client`` is any ``redis.asyncio``-compatible client;
+    ``authn_verify.resp_stub`` runs a local stand-in server.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        prefix: str = "authn:jti:",
+        *,
+        timeout: float | None = 0.05,
+        failure_policy: str = FAIL_CLOSED,
+        max_batch: int = 256,
+    ) -> None:
+        if failure_policy not in {FAIL_OPEN, FAIL_CLOSED}:
+            raise ValueError(f"Unknown failure policy: {failure_policy}")
+        self._client = client
+        self._prefix = prefix
+        self.timeout = timeout
+        self.failure_policy = failure_policy
+        self.max_batch = max_batch
+        self._pending: list[tuple[str, int, asyncio.Future]] = []
+        self._flusher: asyncio.Task | None = None
+        self.batches = 0
+        self.commands = 0
+        self.largest_batch = 0
+        self.failures = 0
+        self.accepted_unchecked = 0
+
+    @classmethod
+    def from_url(
+        cls, url: str, prefix: str = "authn:jti:", *, socket_timeout: float = 1.0, **options: Any
+    ) -> "RedisReplayCache":
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("The redis replay backend requires `pip install redis`") from exc
+        # The socket timeout only unsticks a hung connection; ``timeout`` bounds each request.
+        return cls(redis_asyncio.from_url(url, socket_timeout=socket_timeout), prefix=prefix, **options)
+
+    async def check_and_store(self, jti: str, expires_at: float) -> bool:
+        ttl_ms = max(1, int((expires_at - time.time()) * 1000))
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((f"{self._prefix}{jti}", ttl_ms, future))
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except (asyncio.TimeoutError, ReplayStoreUnavailable) as exc:
+            self.failures += 1
+            if self.failure_policy == FAIL_OPEN:
+                self.accepted_unchecked += 1
+                return True
+            raise ReplayStoreUnavailable(str(exc) or "Replay store timed out") from exc
+
+    async def _flush(self) -> None:
+        try:
+            # Let every request already scheduled on this loop iteration join the first batch.
+            await asyncio.sleep(0)
+            while self._pending:
+                batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch :]
+                pipe = self._client.pipeline(transaction=False)
+                for key, ttl_ms, _ in batch:
+                    pipe.set(key, b"1", nx=True, px=ttl_ms)
+                try:
+                    results = await pipe.execute()
+                except Exception as exc:  # noqa: BLE001 - any store failure goes to the failure policy
+                    error = ReplayStoreUnavailable(f"Replay store error: {exc}")
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(error)
+                            # Callers that already timed out never retrieve it.
+                            future.exception()
+                    continue
+                for (_, _, future), created in zip(batch, results):
+                    if not future.done():
+                        future.set_result(bool(created))
+                self.batches += 1
+                self.commands += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+        finally:
+            self._flusher = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": "redis",
+            "prefix": self._prefix,
+            "failure_policy": self.failure_policy,
+            "batches": self.batches,
+            "commands": self.commands,
+            "mean_batch": round(self.commands / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "failures": self.failures,
+            "accepted_unchecked": self.accepted_unchecked,
+        }
+
+
+def build_replay_cache(
+    backend: str,
+    *,
+    shards: int = 16,
+    max_entries: int = 1_000_000,
+    overflow: str = OVERFLOW_REJECT,
+    redis_url: str | None = None,
+    bucket_seconds: float = 300.0,
+    fp_rate: float = 0.01,
+    redis_prefix: str = "authn:jti:",
+    redis_timeout: float | None = 0.05,
+    failure_policy: str = FAIL_CLOSED,
+    shared_path: str | None = None,
+) -> ReplayCache:
+    if backend == "memory":
+        return InMemoryReplayCache(shards=shards, max_entries=max_entries, overflow=overflow)
+    if backend == "compact":
+        from .replay_filter import CompactReplayFilter
+
+        return CompactReplayFilter(
+            bucket_seconds=bucket_seconds,
+            fp_rate=fp_rate,
+            max_entries=max_entries,
+            overflow=overflow,
+        )
+    if backend == "shared":
+        if not shared_path:
+            raise RuntimeError("shared_path is required for the shared replay backend")
+        from .shared_table import SharedReplayCache
+
+        return SharedReplayCache(shared_path, max_entries=max_entries, overflow=overflow)
+    if backend == "redis":
+        if not redis_url:
+            raise RuntimeError("redis_url is required for the redis replay backend")
+        return RedisReplayCache.from_url(
+            redis_url, prefix=redis_prefix, timeout=redis_timeout, failure_policy=failure_policy
+        )
+    raise RuntimeError(f"Unknown replay backend: {backend}")
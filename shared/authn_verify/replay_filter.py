@@ -0,0 +1,201 @@
+"""Compact replay detector built from rotating, time-bucketed Bloom filters."""
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any
+
+from .replay import OVERFLOW_EVICT, OVERFLOW_REJECT, ReplayCacheFull
+
+
+_PENDING_LIMIT = 1024
+
+
+class _Bucket:
+    """One time slice: a Bloom filter plus an exact fingerprint store.
+
+    The Bloom filter is a flat bytearray that answers "definitely not seen"
+    cheaply. A filter hit is confirmed against the bucket's 64-bit
+    fingerprints, so filter false positives never reject a token. The
+    fingerprints sit in a small pending set plus sorted ``array('Q')`` runs
+    that merge like a binary counter, which costs 8 bytes per jti with
+    amortized O(log n) inserts and binary-search lookups.
+    """
+
+    __slots__ = ("bits", "m_bits", "k", "capacity", "pending", "runs", "count")
+
+    def __init__(self, capacity: int, fp_rate: float) -> None:
+        self.count = 0
+        self.pending: set[int] = set()
+        self.runs: list[array] = []
+        self._size_bloom(capacity, fp_rate)
+
+    def _size_bloom(self, capacity: int, fp_rate: float) -> None:
+        self.capacity = capacity
+        self.m_bits = max(64, math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.k = max(1, round(self.m_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.m_bits + 7) // 8)
+
+    def might_contain(self, fp: int) -> bool:
+        h1 = fp & 0xFFFFFFFF
+        h2 = (fp >> 32) | 1
+        bits, m = self.bits, self.m_bits
+        for i in range(self.k):
+            pos = (h1 + i * h2) % m
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def contains(self, fp: int) -> bool:
+        if fp in self.pending:
+            return True
+        for run in self.runs:
+            idx = bisect_left(run, fp)
+            if idx < len(run) and run[idx] == fp:
+                return True
+        return False
+
+    def add(self, fp: int, fp_rate: float) -> None:
+        if self.count >= self.capacity:
+            self._grow_bloom(fp_rate)
+        self._set_bits(fp)
+        self.pending.add(fp)
+        self.count += 1
+        if len(self.pending) >= _PENDING_LIMIT:
+            self._flush()
+
+    def nbytes(self) -> int:
+        return len(self.bits) + sum(len(run) * run.itemsize for run in self.runs) + len(self.pending) * 8
+
+    def _set_bits(self, fp: int) -> None:
+        h1 = fp & 0xFFFFFFFF
+        h2 = (fp >> 32) | 1
+        bits, m = self.bits, self.m_bits
+        for i in range(self.k):
+            pos = (h1 + i * h2) % m
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def _flush(self) -> None:
+        run = array("Q", sorted(self.pending))
+        self.pending.clear()
+        while self.runs and len(self.runs[-1]) <= len(run):
+            run = array("Q", sorted(self.runs.pop() + run))
+        self.runs.append(run)
+
+    def _grow_bloom(self, fp_rate: float) -> None:
+        # Fingerprints are kept, so the filter can be rebuilt at twice the capacity.
+        self._size_bloom(self.capacity * 2, fp_rate)
+        for fp in self.pending:
+            self._set_bits(fp)
+        for run in self.runs:
+            for fp in run:
+                self._set_bits(fp)
+
+
+class CompactReplayFilter:
+    """Replay detector that stores ~10 bytes per tracked jti.
+
+    Tokens are grouped into buckets of ``bucket_seconds`` by their expiry, and
+    a whole bucket is dropped once its window has passed, so expiry costs
+    O(1) per bucket rather than per jti. Each jti is reduced to a 64-bit
+    fingerprint with keyed BLAKE2b (the key is random per process, so
+    collisions cannot be engineered). A collision between two live jtis has
+    probability ~n / 2**64 per insert, far below any realistic token volume.
+    ``fp_rate`` only tunes how often the exact table has to be consulted.
+
+    At ``max_entries`` the ``reject`` policy raises ``ReplayCacheFull`` and
+    ``evict`` drops the bucket closest to expiry.
+    """
+
+    def __init__(
+        self,
+        bucket_seconds: float = 300.0,
+        expected_per_bucket: int = 10_000,
+        fp_rate: float = 0.01,
+        max_entries: int = 10_000_000,
+        overflow: str = OVERFLOW_REJECT,
+    ) -> None:
+        if not 0 < fp_rate < 1:
+            raise ValueError("fp_rate must be between 0 and 1")
+        if overflow not in {OVERFLOW_REJECT, OVERFLOW_EVICT}:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.bucket_seconds = bucket_seconds
+        self.expected_per_bucket = expected_per_bucket
+        self.fp_rate = fp_rate
+        self.max_entries = max_entries
+        self.overflow = overflow
+        self._key = os.urandom(16)
+        self._buckets: dict[int, _Bucket] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self.filter_hits = 0
+        self.false_positives = 0
+        self.evictions = 0
+        self.rejections = 0
+
+    async def check_and_store(self, jti: str, expires_at: float) -> bool:
+        return self.add(jti, expires_at)
+
+    def add(self, jti: str, expires_at: float, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        fp = self._fingerprint(jti)
+        with self._lock:
+            self._rotate(now)
+            for bucket in self._buckets.values():
+                if bucket.might_contain(fp):
+                    self.filter_hits += 1
+                    if bucket.contains(fp):
+                        return False
+                    self.false_positives += 1
+            if expires_at <= now:
+                return True
+            if self._count >= self.max_entries:
+                self._overflow()
+            bucket_id = int(expires_at // self.bucket_seconds)
+            bucket = self._buckets.get(bucket_id)
+            if bucket is None:
+                bucket = self._buckets[bucket_id] = _Bucket(self.expected_per_bucket, self.fp_rate)
+            bucket.add(fp, self.fp_rate)
+            self._count += 1
+            return True
+
+    def __len__(self) -> int:
+        return self._count
+
+    def nbytes(self) -> int:
+        return sum(bucket.nbytes() for bucket in self._buckets.values())
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": "compact",
+            "entries": len(self),
+            "buckets": len(self._buckets),
+            "bytes": self.nbytes(),
+            "filter_hits": self.filter_hits,
+            "false_positives": self.false_positives,
+            "overflow": self.overflow,
+            "evictions": self.evictions,
+            "rejections": self.rejections,
+        }
+
+    def _fingerprint(self, jti: str) -> int:
+        digest = hashlib.blake2b(jti.encode("utf-8"), digest_size=8, key=self._key).digest()
+        return int.from_bytes(digest, "little") | 1
+
+    def _rotate(self, now: float) -> None:
+        current = int(now // self.bucket_seconds)
+        for bucket_id in [b for b in self._buckets if b < current]:
+            self._count -= self._buckets.pop(bucket_id).count
+
+    def _overflow(self) -> None:
+        if self.overflow == OVERFLOW_REJECT or not self._buckets:
+            self.rejections += 1
+            raise ReplayCacheFull("Replay cache is full")
+        dropped = self._buckets.pop(min(self._buckets))
+        self._count -= dropped.count
+        self.evictions += dropped.count
@@ -0,0 +1,231 @@
+"""In-process Redis-protocol server for exercising the redis replay backend without Redis.
+
+Usage:
+    python -m authn_verify.resp_stub --port 6380 --latency-ms 2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Callable
+
+
+class RespStubServer:
+    """Speak enough of the Redis protocol for ``redis.asyncio`` and the replay cache.
+
+    Supports PING, SET (with NX/XX/EX/PX), GET, DEL, EXISTS, DBSIZE and
+    FLUSHALL/FLUSHDB, and answers the HELLO/SELECT/CLIENT handshake in RESP2
+    or RESP3, whichever the client asks for.
+    Keys expire lazily. ``latency`` (seconds) delays every round trip, and while
+    ``paused`` is set the server reads commands but does not answer them;
+    both can be changed on a running server to drive timeout and
+    fail-open/fail-closed paths.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0) -> None:
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.paused = False
+        self.commands = 0
+        self._data: dict[bytes, tuple[bytes, float | None]] = {}
+        self._server: asyncio.AbstractServer | None = None
+        self._connections: dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self._handlers: dict[bytes, Callable[[list[bytes]], bytes | None]] = {
+            b"PING": self._ping,
+            b"SET": self._set,
+            b"GET": self._get,
+            b"DEL": self._delete,
+            b"EXISTS": self._exists,
+            b"DBSIZE": self._dbsize,
+            b"FLUSHALL": self._flush,
+            b"FLUSHDB": self._flush,
+            b"SELECT": _ok,
+            b"CLIENT": _ok,
+        }
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def start(self) -> "RespStubServer":
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Closing the listener leaves accepted connections open; drop them so clients see the outage.
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*self._connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "RespStubServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc: object) -> None:
+        await self.stop()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        buffer = b""
+        null = b"$-1\r\n"
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                commands, buffer = _parse_commands(buffer + chunk)
+                if not commands:
+                    continue
+                # One delay per round trip, however many commands were pipelined into it.
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                while self.paused:
+                    await asyncio.sleep(0.01)
+                replies = []
+                for args in commands:
+                    self.commands += 1
+                    name = args[0].upper()
+                    if name == b"HELLO":
+                        resp3 = len(args) > 1 and args[1] == b"3"
+                        null = b"_\r\n" if resp3 else b"$-1\r\n"
+                        replies.append(_hello(resp3))
+                        continue
+                    handler = self._handlers.get(name)
+                    if handler is None:
+                        replies.append(_error(f"unknown command '{args[0].decode()}'"))
+                        continue
+                    reply = handler(args)
+                    replies.append(null if reply is None else reply)
+                writer.write(b"".join(replies))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    def _live(self, key: bytes) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _ping(self, args: list[bytes]) -> bytes:
+        return _bulk(args[1]) if len(args) > 1 else b"+PONG\r\n"
+
+    def _set(self, args: list[bytes]) -> bytes | None:
+        if len(args) < 3:
+            return _error("wrong number of arguments for 'set' command")
+        key, value, options = args[1], args[2], [arg.upper() for arg in args[3:]]
+        expires_at = None
+        for flag, scale in ((b"PX", 0.001), (b"EX", 1.0)):
+            if flag in options:
+                try:
+                    expires_at = time.monotonic() + int(options[options.index(flag) + 1]) * scale
+                except (IndexError, ValueError):
+                    return _error("value is not an integer or out of range")
+        exists = self._live(key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return None
+        self._data[key] = (value, expires_at)
+        return b"+OK\r\n"
+
+    def _get(self, args: list[bytes]) -> bytes | None:
+        value = self._live(args[1])
+        return None if value is None else _bulk(value)
+
+    def _delete(self, args: list[bytes]) -> bytes:
+        removed = sum(self._live(key) is not None and self._data.pop(key, None) is not None for key in args[1:])
+        return f":{removed}\r\n".encode()
+
+    def _exists(self, args: list[bytes]) -> bytes:
+        return f":{sum(self._live(key) is not None for key in args[1:])}\r\n".encode()
+
+    def _dbsize(self, args: list[bytes]) -> bytes:
+        return f":{sum(self._live(key) is not None for key in list(self._data))}\r\n".encode()
+
+    def _flush(self, args: list[bytes]) -> bytes:
+        self._data.clear()
+        return b"+OK\r\n"
+
+
+def _parse_commands(buffer: bytes) -> tuple[list[list[bytes]], bytes]:
+    """Split complete RESP arrays (or inline commands) off ``buffer``; return them and the rest."""
+    commands = []
+    pos = 0
+    while pos < len(buffer):
+        end = buffer.find(b"\r\n", pos)
+        if end < 0:
+            break
+        if buffer[pos:pos + 1] != b"*":
+            # Inline command, as typed into telnet or nc.
+            commands.append(buffer[pos:end].split() or [b"PING"])
+            pos = end + 2
+            continue
+        args = []
+        cursor = end + 2
+        for _ in range(int(buffer[pos + 1:end])):
+            header_end = buffer.find(b"\r\n", cursor)
+            if header_end < 0:
+                break
+            length = int(buffer[cursor + 1:header_end])
+            if header_end + 2 + length + 2 > len(buffer):
+                break
+            args.append(buffer[header_end + 2:header_end + 2 + length])
+            cursor = header_end + 2 + length + 2
+        else:
+            commands.append(args)
+            pos = cursor
+            continue
+        break
+    return commands, buffer[pos:]
+
+
+def _hello(resp3: bool) -> bytes:
+    proto = 3 if resp3 else 2
+    body = _bulk(b"server") + _bulk(b"redis") + _bulk(b"version") + _bulk(b"7.2.0") + _bulk(b"proto") + b":%d\r\n" % proto
+    return (b"%3\r\n" if resp3 else b"*6\r\n") + body
+
+
+def _ok(args: list[bytes]) -> bytes:
+    return b"+OK\r\n"
+
+
+def _bulk(value: bytes) -> bytes:
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _error(message: str) -> bytes:
+    return f"-ERR {message}\r\n".encode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a Redis-protocol stand-in for replay-cache experiments")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every round trip")
+    args = parser.parse_args()
+
+    async def serve() -> None:
+        server = await RespStubServer(args.host, args.port, args.latency_ms / 1000).start()
+        print(f"Listening on {server.url}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
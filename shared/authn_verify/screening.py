@@ -0,0 +1,41 @@
+"""The pre-verification defences every backend configures the same way, read from its environment."""
+from __future__ import annotations
+
+import os
+from typing import Any, Iterable
+
+from .engine import Verifier
+from .middleware import BearerAuthMiddleware
+from .prefilter import FailureLimiter, TokenPrefilter
+
+
+class Screening:
+    """A ``TokenPrefilter`` and per-client ``FailureLimiter`` and the middleware that applies them.
+
+    ``from_env("WORKOUT8")`` reads ``WORKOUT8_MAX_TOKEN_BYTES`` (default
+    8192) and ``WORKOUT8_REJECT_CACHE_SIZE`` (4096) for the prefilter, and
+    ``WORKOUT8_FAILURE_BURST`` and ``WORKOUT8_FAILURE_RATE`` (1 per second)
+    for the limiter. The limit is off unless the burst is set above 0, since
+    clients behind one NAT or proxy share an address. Set
+    ``prefilter`` as ``VerificationPolicy.prefilter``, then ``install`` puts
+    ``BearerAuthMiddleware`` in front of ``paths``, so bad or missing tokens
+    are answered before routing and the routes only ever see verified claims.
+    """
+
+    def __init__(self, prefilter: TokenPrefilter, limiter: FailureLimiter | None = None) -> None:
+        self.prefilter = prefilter
+        self.limiter = limiter
+
+    @classmethod
+    def from_env(cls, prefix: str, *, opaque_pattern: str | None = None) -> Screening:
+        prefilter = TokenPrefilter(
+            max_token_bytes=int(os.environ.get(f"{prefix}_MAX_TOKEN_BYTES", "8192")),
+            opaque_pattern=opaque_pattern,
+            negative_cache_size=int(os.environ.get(f"{prefix}_REJECT_CACHE_SIZE", "4096")),
+        )
+        burst = int(os.environ.get(f"{prefix}_FAILURE_BURST", "0"))
+        rate = float(os.environ.get(f"{prefix}_FAILURE_RATE", "1"))
+        return cls(prefilter, FailureLimiter(rate, burst) if burst > 0 else None)
+
+    def install(self, app: Any, verifier: Verifier, paths: Iterable[str] = ("/protected",)) -> None:
+        app.add_middleware(BearerAuthMiddleware, verifier=verifier, paths=tuple(paths), limiter=self.limiter)
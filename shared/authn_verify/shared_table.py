@@ -0,0 +1,336 @@
+"""mmap-backed hash table shared by every worker process on one host."""
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+from .replay import OVERFLOW_EVICT, OVERFLOW_REJECT, ReplayCacheFull
+
+_MAGIC = b"AVTABLE1"
+_HEADER = struct.Struct("<8sIII")
+_HEADER_SIZE = 64
+_BUCKET_SLOTS = 32
+_KEY_SIZE = 16
+_EMPTY_KEY = bytes(_KEY_SIZE)
+_EXPIRIES = struct.Struct(f"<{_BUCKET_SLOTS}d")
+_DOUBLE = struct.Struct("<d")
+_LENGTH = struct.Struct("<H")
+_LOCK_STRIPES = 256
+
+
+def default_state_dir() -> str:
+    """``/dev/shm`` where it exists (RAM-backed on Linux), else the temp directory."""
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class SharedTableFull(Exception):
+    """Raised when a bucket holds only live entries and eviction is off."""
+
+
+class SharedTable:
+    """Fixed-size hash table in a memory-mapped file, safe across processes.
+
+    Keys are 16-byte digests hashed into buckets of 32 slots. Each bucket
+    stores its keys contiguously, so a lookup is one ``bytes.find`` over 512
+    bytes rather than a Python-level probe loop. Expired slots are reused in
+    place and nothing is ever deleted, so a bucket's used slots stay a
+    prefix. Buckets are guarded by 256 lock stripes that combine a
+    ``threading.Lock`` with an ``fcntl`` record lock on one byte of the file.
+    The kernel drops record locks when a process dies, so a crashed worker
+    cannot wedge the others.
+
+    Every worker opens the same ``path``; the first one creates and sizes it.
+    The file outlives the processes, so replay state survives a restart. A
+    file whose geometry does not match the requested size is refused rather
+    than reinterpreted.
+    """
+
+    def __init__(self, path: str, capacity: int, value_size: int = 0) -> None:
+        if value_size > 0xFFFF:
+            raise ValueError("value_size must fit in 16 bits")
+        self.path = path
+        self.value_size = value_size
+        # Size for a load factor of one half so uneven buckets rarely fill up early.
+        self.buckets = max(1, -(-2 * capacity // _BUCKET_SLOTS))
+        self.capacity = self.buckets * _BUCKET_SLOTS
+        self._counts_at = _HEADER_SIZE
+        self._keys_at = self._counts_at + self.buckets
+        self._expiries_at = self._keys_at + self.capacity * _KEY_SIZE
+        self._lengths_at = self._expiries_at + self.capacity * _DOUBLE.size
+        self._values_at = self._lengths_at + self.capacity * _LENGTH.size
+        size = self._values_at + self.capacity * value_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, _HEADER_SIZE, 0)
+        try:
+            self._initialise(size)
+            self._mm = mmap.mmap(self._fd, size)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, _HEADER_SIZE, 0)
+        self.evictions = 0
+
+    def _initialise(self, size: int) -> None:
+        header = _HEADER.pack(_MAGIC, self.buckets, _BUCKET_SLOTS, self.value_size)
+        if os.fstat(self._fd).st_size == 0:
+            os.ftruncate(self._fd, size)
+            os.pwrite(self._fd, header, 0)
+            return
+        if os.pread(self._fd, _HEADER.size, 0) != header or os.fstat(self._fd).st_size != size:
+            raise RuntimeError(
+                f"{self.path} holds a table with a different size; delete it or pick another path"
+            )
+
+    def get(self, key: bytes, now: float | None = None) -> tuple[float, bytes] | None:
+        """Return ``(expires_at, value)`` for a live ``key``."""
+        key = _normalise(key)
+        bucket = self._bucket(key)
+        now = time.time() if now is None else now
+        with self._locked(bucket):
+            slot = self._find(bucket, key)
+            if slot < 0:
+                return None
+            (expires_at,) = _DOUBLE.unpack_from(self._mm, self._expiries_at + slot * _DOUBLE.size)
+            if expires_at <= now:
+                return None
+            return expires_at, self._read_value(slot)
+
+    def insert(
+        self,
+        key: bytes,
+        expires_at: float,
+        value: bytes = b"",
+        *,
+        replace: bool = False,
+        evict: bool = True,
+        now: float | None = None,
+    ) -> bool:
+        """Store ``key`` until ``expires_at``.
+
+        Returns False if the key is live and ``replace`` is off. When the
+        bucket is full of live entries, the one closest to expiry is evicted,
+        or ``SharedTableFull`` is raised if ``evict`` is off.
+        """
+        if len(value) > self.value_size:
+            raise ValueError("value is larger than the table's value_size")
+        key = _normalise(key)
+        bucket = self._bucket(key)
+        now = time.time() if now is None else now
+        with self._locked(bucket):
+            slot = self._find(bucket, key)
+            if slot >= 0:
+                (current,) = _DOUBLE.unpack_from(self._mm, self._expiries_at + slot * _DOUBLE.size)
+                if current > now and not replace:
+                    return False
+            else:
+                slot = self._free_slot(bucket, now, evict)
+            self._write(slot, key, expires_at, value)
+            return True
+
+    def entries(self) -> int:
+        """Slots in use, including expired ones waiting to be reused."""
+        return sum(self._mm[self._counts_at:self._counts_at + self.buckets])
+
+    def stats(self) -> dict[str, Any]:
+        return {"path": self.path, "entries": self.entries(), "capacity": self.capacity, "evictions": self.evictions}
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+    def _bucket(self, key: bytes) -> int:
+        return int.from_bytes(key[:8], "little") % self.buckets
+
+    def _locked(self, bucket: int) -> "_StripeLock":
+        stripe = bucket % _LOCK_STRIPES
+        return _StripeLock(self._locks[stripe], self._fd, stripe)
+
+    def _find(self, bucket: int, key: bytes) -> int:
+        used = self._mm[self._counts_at + bucket]
+        start = self._keys_at + bucket * _BUCKET_SLOTS * _KEY_SIZE
+        keys = self._mm[start:start + used * _KEY_SIZE]
+        index = keys.find(key)
+        while index >= 0 and index % _KEY_SIZE:
+            index = keys.find(key, index + 1)
+        return -1 if index < 0 else bucket * _BUCKET_SLOTS + index // _KEY_SIZE
+
+    def _free_slot(self, bucket: int, now: float, evict: bool) -> int:
+        first = bucket * _BUCKET_SLOTS
+        used = self._mm[self._counts_at + bucket]
+        if used < _BUCKET_SLOTS:
+            self._mm[self._counts_at + bucket] = used + 1
+            return first + used
+        expiries = _EXPIRIES.unpack_from(self._mm, self._expiries_at + first * _DOUBLE.size)
+        soonest = min(range(_BUCKET_SLOTS), key=expiries.__getitem__)
+        if expiries[soonest] > now:
+            if not evict:
+                raise SharedTableFull(f"Bucket {bucket} of {self.path} is full")
+            self.evictions += 1
+        return first + soonest
+
+    def _write(self, slot: int, key: bytes, expires_at: float, value: bytes) -> None:
+        # Key last: a reader that races a crashed writer never sees a key with a stale expiry.
+        _DOUBLE.pack_into(self._mm, self._expiries_at + slot * _DOUBLE.size, expires_at)
+        if self.value_size:
+            _LENGTH.pack_into(self._mm, self._lengths_at + slot * _LENGTH.size, len(value))
+            start = self._values_at + slot * self.value_size
+            self._mm[start:start + len(value)] = value
+        start = self._keys_at + slot * _KEY_SIZE
+        self._mm[start:start + _KEY_SIZE] = key
+
+    def _read_value(self, slot: int) -> bytes:
+        if not self.value_size:
+            return b""
+        (length,) = _LENGTH.unpack_from(self._mm, self._lengths_at + slot * _LENGTH.size)
+        start = self._values_at + slot * self.value_size
+        return self._mm[start:start + length]
+
+
+class _StripeLock:
+    __slots__ = ("_lock", "_fd", "_offset")
+
+    def __init__(self, lock: threading.Lock, fd: int, offset: int) -> None:
+        self._lock = lock
+        self._fd = fd
+        self._offset = offset
+
+    def __enter__(self) -> None:
+        self._lock.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, self._offset)
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def __exit__(self, *exc: object) -> None:
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, self._offset)
+        self._lock.release()
+
+
+def _normalise(key: bytes) -> bytes:
+    # An all-zero key would be indistinguishable from an unused slot.
+    return key if key != _EMPTY_KEY else b"\x01" + key[1:]
+
+
+def digest(value: str) -> bytes:
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=_KEY_SIZE).digest()
+
+
+class SharedReplayCache:
+    """``ReplayCache`` whose jti set is shared by every worker on the host.
+
+    ``check_and_store`` is a single insert-if-absent under the bucket lock,
+    so two workers racing on the same jti cannot both accept it.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1_000_000, overflow: str = OVERFLOW_REJECT) -> None:
+        if overflow not in {OVERFLOW_REJECT, OVERFLOW_EVICT}:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self._table = SharedTable(path, max_entries)
+        self.overflow = overflow
+        self.rejections = 0
+
+    async def check_and_store(self, jti: str, expires_at: float) -> bool:
+        try:
+            return self._table.insert(digest(jti), expires_at, evict=self.overflow == OVERFLOW_EVICT)
+        except SharedTableFull as exc:
+            self.rejections += 1
+            raise ReplayCacheFull("Replay cache is full") from exc
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": "shared",
+            **self._table.stats(),
+            "overflow": self.overflow,
+            "rejections": self.rejections,
+        }
+
+
+class SharedVerifiedTokenCache:
+    """Drop-in for ``VerifiedTokenCache`` that every worker reads and fills.
+
+    Claims are stored as compact JSON of at most ``value_size`` bytes; larger
+    claim sets are simply not cached. Entries expire at ``exp - leeway`` and
+    ``nbf`` is re-checked on every hit, as with the in-process cache. Hit and
+    miss counts are per worker.
+    """
+
+    def __init__(self, path: str, max_entries: int, leeway_seconds: float, value_size: int = 1024) -> None:
+        self.leeway_seconds = leeway_seconds
+        self._table = SharedTable(path, max_entries, value_size)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> tuple[dict[str, Any], str | None] | None:
+        found = self._table.get(_token_key(token))
+        if found is None:
+            self.misses += 1
+            return None
+        entry = json.loads(found[1])
+        not_before = entry.get("nbf")
+        if not_before is not None and not_before > time.time() + self.leeway_seconds:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["claims"], entry["kid"]
+
+    def put(self, token: str, claims: dict[str, Any], kid: str | None = None) -> None:
+        try:
+            expires_at = float(claims["exp"]) - self.leeway_seconds
+            not_before = float(claims["nbf"]) if "nbf" in claims else None
+        except (KeyError, TypeError, ValueError):
+            return
+        if expires_at <= time.time():
+            return
+        value = json.dumps({"claims": claims, "kid": kid, "nbf": not_before}, separators=(",", ":")).encode("utf-8")
+        if len(value) <= self._table.value_size:
+            self._table.insert(_token_key(token), expires_at, value, replace=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {"entries": self._table.entries(), "hits": self.hits, "misses": self.misses}
+
+
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()[:_KEY_SIZE]
+
+
+def shared_jwks_loader(
+    loader: Callable[[], Awaitable[tuple[dict[str, Any], float | None]]],
+    path: str,
+    max_age: float = 300.0,
+    value_size: int = 32 * 1024,
+) -> Callable[[], Awaitable[tuple[dict[str, Any], float | None]]]:
+    """Let one worker fetch the JWKS and the rest reuse its copy.
+
+    A fetched document is published for its ``max-age`` (or ``max_age``).
+    A worker asking again while the shared copy is the one it already holds
+    wants something newer (an unknown ``kid``), so it goes to the source.
+    """
+    table = SharedTable(path, 1, value_size)
+    key = digest("jwks")
+    seen: dict[str, float] = {}
+
+    async def load() -> tuple[dict[str, Any], float | None]:
+        now = time.time()
+        found = table.get(key, now)
+        if found is not None:
+            shared = json.loads(found[1])
+            if shared["fetched_at"] != seen.get("fetched_at"):
+                seen["fetched_at"] = shared["fetched_at"]
+                return shared["jwks"], found[0] - now
+        raw, source_max_age = await loader()
+        ttl = source_max_age if source_max_age is not None else max_age
+        value = json.dumps({"fetched_at": now, "jwks": raw}, separators=(",", ":")).encode("utf-8")
+        if len(value) <= value_size:
+            table.insert(key, now + ttl, value, replace=True)
+            seen["fetched_at"] = now
+        return raw, source_max_age
+
+    return load
@@ -0,0 +1,221 @@
+"""Startup warm-up that primes a verifier's keys and crypto backends, and the readiness it reports."""
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+from dataclasses import replace
+from typing import Any, Mapping
+
+from jose import jwk
+from jose.backends.base import Key
+from jose.exceptions import JOSEError
+
+from .engine import Verifier
+from .errors import VerificationError
+from .jwks import VerificationKey
+from .offload import OffloadBusy
+
+SYNTHETIC_SUBJECT = "authn-verify-warmup"
+_EC_CURVES = {"ES256": "SECP256R1", "ES384": "SECP384R1", "ES512": "SECP521R1"}
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _ephemeral_key(alg: str) -> Key:
+    """A throwaway signing key for ``alg``; only the warm-up verifier ever trusts it."""
+    if alg.startswith("HS"):
+        return jwk.construct(os.urandom(64), alg)
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    if alg.startswith("RS"):
+        # The size only has to exercise the RSA code path, and 1024 bits generates about four times faster.
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=1024)
+    elif alg in _EC_CURVES:
+        private_key = ec.generate_private_key(getattr(ec, _EC_CURVES[alg])())
+    else:
+        raise ValueError(f"No warm-up key for alg {alg}")
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    return jwk.construct(pem, alg)
+
+
+def _verifying_half(alg: str, key: Key) -> Key:
+    return key if alg.startswith("HS") else key.public_key()
+
+
+def _dummy_signature(alg: str, key: Key) -> bytes:
+    # Shorter inputs are refused before any math runs: RSA wants one modulus-sized block, raw EC two coordinates.
+    bits = getattr(getattr(key, "prepared_key", None), "key_size", 0)
+    size = (bits + 7) // 8
+    if alg.startswith("ES"):
+        return b"\x01" * (2 * size)
+    return b"\x01" * (size or 32)
+
+
+class _WarmupKeys:
+    def __init__(self, keys: dict[str, VerificationKey]) -> None:
+        self._keys = keys
+
+    async def get_or_refetch(self, kid: str) -> VerificationKey | None:
+        return self._keys.get(kid)
+
+
+class Warmup:
+    """Do a verifier's one-time setup before the first request does, and gate ``/health`` on it.
+
+    ``run`` belongs in the app's lifespan, after the key set has loaded. It
+    signs a synthetic token under every algorithm the verifier will check
+    and verifies it through a copy of the verifier's policy, so the header,
+    key, signature, and claim stages and the crypto backend (and the offload
+    pool, if any) have all run once. The copy has no replay cache, claim
+    caches, prefilter, or metrics, so the synthetic token leaves no trace.
+    A static secret signs for itself; a key set's private halves live with
+    the issuer, so an ephemeral key of each alg stands in, and every loaded
+    key also checks one dummy signature to build its backend state.
+
+    Doing this in the lifespan means neither the first request nor the
+    first ``/health`` pays for that setup.
+
+    ``check`` is for ``/health``: true once ``run`` succeeded and, for a key
+    provider that exposes its ``keys`` (as ``JwksManager`` does), while at
+    least one key is loaded. Keys that arrived since the last look, from a
+    rotation or a JWKS that was unreachable at startup, are primed first.
+    Only a failed ``run`` is permanent; a failed re-prime (a busy offload
+    pool, say) answers false once and is retried on the next ``check``.
+    """
+
+    def __init__(self, verifier: Verifier) -> None:
+        self.verifier = verifier
+        self._policy = verifier.policy
+        self._algorithms = frozenset(self._policy.algorithms or ())
+        self._key_set: Mapping[str, VerificationKey] | None = None
+        self._primed_kids: set[str] = set()
+        self._primed_algs: set[str] = set()
+        self._ran = False
+        self._error: str | None = None
+        self._retry_error: str | None = None
+        self.seconds: float | None = None
+
+    async def run(self) -> bool:
+        started = time.perf_counter()
+        try:
+            if self._policy.mode != "introspect":
+                if self._policy.secret is not None:
+                    for alg in self._policy.algorithms or ():
+                        await self._self_verify(alg, jwk.construct(self._policy.secret, alg))
+                else:
+                    await self._prime_new_keys()
+        except (VerificationError, JOSEError, OffloadBusy, ValueError) as exc:
+            self._error = f"Warm-up failed: {exc}"
+        self._ran = True
+        self.seconds = time.perf_counter() - started
+        return self._error is None
+
+    async def check(self) -> bool:
+        if not self._ran or self._error is not None:
+            return False
+        keys = self._loaded_keys()
+        if keys is None:
+            return True
+        if keys is not self._key_set:
+            try:
+                await self._prime_new_keys()
+            except (VerificationError, JOSEError, OffloadBusy, ValueError) as exc:
+                self._retry_error = f"Re-priming keys failed, will retry: {exc}"
+                return False
+            self._retry_error = None
+        return bool(keys)
+
+    @property
+    def detail(self) -> str:
+        """Why ``check`` is false."""
+        if not self._ran:
+            return "Warming up"
+        if self._error is not None:
+            return self._error
+        if self._retry_error is not None:
+            return self._retry_error
+        return "No signing keys loaded"
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "ready": self._ran and self._error is None,
+            "seconds": None if self.seconds is None else round(self.seconds, 4),
+            "algorithms": sorted(self._primed_algs),
+            "keys": sorted(self._primed_kids),
+            "error": self._error or self._retry_error,
+        }
+
+    def _loaded_keys(self) -> Mapping[str, VerificationKey] | None:
+        keys = getattr(self._policy.keys, "keys", None)
+        return keys if isinstance(keys, Mapping) else None
+
+    async def _prime_new_keys(self) -> None:
+        keys = self._loaded_keys()
+        if keys is None:
+            return
+        offload = self._policy.offload
+        for kid, key in keys.items():
+            if kid in self._primed_kids:
+                continue
+            if self._algorithms and key.alg not in self._algorithms:
+                # The verifier rejects this alg before it would ever touch the key.
+                continue
+            if key.alg not in self._primed_algs:
+                await self._self_verify(key.alg, _ephemeral_key(key.alg))
+            signature = _dummy_signature(key.alg, key.key)
+            key.key.verify(b"warmup", signature)
+            if offload is not None and offload.wants(key.alg, 0):
+                # One check per worker, so each pool process has this key built before real traffic.
+                workers = offload.stats()["max_workers"]
+                await asyncio.gather(
+                    *(offload.verify(key.key, key.alg, b"warmup", signature) for _ in range(workers))
+                )
+            self._primed_kids.add(kid)
+        # Only now, so a set that failed part-way is looked at again on the next check.
+        self._key_set = keys
+
+    async def _self_verify(self, alg: str, signing_key: Key) -> None:
+        policy = self._policy
+        now = int(time.time())
+        claims: dict[str, Any] = {"sub": SYNTHETIC_SUBJECT, "iat": now, "nbf": now, "exp": now + 60}
+        if policy.issuer is not None:
+            claims["iss"] = policy.issuer
+        if policy.audience is not None:
+            claims["aud"] = policy.audience
+        claims["jti"] = uuid.uuid4().hex
+        for name in policy.required_claims:
+            claims.setdefault(name, SYNTHETIC_SUBJECT)
+
+        header = {"alg": alg, "typ": "JWT"}
+        keys = None
+        if policy.keys is not None:
+            header["kid"] = SYNTHETIC_SUBJECT
+            keys = _WarmupKeys(
+                {SYNTHETIC_SUBJECT: VerificationKey(SYNTHETIC_SUBJECT, alg, _verifying_half(alg, signing_key))}
+            )
+        signing_input = f"{_b64(json.dumps(header).encode())}.{_b64(json.dumps(claims).encode())}"
+        token = f"{signing_input}.{_b64(signing_key.sign(signing_input.encode('ascii')))}"
+
+        verifier = Verifier(
+            replace(
+                policy,
+                keys=keys,
+                replay=None,
+                verified_cache_size=0,
+                verified_cache=None,
+                prefilter=None,
+            )
+        )
+        verified = await verifier.verify(token)
+        if verified.claims.get("sub") != SYNTHETIC_SUBJECT:
+            raise ValueError(f"{alg} self-verify returned the wrong claims")
+        self._primed_algs.add(alg)
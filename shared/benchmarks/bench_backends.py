@@ -0,0 +1,317 @@
+"""Benchmark every verifying backend on the same synthetic token corpora.
+
+Each backend's app module is loaded with a fixed configuration. Its
+``BearerAuthMiddleware`` (plus Service B's audience check) is timed
+in-process, and its protected route is timed over HTTP through an in-memory
+ASGI transport, so results exclude the network but include FastAPI.
+Service B's introspection endpoint is an in-process stub with no added latency.
+
+Usage:
+    python bench_backends.py --iterations 2000 --output results.json
+    python bench_backends.py --baseline results.json   # print change vs a previous run
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Awaitable, Callable
+
+import httpx
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from fastapi import HTTPException
+from jose import jwk, jwt
+
+REPO = Path(__file__).resolve().parents[2]
+ISSUER = "https://demo-issuer"
+
+
+@dataclass
+class Case:
+    backend: str
+    corpus: str
+    expect_ok: bool
+    tokens: list[str]
+    results: dict[str, Any] = field(default_factory=dict)
+
+
+def _load_app(name: str, backend_dir: Path, env: dict[str, str]) -> ModuleType:
+    """Import ``backend_dir/app.py`` under a unique module name with ``env`` applied."""
+    os.environ.update(env)
+    sys.path.insert(0, str(backend_dir))
+    try:
+        spec = importlib.util.spec_from_file_location(f"bench_{name}", backend_dir / "app.py")
+        module = importlib.util.module_from_spec(spec)
+        # Pydantic resolves the response models' annotations through sys.modules.
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(backend_dir))
+        for key in env:
+            os.environ.pop(key, None)
+    return module
+
+
+def _hs256(secret: str, audience: str, n: int, *, lifetime: int = 300, jti: str | None = None) -> list[str]:
+    now = int(time.time())
+    return [
+        jwt.encode(
+            {"iss": ISSUER, "aud": audience, "sub": "bench", "iat": now, "exp": now + lifetime, "jti": jti or uuid.uuid4().hex},
+            secret,
+            algorithm="HS256",
+        )
+        for _ in range(n)
+    ]
+
+
+def _signer(alg: str, kid: str, private_key) -> tuple[dict[str, Any], Callable[..., str]]:
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    public_jwk = jwk.construct(pem, alg).public_key().to_dict()
+    public_jwk.update({"kid": kid, "use": "sig", "alg": alg})
+
+    def sign(audience: str, *, header_kid: str = kid) -> str:
+        now = int(time.time())
+        claims = {"iss": ISSUER, "aud": audience, "sub": "bench", "iat": now, "exp": now + 300, "jti": uuid.uuid4().hex}
+        return jwt.encode(claims, pem, algorithm=alg, headers={"kid": header_kid})
+
+    return public_jwk, sign
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def _measure(tokens: list[str], call: Callable[[str], Awaitable[bool]], expect_ok: bool) -> dict[str, Any]:
+    await call(tokens[0])
+    latencies = []
+    mismatches = 0
+    started = time.perf_counter()
+    for token in tokens[1:]:
+        op_started = time.perf_counter()
+        ok = await call(token)
+        latencies.append(time.perf_counter() - op_started)
+        mismatches += ok != expect_ok
+    elapsed = time.perf_counter() - started
+    return {
+        "ops_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_us": round(_percentile(latencies, 50) * 1e6, 1),
+        "p95_us": round(_percentile(latencies, 95) * 1e6, 1),
+        "p99_us": round(_percentile(latencies, 99) * 1e6, 1),
+        "unexpected_results": mismatches,
+    }
+
+
+async def _allocations(tokens: list[str], call: Callable[[str], Awaitable[bool]]) -> int:
+    """Mean transient peak of traced allocations per call, in bytes."""
+    tracemalloc.start()
+    total = 0
+    for token in tokens:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        await call(token)
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return total // len(tokens)
+
+
+def _in_process(module: ModuleType, path: str) -> Callable[[str], Awaitable[bool]]:
+    """Call the app's ``BearerAuthMiddleware`` directly, with the route's own checks as the inner app."""
+    (middleware,) = [entry for entry in module.app.user_middleware if entry.cls.__name__ == "BearerAuthMiddleware"]
+    authorize = getattr(module, "check_audience", None)
+    reached: list[bool] = []
+
+    async def route(scope: dict, receive: Any, send: Any) -> None:
+        if authorize is not None:
+            authorize(scope["state"]["verified_token"].claims)
+        reached.append(True)
+
+    async def discard(message: dict) -> None:
+        return None
+
+    auth = middleware.cls(route, *middleware.args, **middleware.kwargs)
+
+    async def call(token: str) -> bool:
+        scope = {"type": "http", "path": path, "headers": [(b"authorization", f"Bearer {token}".encode())]}
+        reached.clear()
+        try:
+            await auth(scope, None, discard)
+        except HTTPException:
+            return False
+        return bool(reached)
+
+    return call
+
+
+def _over_http(client: httpx.AsyncClient, path: str) -> Callable[[str], Awaitable[bool]]:
+    async def call(token: str) -> bool:
+        resp = await client.get(path, headers={"Authorization": f"Bearer {token}"})
+        return resp.status_code == 200
+
+    return call
+
+
+def _introspection_stub(request: httpx.Request) -> httpx.Response:
+    token = dict(httpx.QueryParams(request.content.decode())).get("token", "")
+    active = not token.startswith("revoked-")
+    return httpx.Response(200, json={"active": active, "iss": ISSUER, "sub": "bench", "aud": "service-b", "scope": "read"})
+
+
+def _backends(n: int) -> list[tuple[str, ModuleType, str, list[Case]]]:
+    part1 = REPO / "part1"
+    backends = []
+
+    def hs256_backend(workout: int, extra_cases: Callable[[str, str], list[Case]] = lambda s, a: []):
+        secret, audience, name = f"bench-secret-{workout}", f"workout{workout}-api", f"workout{workout}"
+        prefix = f"WORKOUT{workout}"
+        env = {f"{prefix}_TOKEN_SECRET": secret, f"{prefix}_ISSUER": ISSUER, f"{prefix}_AUDIENCE": audience}
+        module = _load_app(name, part1 / name / "backend", env)
+        cases = [
+            Case(name, "hs256-valid", True, _hs256(secret, audience, n)),
+            Case(name, "hs256-expired", False, _hs256(secret, audience, n, lifetime=-3600)),
+            *extra_cases(secret, audience),
+        ]
+        backends.append((name, module, "/protected", cases))
+
+    hs256_backend(6)
+    hs256_backend(8)
+    hs256_backend(9, lambda secret, audience: [
+        Case("workout9", "hs256-replayed", False, _hs256(secret, audience, n, jti="replayed-jti")),
+    ])
+
+    rsa_jwk, rsa_sign = _signer("RS256", "rsa-key", rsa.generate_private_key(public_exponent=65537, key_size=2048))
+    ec_jwk, ec_sign = _signer("ES256", "ec-key", ec.generate_private_key(ec.SECP256R1()))
+    module = _load_app("workout10", part1 / "workout10" / "backend", {
+        "WORKOUT10_ISSUER": ISSUER,
+        "WORKOUT10_AUDIENCE": "workout10-api",
+        "WORKOUT10_JWKS_JSON": json.dumps({"keys": [rsa_jwk, ec_jwk]}),
+        # Keep the unknown-kid case from turning into JWKS refetches.
+        "WORKOUT10_JWKS_MIN_REFETCH_SECONDS": "3600",
+    })
+    backends.append(("workout10", module, "/protected", [
+        Case("workout10", "rs256-valid", True, [rsa_sign("workout10-api") for _ in range(n)]),
+        Case("workout10", "es256-valid", True, [ec_sign("workout10-api") for _ in range(n)]),
+        Case("workout10", "rs256-wrong-kid", False, [rsa_sign("workout10-api", header_kid="retired") for _ in range(n)]),
+    ]))
+
+    for cache in ("0", "1"):
+        name = f"workout18-cache{cache}"
+        module = _load_app(name, REPO / "part2" / "workout18" / "service_b", {
+            "WORKOUT18_INTROSPECT_URL": "http://stub-idp/introspect",
+            "WORKOUT18_RESOURCE_CLIENT_ID": "service-b",
+            "WORKOUT18_RESOURCE_CLIENT_SECRET": "secret",
+            "WORKOUT18_EXPECTED_AUD": "service-b",
+            "WORKOUT18_CACHE_ENABLED": cache,
+        })
+        module.build_http_client = lambda: httpx.AsyncClient(transport=httpx.MockTransport(_introspection_stub))
+        # One opaque token reused, as a caller with a cached client_credentials token would.
+        backends.append((name, module, "/data", [
+            Case(name, "opaque-active", True, [f"opaque-{uuid.uuid4().hex}"] * n),
+            Case(name, "opaque-revoked", False, [f"revoked-{uuid.uuid4().hex}"] * n),
+        ]))
+    return backends
+
+
+async def run(n: int, alloc_samples: int) -> list[Case]:
+    all_cases: list[Case] = []
+    for name, module, path, cases in _backends(n + 1):
+        async with AsyncExitStack() as stack:
+            await stack.enter_async_context(module.app.router.lifespan_context(module.app))
+            client = await stack.enter_async_context(
+                httpx.AsyncClient(transport=httpx.ASGITransport(app=module.app), base_url="http://bench")
+            )
+            for case in cases:
+                # Replay caches remember the in-process pass; give HTTP its own fresh copies.
+                if case.corpus.endswith("-valid") and name == "workout9":
+                    http_tokens = _hs256("bench-secret-9", "workout9-api", n + 1)
+                else:
+                    http_tokens = case.tokens
+                in_process = _in_process(module, path)
+                case.results["in_process"] = await _measure(case.tokens, in_process, case.expect_ok)
+                case.results["http"] = await _measure(http_tokens, _over_http(client, path), case.expect_ok)
+                if name != "workout9" or not case.expect_ok:
+                    sample = case.tokens[:alloc_samples]
+                    case.results["in_process"]["alloc_peak_bytes"] = await _allocations(sample, in_process)
+                print(_row(case), flush=True)
+        all_cases.extend(cases)
+    return all_cases
+
+
+def _row(case: Case) -> str:
+    ip, http = case.results["in_process"], case.results["http"]
+    return (
+        f"{case.backend:<18} {case.corpus:<16} {ip['ops_per_sec']:>10,.0f} {ip['p50_us']:>8.1f} {ip['p99_us']:>8.1f}"
+        f" {http['ops_per_sec']:>10,.0f} {http['p50_us']:>8.1f} {http['p99_us']:>8.1f} {ip.get('alloc_peak_bytes', '-'):>8}"
+    )
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(cases: list[Case], baseline_path: str) -> None:
+    with open(baseline_path, "r", encoding="utf-8") as fh:
+        baseline = {(r["backend"], r["corpus"]): r for r in json.load(fh)["results"]}
+    print(f"\nChange in ops/sec vs {baseline_path} (negative is a regression):")
+    for case in cases:
+        previous = baseline.get((case.backend, case.corpus))
+        if previous is None:
+            continue
+        deltas = []
+        for mode in ("in_process", "http"):
+            before = previous[mode]["ops_per_sec"]
+            deltas.append(f"{mode} {(case.results[mode]['ops_per_sec'] / before - 1) * 100:+6.1f}%")
+        print(f"  {case.backend:<18} {case.corpus:<16} {'   '.join(deltas)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000, help="Timed operations per case and mode")
+    parser.add_argument("--alloc-samples", type=int, default=200, help="Calls traced for allocation figures")
+    parser.add_argument("--output", default="bench_backends.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    print(f"{'backend':<18} {'corpus':<16} {'in-proc/s':>10} {'p50 us':>8} {'p99 us':>8} {'http/s':>10} {'p50 us':>8} {'p99 us':>8} {'alloc B':>8}")
+    cases = asyncio.run(run(args.iterations, args.alloc_samples))
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "iterations": args.iterations,
+        "results": [
+            {"backend": c.backend, "corpus": c.corpus, "expect_ok": c.expect_ok, **c.results} for c in cases
+        ],
+    }
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nWrote {args.output}")
+    if args.baseline:
+        _compare(cases, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Measure how long each backend takes from process start to serving, and what its first request costs.
+
+Every run starts a fresh ``uvicorn`` process and polls ``/health`` until
+it answers 200 (``ready``). The first protected request then goes over the
+same keep-alive connection, so ``first`` is the app's own first-request
+cost, without a TCP handshake. ``warm`` is the median of the next
+``--requests`` requests for comparison. Each request carries a fresh
+token, so the replay cache and verified-claims caches never help.
+
+Workouts 6, 8, and 9 check HS256 tokens, workout 10 RS256 tokens against a
+JWKS file, and Service B tokens from the workout 18 stub IdP, which runs in
+its own process for the whole benchmark and is not timed.
+
+Usage:
+    python bench_cold_start.py --runs 5 --output cold_start.json
+    python bench_cold_start.py --baseline cold_start.json   # print change vs a previous run
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+import httpx
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+REPO = Path(__file__).resolve().parents[2]
+ISSUER = "https://demo-issuer"
+STARTUP_TIMEOUT_SECONDS = 60.0
+
+
+@dataclass
+class Backend:
+    name: str
+    directory: Path
+    env: dict[str, str]
+    path: str
+    tokens: Callable[[int], list[str]]
+    runs: list[dict[str, float]] = field(default_factory=list)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _spawn(directory: Path, env: dict[str, str], port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=directory,
+        env={**os.environ, **env},
+    )
+
+
+def _wait_ready(client: httpx.Client, url: str, process: subprocess.Popen) -> None:
+    deadline = time.perf_counter() + STARTUP_TIMEOUT_SECONDS
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode} before it was ready")
+        try:
+            if client.get(url).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.002)
+    raise RuntimeError(f"{url} was not ready after {STARTUP_TIMEOUT_SECONDS:.0f} s")
+
+
+def _stop(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _hs256(secret: str, audience: str) -> Callable[[int], list[str]]:
+    def tokens(n: int) -> list[str]:
+        now = int(time.time())
+        return [
+            jwt.encode(
+                {"iss": ISSUER, "aud": audience, "sub": "bench", "iat": now, "exp": now + 300, "jti": uuid.uuid4().hex},
+                secret,
+                algorithm="HS256",
+            )
+            for _ in range(n)
+        ]
+
+    return tokens
+
+
+def _rs256_jwks(directory: Path, audience: str) -> tuple[Path, Callable[[int], list[str]]]:
+    pem = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public_jwk = jwk.construct(pem, "RS256").public_key().to_dict()
+    public_jwk.update({"kid": "bench-key", "use": "sig", "alg": "RS256"})
+    path = directory / "jwks.json"
+    path.write_text(json.dumps({"keys": [public_jwk]}), encoding="utf-8")
+
+    def tokens(n: int) -> list[str]:
+        now = int(time.time())
+        return [
+            jwt.encode(
+                {"iss": ISSUER, "aud": audience, "sub": "bench", "iat": now, "exp": now + 300, "jti": uuid.uuid4().hex},
+                pem,
+                algorithm="RS256",
+                headers={"kid": "bench-key"},
+            )
+            for _ in range(n)
+        ]
+
+    return path, tokens
+
+
+def _stub_idp_tokens(issuer: str) -> Callable[[int], list[str]]:
+    def tokens(n: int) -> list[str]:
+        with httpx.Client() as client:
+            return [
+                client.post(
+                    f"{issuer}/token",
+                    data={"grant_type": "client_credentials"},
+                    auth=("service-a", "service-a-secret"),
+                ).json()["access_token"]
+                for _ in range(n)
+            ]
+
+    return tokens
+
+
+def _backends(workdir: Path, stub_issuer: str) -> list[Backend]:
+    part1 = REPO / "part1"
+    backends = []
+    for workout in (6, 8, 9):
+        secret, audience, prefix = f"bench-secret-{workout}", f"workout{workout}-api", f"WORKOUT{workout}"
+        env = {f"{prefix}_TOKEN_SECRET": secret, f"{prefix}_ISSUER": ISSUER, f"{prefix}_AUDIENCE": audience}
+        backends.append(Backend(f"workout{workout}", part1 / f"workout{workout}" / "backend", env, "/protected",
+                                _hs256(secret, audience)))
+
+    jwks_path, rs256_tokens = _rs256_jwks(workdir, "workout10-api")
+    env = {"WORKOUT10_ISSUER": ISSUER, "WORKOUT10_AUDIENCE": "workout10-api", "WORKOUT10_JWKS_PATH": str(jwks_path)}
+    backends.append(Backend("workout10", part1 / "workout10" / "backend", env, "/protected", rs256_tokens))
+
+    service_b = REPO / "part2" / "workout18" / "service_b"
+    for strategy in ("jwks", "introspect"):
+        env = {
+            "WORKOUT18_ISSUER": stub_issuer,
+            "WORKOUT18_INTROSPECT_URL": f"{stub_issuer}/introspect",
+            "WORKOUT18_RESOURCE_CLIENT_ID": "service-b",
+            "WORKOUT18_RESOURCE_CLIENT_SECRET": "service-b-secret",
+            "WORKOUT18_EXPECTED_AUD": "service-a",
+            "WORKOUT18_VERIFY_STRATEGY": strategy,
+        }
+        backends.append(Backend(f"service-b-{strategy}", service_b, env, "/data", _stub_idp_tokens(stub_issuer)))
+    return backends
+
+
+def _cold_start(backend: Backend, requests: int) -> dict[str, float]:
+    tokens = backend.tokens(requests + 1)
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = _spawn(backend.directory, backend.env, port)
+    try:
+        with httpx.Client(timeout=10.0) as client:
+            _wait_ready(client, f"{base}/health", process)
+            ready = time.perf_counter() - started
+            latencies = []
+            for token in tokens:
+                request_started = time.perf_counter()
+                response = client.get(f"{base}{backend.path}", headers={"Authorization": f"Bearer {token}"})
+                latencies.append(time.perf_counter() - request_started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{backend.name} answered {response.status_code}: {response.text}")
+    finally:
+        _stop(process)
+    return {
+        "ready_ms": ready * 1000,
+        "first_ms": latencies[0] * 1000,
+        "warm_ms": statistics.median(latencies[1:]) * 1000,
+    }
+
+
+def _summary(runs: list[dict[str, float]]) -> dict[str, float]:
+    return {key: round(statistics.median(run[key] for run in runs), 2) for key in runs[0]} | {
+        "ready_max_ms": round(max(run["ready_ms"] for run in runs), 2),
+        "first_max_ms": round(max(run["first_ms"] for run in runs), 2),
+    }
+
+
+def _row(name: str, summary: dict[str, float]) -> str:
+    return (
+        f"{name:<22} {summary['ready_ms']:>9.0f} {summary['ready_max_ms']:>9.0f} "
+        f"{summary['first_ms']:>9.2f} {summary['first_max_ms']:>9.2f} {summary['warm_ms']:>8.2f}"
+    )
+
+
+def run(runs: int, requests: int) -> list[dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        stub_port = _free_port()
+        stub_issuer = f"http://127.0.0.1:{stub_port}/oauth2"
+        stub = _spawn(
+            REPO / "part2" / "workout18" / "stub_idp",
+            {"WORKOUT18_STUB_ISSUER": stub_issuer, "WORKOUT18_STUB_TOKEN_FORMAT": "jwt"},
+            stub_port,
+        )
+        try:
+            with httpx.Client() as client:
+                _wait_ready(client, f"http://127.0.0.1:{stub_port}/health", stub)
+            for backend in _backends(Path(workdir), stub_issuer):
+                # One discarded run first, so every timed run starts with the files in the page cache.
+                _cold_start(backend, 1)
+                backend.runs = [_cold_start(backend, requests) for _ in range(runs)]
+                summary = _summary(backend.runs)
+                print(_row(backend.name, summary), flush=True)
+                results.append({"backend": backend.name, **summary, "runs": backend.runs})
+        finally:
+            _stop(stub)
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(results: list[dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path, "r", encoding="utf-8") as fh:
+        baseline = {r["backend"]: r for r in json.load(fh)["results"]}
+    print(f"\nChange vs {baseline_path} (negative is faster):")
+    for result in results:
+        previous = baseline.get(result["backend"])
+        if previous is None:
+            continue
+        deltas = [
+            f"{key[:-3]} {result[key] - previous[key]:+8.2f} ms"
+            for key in ("ready_ms", "first_ms", "warm_ms")
+        ]
+        print(f"  {result['backend']:<22} {'   '.join(deltas)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per backend")
+    parser.add_argument("--requests", type=int, default=20, help="Requests after the first, for the warm figure")
+    parser.add_argument("--output", default="bench_cold_start.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    print(f"{'backend':<22} {'ready ms':>9} {'max':>9} {'first ms':>9} {'max':>9} {'warm ms':>8}")
+    results = run(args.runs, args.requests)
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "runs": args.runs,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nWrote {args.output}")
+    if args.baseline:
+        _compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
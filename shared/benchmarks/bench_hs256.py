@@ -0,0 +1,97 @@
+"""Compare HS256 verification cost: ``jwt.decode``, the engine with jose keys, and the fast HMAC path.
+
+Usage:
+    python bench_hs256.py --iterations 5000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from jose import jwt
+from jose.exceptions import JWTError
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from authn_verify import VerificationError, VerificationPolicy, Verifier  # noqa: E402
+
+ISSUER = "https://demo-issuer"
+AUDIENCE = "bench-api"
+SECRET = "bench-secret"
+LEEWAY = 30
+
+
+def _token(**overrides: Any) -> str:
+    claims = {"iss": ISSUER, "aud": AUDIENCE, "sub": "bench", "jti": uuid.uuid4().hex, "exp": int(time.time()) + 3600}
+    claims.update(overrides)
+    return jwt.encode(claims, SECRET, algorithm="HS256")
+
+
+def _engine(fast_hmac: bool) -> Callable[[str], Awaitable[Any]]:
+    verifier = Verifier(
+        VerificationPolicy(
+            algorithms=("HS256",),
+            secret=SECRET,
+            issuer=ISSUER,
+            audience=AUDIENCE,
+            leeway_seconds=LEEWAY,
+            fast_hmac=fast_hmac,
+        )
+    )
+
+    async def verify(token: str) -> Any:
+        try:
+            return await verifier.verify(token)
+        except VerificationError:
+            return None
+
+    return verify
+
+
+async def _legacy(token: str) -> Any:
+    try:
+        return jwt.decode(
+            token, SECRET, algorithms=["HS256"], audience=AUDIENCE, issuer=ISSUER, options={"leeway": LEEWAY}
+        )
+    except JWTError:
+        return None
+
+
+async def _time(tokens: list[str], verify: Callable[[str], Awaitable[Any]]) -> float:
+    await verify(tokens[0])
+    started = time.perf_counter()
+    for token in tokens:
+        await verify(token)
+    return (time.perf_counter() - started) / len(tokens) * 1e6
+
+
+async def run(iterations: int) -> None:
+    tampered = _token()
+    corpora = {
+        "valid, distinct tokens": [_token() for _ in range(iterations)],
+        "bad signature": [tampered[:-2] + ("AA" if not tampered.endswith("AA") else "BB")] * iterations,
+        "expired": [_token(exp=int(time.time()) - 3600)] * iterations,
+        "wrong audience": [_token(aud="other")] * iterations,
+    }
+    verifiers = {"jwt.decode": _legacy, "jose keys": _engine(False), "fast hmac": _engine(True)}
+
+    print(f"{'corpus':<24}" + "".join(f"{name:>12}" for name in verifiers) + f"{'vs decode':>11}")
+    for name, tokens in corpora.items():
+        timings = [await _time(tokens, verify) for verify in verifiers.values()]
+        print(f"{name:<24}" + "".join(f"{us:>10.1f}us" for us in timings) + f"{timings[0] / timings[-1]:>10.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=3000)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Measure per-token verification cost for each policy the workouts use.
+
+Every case is timed through the compiled ``Verifier`` and through the
+``jwt.decode`` call the workout backends used before the shared engine.
+
+Usage:
+    python bench_policies.py --iterations 2000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk, jwt
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from authn_verify import InMemoryReplayCache, VerificationPolicy, Verifier, build_keys  # noqa: E402
+
+ISSUER = "https://demo-issuer"
+AUDIENCE = "bench-api"
+SECRET = "bench-secret"
+LEEWAY = timedelta(seconds=30)
+
+
+class StaticKeys:
+    """Key provider over a fixed, prebuilt key set."""
+
+    def __init__(self, keys: dict) -> None:
+        self._keys = keys
+
+    async def get_or_refetch(self, kid: str):
+        return self._keys.get(kid)
+
+
+def _claims(**extra: Any) -> dict[str, Any]:
+    return {"iss": ISSUER, "aud": AUDIENCE, "sub": "bench", "exp": int(time.time()) + 3600, **extra}
+
+
+def _asymmetric(alg: str, private_key) -> tuple[StaticKeys, dict, str]:
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    public_jwk = jwk.construct(pem, alg).public_key().to_dict()
+    public_jwk.update({"kid": f"{alg}-key", "use": "sig", "alg": alg})
+    token = jwt.encode(_claims(), pem, algorithm=alg, headers={"kid": public_jwk["kid"]})
+    return StaticKeys(build_keys({"keys": [public_jwk]})), public_jwk, token
+
+
+async def _time(tokens: list[str], verify: Callable[[str], Awaitable[Any]]) -> float:
+    await verify(tokens[0])
+    started = time.perf_counter()
+    for token in tokens[1:]:
+        await verify(token)
+    return (time.perf_counter() - started) / (len(tokens) - 1) * 1e6
+
+
+def _legacy(key: Any, algorithms: list[str], **options: Any) -> Callable[[str], Awaitable[Any]]:
+    async def verify(token: str) -> dict[str, Any]:
+        return jwt.decode(token, key, algorithms=algorithms, **options)
+
+    return verify
+
+
+def _legacy_with_replay(key: Any) -> Callable[[str], Awaitable[Any]]:
+    seen: dict[str, float] = {}
+
+    async def verify(token: str) -> dict[str, Any]:
+        claims = jwt.decode(
+            token, key, algorithms=["HS256"], audience=AUDIENCE, issuer=ISSUER, options={"leeway": LEEWAY}
+        )
+        if claims["jti"] in seen:
+            raise RuntimeError("replay")
+        seen[claims["jti"]] = claims["exp"]
+        return claims
+
+    return verify
+
+
+async def run(iterations: int) -> None:
+    same_hs256 = [jwt.encode(_claims(), SECRET, algorithm="HS256")] * (iterations + 1)
+    unique_hs256 = [jwt.encode(_claims(jti=uuid.uuid4().hex), SECRET, algorithm="HS256") for _ in range(iterations + 1)]
+    rsa_keys, rsa_jwk, rsa_token = _asymmetric("RS256", rsa.generate_private_key(public_exponent=65537, key_size=2048))
+    ec_keys, ec_jwk, ec_token = _asymmetric("ES256", ec.generate_private_key(ec.SECP256R1()))
+    strict = {"audience": AUDIENCE, "issuer": ISSUER}
+
+    async def introspector(_: str) -> dict[str, Any]:
+        return {"active": True, **_claims()}
+
+    cases = [
+        (
+            "hs256 signature only",
+            VerificationPolicy(algorithms=("HS256",), secret=SECRET),
+            _legacy(SECRET, ["HS256"], options={"verify_aud": False}),
+            same_hs256,
+        ),
+        (
+            "hs256 iss/aud/leeway",
+            VerificationPolicy(
+                algorithms=("HS256",), secret=SECRET, issuer=ISSUER, audience=AUDIENCE, leeway_seconds=30
+            ),
+            _legacy(SECRET, ["HS256"], options={"leeway": LEEWAY}, **strict),
+            same_hs256,
+        ),
+        (
+            "hs256 + verified cache",
+            VerificationPolicy(
+                algorithms=("HS256",),
+                secret=SECRET,
+                issuer=ISSUER,
+                audience=AUDIENCE,
+                leeway_seconds=30,
+                verified_cache_size=1024,
+            ),
+            _legacy(SECRET, ["HS256"], options={"leeway": LEEWAY}, **strict),
+            same_hs256,
+        ),
+        (
+            "hs256 + replay",
+            VerificationPolicy(
+                algorithms=("HS256",),
+                secret=SECRET,
+                issuer=ISSUER,
+                audience=AUDIENCE,
+                leeway_seconds=30,
+                replay=InMemoryReplayCache(),
+            ),
+            _legacy_with_replay(SECRET),
+            unique_hs256,
+        ),
+        (
+            "rs256 jwks kid",
+            VerificationPolicy(keys=rsa_keys, issuer=ISSUER, audience=AUDIENCE),
+            _legacy(rsa_jwk, ["RS256"], **strict),
+            [rsa_token] * (iterations + 1),
+        ),
+        (
+            "es256 jwks kid",
+            VerificationPolicy(keys=ec_keys, issuer=ISSUER, audience=AUDIENCE),
+            _legacy(ec_jwk, ["ES256"], **strict),
+            [ec_token] * (iterations + 1),
+        ),
+        (
+            "introspection",
+            VerificationPolicy(mode="introspect", introspector=introspector),
+            None,
+            ["opaque-token"] * (iterations + 1),
+        ),
+    ]
+
+    print(f"{'policy':<24} {'engine us':>10} {'legacy us':>10} {'speedup':>8}")
+    for name, policy, legacy, tokens in cases:
+        engine_us = await _time(tokens, Verifier(policy).verify)
+        if legacy is None:
+            print(f"{name:<24} {engine_us:>10.1f} {'-':>10} {'-':>8}")
+            continue
+        legacy_us = await _time(tokens, legacy)
+        print(f"{name:<24} {engine_us:>10.1f} {legacy_us:>10.1f} {legacy_us / engine_us:>7.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Measure what junk tokens cost with and without the prefilter and failure limiter.
+
+Each corpus is pushed through ``BearerAuthMiddleware`` in-process, from one
+client address, three times: over a bare verifier, with ``TokenPrefilter``,
+and with ``TokenPrefilter`` plus ``FailureLimiter``. The introspection
+corpora count how many calls reach the (stubbed) issuer.
+
+Usage:
+    python bench_prefilter.py --iterations 5000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+from jose import jwt
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from authn_verify import (  # noqa: E402
+    BearerAuthMiddleware,
+    FailureLimiter,
+    TokenPrefilter,
+    VerificationPolicy,
+    Verifier,
+)
+
+ISSUER = "https://demo-issuer"
+AUDIENCE = "bench-api"
+SECRET = "bench-secret"
+
+
+class StaticKeys:
+    async def get_or_refetch(self, kid: str):
+        return None
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _random_jwt_shaped(n: int) -> list[str]:
+    header = _b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    return [f"{header}.{_b64(os.urandom(120))}.{_b64(os.urandom(32))}" for _ in range(n)]
+
+
+def corpora(n: int) -> dict[str, tuple[str, list[str]]]:
+    bad_signature = jwt.encode({"iss": ISSUER, "aud": AUDIENCE, "exp": int(time.time()) + 600}, "not-the-secret")
+    unknown_kid = jwt.encode({"iss": ISSUER}, "k", headers={"kid": "made-up"})
+    return {
+        "random jwt-shaped": ("jwt", _random_jwt_shaped(n)),
+        "not a jwt": ("jwt", [_b64(os.urandom(48)) for _ in range(n)]),
+        "oversized": ("jwt", ["a" * 20000 + ".b.c"] * n),
+        "same bad signature": ("jwt", [bad_signature] * n),
+        "unknown kid flood": ("jwks", [unknown_kid] * n),
+        "opaque junk": ("introspect", ["%%junk%%" + os.urandom(8).hex() for _ in range(n)]),
+        "opaque replayed revoked": ("introspect", ["revoked-" + "x" * 40] * n),
+    }
+
+
+def _policy(kind: str, introspections: list[int], prefilter: TokenPrefilter | None) -> VerificationPolicy:
+    async def introspector(token: str) -> dict[str, Any]:
+        introspections[0] += 1
+        await asyncio.sleep(0)
+        return {"active": not token.startswith("revoked-")}
+
+    if kind == "introspect":
+        return VerificationPolicy(mode="introspect", introspector=introspector, prefilter=prefilter)
+    if kind == "jwks":
+        return VerificationPolicy(keys=StaticKeys(), issuer=ISSUER, prefilter=prefilter)
+    return VerificationPolicy(
+        algorithms=("HS256",), secret=SECRET, issuer=ISSUER, audience=AUDIENCE, prefilter=prefilter
+    )
+
+
+async def _time(kind: str, tokens: list[str], prefilter: bool, limiter: bool) -> tuple[float, int, int]:
+    introspections = [0]
+    verifier = Verifier(_policy(kind, introspections, TokenPrefilter() if prefilter else None))
+
+    async def route(scope: Any, receive: Any, send: Any) -> None:
+        return None
+
+    statuses: dict[int, int] = {}
+
+    async def send(message: dict) -> None:
+        if message["type"] == "http.response.start":
+            statuses[message["status"]] = statuses.get(message["status"], 0) + 1
+
+    middleware = BearerAuthMiddleware(
+        route, verifier, paths=("/protected",), limiter=FailureLimiter(rate=1.0, burst=20) if limiter else None
+    )
+    scopes = [
+        {"type": "http", "path": "/protected", "client": ("203.0.113.7", 5000),
+         "headers": [(b"authorization", b"Bearer " + token.encode())]}
+        for token in tokens
+    ]
+    started = time.perf_counter()
+    for scope in scopes:
+        await middleware(scope, None, send)
+    per_request_us = (time.perf_counter() - started) / len(tokens) * 1e6
+    return per_request_us, introspections[0], statuses.get(429, 0)
+
+
+async def run(iterations: int) -> None:
+    print(
+        f"{'corpus':<24} {'bare us':>8} {'prefilter us':>13} {'+limiter us':>12} {'issuer calls':>16} {'429s':>6}"
+    )
+    for name, (kind, tokens) in corpora(iterations).items():
+        bare_us, bare_calls, _ = await _time(kind, tokens, prefilter=False, limiter=False)
+        filtered_us, filtered_calls, _ = await _time(kind, tokens, prefilter=True, limiter=False)
+        limited_us, _, limited = await _time(kind, tokens, prefilter=True, limiter=True)
+        calls = f"{bare_calls} -> {filtered_calls}" if kind == "introspect" else "-"
+        print(
+            f"{name:<24} {bare_us:>8.1f} {filtered_us:>13.1f} {limited_us:>12.1f} {calls:>16} {limited:>6}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=3000)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Differential check of the fast HMAC path against jose key objects and ``jwt.decode``.
+
+Each token in the corpus goes through three verifiers: the engine with
+``fast_hmac`` on, the engine with it off (jose key objects), and the
+``jwt.decode`` call the HS256 workouts made before the shared engine. The two
+engine paths must agree exactly, on the claims or on the error and its reason.
+``jwt.decode`` must land in the same category (ok, expired, claims, invalid),
+except for the cases listed in ``KNOWN_DIFFERENCES``, where the engine is
+deliberately stricter or looser than jose.
+
+Usage:
+    python diff_hs256.py
+    python diff_hs256.py --random 2000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+from jose import jwt
+from jose.exceptions import ExpiredSignatureError, JWTClaimsError, JWTError
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from authn_verify import VerificationError, VerificationPolicy, Verifier  # noqa: E402
+
+ISSUER = "https://demo-issuer"
+AUDIENCE = "bench-api"
+SECRET = "bench-secret"
+LEEWAY = 30
+
+CATEGORIES = {
+    "expired": "expired",
+    "not_before": "claims",
+    "issuer": "claims",
+    "audience": "claims",
+    "claims": "claims",
+    "missing_claim": "claims",
+    "header": "invalid",
+    "alg": "invalid",
+    "signature": "invalid",
+    "malformed": "invalid",
+}
+
+# Case name -> (engine category, jwt.decode category). These predate the fast path.
+KNOWN_DIFFERENCES = {
+    "missing aud": ("claims", "ok"),  # jose skips the audience check when aud is absent
+    "exp numeric string": ("claims", "ok"),  # jose calls int() on exp, nbf and iat
+    "nbf numeric string": ("claims", "ok"),
+    "iat numeric string": ("claims", "ok"),
+    "exp bool": ("claims", "expired"),  # int(True) == 1
+    "expired and not yet valid": ("expired", "claims"),  # jose checks nbf first
+    "kid not a string": ("invalid", "ok"),  # jose ignores kid when given a single key
+}
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _segment(value: Any) -> str:
+    return _b64(json.dumps(value, separators=(",", ":")).encode())
+
+
+def _sign(header: Any, payload: Any, secret: str = SECRET, digest=hashlib.sha256) -> str:
+    signing_input = f"{_segment(header)}.{_segment(payload)}"
+    signature = hmac.new(secret.encode(), signing_input.encode(), digest).digest()
+    return f"{signing_input}.{_b64(signature)}"
+
+
+def _sign_raw(header: Any, payload: bytes) -> str:
+    signing_input = f"{_segment(header)}.{_b64(payload)}"
+    signature = hmac.new(SECRET.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{_b64(signature)}"
+
+
+def _claims(**overrides: Any) -> dict[str, Any]:
+    claims = {"iss": ISSUER, "aud": AUDIENCE, "sub": "diff", "jti": "j-1", "exp": int(time.time()) + 600}
+    claims.update(overrides)
+    return {name: value for name, value in claims.items() if value is not None}
+
+
+def corpus() -> list[tuple[str, str]]:
+    now = int(time.time())
+    hs256 = {"alg": "HS256", "typ": "JWT"}
+    valid = _sign(hs256, _claims())
+    header_b64, payload_b64, signature_b64 = valid.split(".")
+    cases = [
+        ("valid", valid),
+        ("valid with kid", _sign({**hs256, "kid": "k1"}, _claims())),
+        ("valid, same header again", _sign(hs256, _claims(jti="j-2"))),
+        ("aud list containing audience", _sign(hs256, _claims(aud=["other", AUDIENCE]))),
+        ("float exp", _sign(hs256, _claims(exp=now + 600.5))),
+        ("no exp", _sign(hs256, _claims(exp=None))),
+        ("expired inside leeway", _sign(hs256, _claims(exp=now - LEEWAY + 5))),
+        ("expired past leeway", _sign(hs256, _claims(exp=now - LEEWAY - 5))),
+        ("expired long ago", _sign(hs256, _claims(exp=now - 86400))),
+        ("nbf inside leeway", _sign(hs256, _claims(nbf=now + LEEWAY - 5))),
+        ("nbf past leeway", _sign(hs256, _claims(nbf=now + LEEWAY + 5))),
+        ("expired and not yet valid", _sign(hs256, _claims(exp=now - 3600, nbf=now + 3600))),
+        ("exp not a number", _sign(hs256, _claims(exp="soon"))),
+        ("exp numeric string", _sign(hs256, _claims(exp=str(now + 600)))),
+        ("exp bool", _sign(hs256, _claims(exp=True))),
+        ("nbf not a number", _sign(hs256, _claims(nbf="later"))),
+        ("nbf numeric string", _sign(hs256, _claims(nbf=str(now)))),
+        ("wrong iss", _sign(hs256, _claims(iss="https://evil"))),
+        ("missing iss", _sign(hs256, _claims(iss=None))),
+        ("wrong aud", _sign(hs256, _claims(aud="other"))),
+        ("aud list without audience", _sign(hs256, _claims(aud=["a", "b"]))),
+        ("aud list with non-string member", _sign(hs256, _claims(aud=[AUDIENCE, 5]))),
+        ("missing aud", _sign(hs256, _claims(aud=None))),
+        ("sub not a string", _sign(hs256, _claims(sub=42))),
+        ("jti not a string", _sign(hs256, _claims(jti=7))),
+        ("iat not a number", _sign(hs256, _claims(iat="yesterday"))),
+        ("iat numeric string", _sign(hs256, _claims(iat=str(now)))),
+        ("wrong secret", _sign(hs256, _claims(), secret="other-secret")),
+        ("tampered payload", f"{header_b64}.{_segment(_claims(sub='admin'))}.{signature_b64}"),
+        ("tampered signature", f"{header_b64}.{payload_b64}.{signature_b64[:-2]}AA"),
+        ("truncated signature", f"{header_b64}.{payload_b64}.{signature_b64[:10]}"),
+        ("empty signature", f"{header_b64}.{payload_b64}."),
+        ("signature not base64", f"{header_b64}.{payload_b64}.!!!!"),
+        ("padded signature", f"{header_b64}.{payload_b64}.{signature_b64}="),
+        ("non-ascii signature", f"{header_b64}.{payload_b64}.{signature_b64[:-1]}é"),
+        ("alg none", f"{_segment({'alg': 'none'})}.{payload_b64}."),
+        ("alg HS384, correctly signed", _sign({"alg": "HS384"}, _claims(), digest=hashlib.sha384)),
+        ("alg RS256 with HMAC signature", _sign({"alg": "RS256"}, _claims())),
+        ("alg not a string", _sign({"alg": 256}, _claims())),
+        ("kid not a string", _sign({**hs256, "kid": 5}, _claims())),
+        ("header not an object", _sign(["HS256"], _claims())),
+        ("header not json", f"{_b64(b'{nope')}.{payload_b64}.{signature_b64}"),
+        ("header not base64", f"!!.{payload_b64}.{signature_b64}"),
+        ("payload not an object", _sign(hs256, ["not", "claims"])),
+        ("payload not json", _sign_raw(hs256, b"not json")),
+        ("two segments", f"{header_b64}.{payload_b64}"),
+        ("four segments", f"{valid}.extra"),
+        ("empty token", ""),
+    ]
+    return cases
+
+
+def random_corpus(count: int, seed: int) -> list[tuple[str, str]]:
+    """Valid tokens with one random byte flipped, dropped or inserted."""
+    rng = random.Random(seed)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_.="
+    cases = []
+    for index in range(count):
+        token = list(_sign({"alg": "HS256", "typ": "JWT"}, _claims(jti=f"r-{index}")))
+        position = rng.randrange(len(token))
+        action = rng.choice(("flip", "drop", "insert"))
+        if action == "flip":
+            token[position] = rng.choice(alphabet)
+        elif action == "drop":
+            del token[position]
+        else:
+            token.insert(position, rng.choice(alphabet))
+        cases.append((f"random {action} #{index}", "".join(token)))
+    return cases
+
+
+def _policy(fast_hmac: bool) -> VerificationPolicy:
+    return VerificationPolicy(
+        algorithms=("HS256",),
+        secret=SECRET,
+        issuer=ISSUER,
+        audience=AUDIENCE,
+        leeway_seconds=LEEWAY,
+        fast_hmac=fast_hmac,
+    )
+
+
+async def _engine(verifier: Verifier, token: str) -> tuple[str, Any]:
+    try:
+        verified = await verifier.verify(token)
+    except VerificationError as exc:
+        return exc.reason, exc.detail
+    return "ok", verified.claims
+
+
+def _legacy(token: str) -> tuple[str, Any]:
+    try:
+        claims = jwt.decode(
+            token, SECRET, algorithms=["HS256"], audience=AUDIENCE, issuer=ISSUER, options={"leeway": LEEWAY}
+        )
+    except ExpiredSignatureError as exc:
+        return "expired", str(exc)
+    except JWTClaimsError as exc:
+        return "claims", str(exc)
+    except JWTError as exc:
+        return "invalid", str(exc)
+    return "ok", claims
+
+
+async def run(cases: list[tuple[str, str]], verbose: bool) -> int:
+    fast = Verifier(_policy(fast_hmac=True))
+    reference = Verifier(_policy(fast_hmac=False))
+    failures = 0
+    known = 0
+    for name, token in cases:
+        fast_result = await _engine(fast, token)
+        reference_result = await _engine(reference, token)
+        legacy_category, legacy_detail = _legacy(token)
+        engine_category = CATEGORIES.get(fast_result[0], fast_result[0])
+
+        problems = []
+        if fast_result != reference_result:
+            problems.append(f"fast path {fast_result!r} != jose keys {reference_result!r}")
+        if engine_category != legacy_category:
+            if KNOWN_DIFFERENCES.get(name) == (engine_category, legacy_category):
+                known += 1
+            else:
+                problems.append(f"engine {engine_category} ({fast_result[0]}) != jwt.decode {legacy_category}")
+        elif name in KNOWN_DIFFERENCES:
+            problems.append(f"listed as a known difference but both say {engine_category}")
+        elif engine_category == "ok" and fast_result[1] != legacy_detail:
+            problems.append("claims differ from jwt.decode")
+
+        if problems:
+            failures += 1
+            print(f"FAIL {name}: " + "; ".join(problems))
+        elif verbose:
+            print(f"ok   {name}: {fast_result[0]} / jwt.decode {legacy_category}")
+
+    print(f"{len(cases)} cases, {failures} failures, {known} known differences from jwt.decode")
+    return 1 if failures else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--random", type=int, default=500, help="Randomly corrupted tokens to add")
+    parser.add_argument("--seed", type=int, default=19)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    cases = corpus() + random_corpus(args.random, args.seed)
+    sys.exit(asyncio.run(run(cases, args.verbose)))
+
+
+if __name__ == "__main__":
+    main()
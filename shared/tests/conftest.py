@@ -0,0 +1,7 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+# The same import root the benchmarks and the backends use: authn_verify sits right here.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
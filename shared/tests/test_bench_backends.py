@@ -0,0 +1,13 @@
+"""``bench_backends``: every backend gives the expected answer for every corpus it is timed on."""
+from __future__ import annotations
+
+import asyncio
+
+from benchmarks import bench_backends
+
+
+def test_every_case_gets_the_expected_result() -> None:
+    cases = asyncio.run(bench_backends.run(3, 2))
+    for case in cases:
+        for mode in ("in_process", "http"):
+            assert case.results[mode]["unexpected_results"] == 0, (case.backend, case.corpus, mode)
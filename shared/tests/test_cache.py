@@ -0,0 +1,65 @@
+"""``VerifiedTokenCache``: a hit only ever returns claims that are still inside their time window."""
+from __future__ import annotations
+
+import pytest
+
+from authn_verify import VerifiedTokenCache
+from authn_verify import cache as cache_module
+
+NOW = 1_000_000.0
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [NOW]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    return now
+
+
+def test_hit_returns_a_copy_and_the_kid(clock: list[float]) -> None:
+    cache = VerifiedTokenCache(max_entries=8, leeway_seconds=30)
+    cache.put("token", {"sub": "alice", "exp": NOW + 600}, kid="k1")
+    claims, kid = cache.get("token")
+    assert (claims, kid) == ({"sub": "alice", "exp": NOW + 600}, "k1")
+    claims["sub"] = "mallory"
+    assert cache.get("token")[0]["sub"] == "alice"
+    assert cache.get("other") is None
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 1}
+
+
+def test_entries_end_leeway_before_exp(clock: list[float]) -> None:
+    cache = VerifiedTokenCache(max_entries=8, leeway_seconds=30)
+    cache.put("token", {"exp": NOW + 60})
+    clock[0] = NOW + 29
+    assert cache.get("token") is not None
+    clock[0] = NOW + 30
+    assert cache.get("token") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_not_yet_valid_hit_is_a_miss(clock: list[float]) -> None:
+    cache = VerifiedTokenCache(max_entries=8, leeway_seconds=30)
+    # Verified while the clock said it was valid; the clock then stepped back.
+    cache.put("token", {"exp": NOW + 600, "nbf": NOW})
+    clock[0] = NOW - 60
+    assert cache.get("token") is None
+    clock[0] = NOW - 10
+    assert cache.get("token") is not None
+
+
+@pytest.mark.parametrize("claims", [{}, {"exp": "soon"}, {"exp": NOW + 10}, {"exp": NOW + 600, "nbf": "x"}])
+def test_uncacheable_claims(clock: list[float], claims: dict[str, object]) -> None:
+    cache = VerifiedTokenCache(max_entries=8, leeway_seconds=30)
+    cache.put("token", claims)
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_is_evicted(clock: list[float]) -> None:
+    cache = VerifiedTokenCache(max_entries=2, leeway_seconds=0)
+    for token in ("a", "b"):
+        cache.put(token, {"exp": NOW + 600})
+    assert cache.get("a") is not None
+    cache.put("c", {"exp": NOW + 600})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
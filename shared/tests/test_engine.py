@@ -0,0 +1,253 @@
+"""The engine's header, algorithm, signature, and claim checks, and the details they fail with."""
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Any
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from authn_verify import InMemoryReplayCache, VerificationError, VerificationKey, VerificationPolicy, Verifier
+from benchmarks import diff_hs256
+
+SECRET = "test-secret"
+ISSUER = "https://issuer.test"
+AUDIENCE = "workouts"
+
+
+def _claims(**overrides: Any) -> dict[str, Any]:
+    now = int(time.time())
+    claims = {"sub": "alice", "iss": ISSUER, "aud": AUDIENCE, "iat": now, "exp": now + 300, "jti": "id-1"}
+    claims.update(overrides)
+    return {name: value for name, value in claims.items() if value is not None}
+
+
+def _hs256(**claims: Any) -> str:
+    return jwt.encode(_claims(**claims), SECRET, algorithm="HS256")
+
+
+def _segment(value: dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).rstrip(b"=").decode()
+
+
+def _verifier(**policy: Any) -> Verifier:
+    options = {"algorithms": ("HS256",), "secret": SECRET, "issuer": ISSUER, "audience": AUDIENCE, **policy}
+    return Verifier(VerificationPolicy(**options))
+
+
+def _verify(verifier: Verifier, token: str) -> tuple[str, Any]:
+    async def run() -> tuple[str, Any]:
+        try:
+            verified = await verifier.verify(token)
+        except VerificationError as exc:
+            return exc.reason, exc.detail
+        return "ok", verified.claims
+
+    return asyncio.run(run())
+
+
+DIFF_CORPUS = diff_hs256.corpus()
+
+
+@pytest.mark.parametrize("name,token", DIFF_CORPUS, ids=[name for name, _ in DIFF_CORPUS])
+def test_matches_jwt_decode(name: str, token: str) -> None:
+    reason, detail = asyncio.run(diff_hs256._engine(Verifier(diff_hs256._policy(fast_hmac=True)), token))
+    category = diff_hs256.CATEGORIES.get(reason, reason)
+    legacy_category, legacy_detail = diff_hs256._legacy(token)
+    if name in diff_hs256.KNOWN_DIFFERENCES:
+        assert (category, legacy_category) == diff_hs256.KNOWN_DIFFERENCES[name]
+    else:
+        assert category == legacy_category
+        if category == "ok":
+            assert detail == legacy_detail
+
+
+@pytest.mark.parametrize("name,token", DIFF_CORPUS, ids=[name for name, _ in DIFF_CORPUS])
+def test_fast_hmac_matches_jose_keys(name: str, token: str) -> None:
+    fast = Verifier(diff_hs256._policy(fast_hmac=True))
+    reference = Verifier(diff_hs256._policy(fast_hmac=False))
+    assert asyncio.run(diff_hs256._engine(fast, token)) == asyncio.run(diff_hs256._engine(reference, token))
+
+
+def test_valid_token() -> None:
+    claims = _claims()
+    assert _verify(_verifier(), jwt.encode(claims, SECRET, algorithm="HS256")) == ("ok", claims)
+
+
+@pytest.mark.parametrize(
+    "claims,reason,detail",
+    [
+        ({"iss": "https://other.test"}, "issuer", "Claim verification failed: Invalid issuer"),
+        ({"aud": "other"}, "audience", "Claim verification failed: Invalid audience"),
+        ({"aud": ["other", AUDIENCE]}, "ok", None),
+        ({"aud": [AUDIENCE, 5]}, "audience", "Claim verification failed: Invalid claim format in token"),
+        ({"aud": 5}, "audience", "Claim verification failed: Invalid claim format in token"),
+        ({"exp": int(time.time()) - 60}, "expired", "Token expired"),
+        ({"nbf": int(time.time()) + 60}, "not_before", "Claim verification failed: The token is not yet valid (nbf)"),
+        ({"exp": "soon"}, "claims", "Claim verification failed: Expiration Time claim (exp) must be an integer."),
+        ({"nbf": "later"}, "claims", "Claim verification failed: Not Before claim (nbf) must be an integer."),
+        ({"iat": "yesterday"}, "claims", "Claim verification failed: Issued At claim (iat) must be an integer."),
+        ({"sub": 42}, "claims", "Claim verification failed: Subject must be a string."),
+        ({"jti": 7}, "claims", "Claim verification failed: JWT ID must be a string."),
+    ],
+)
+def test_claim_failures_keep_the_jwt_decode_details(claims: dict[str, Any], reason: str, detail: str | None) -> None:
+    result = _verify(_verifier(), _hs256(**claims))
+    assert result[0] == reason
+    if detail is not None:
+        assert result[1] == detail
+
+
+def test_missing_aud_fails_when_an_audience_is_expected() -> None:
+    token = _hs256(aud=None)
+    assert _verify(_verifier(), token) == ("audience", "Claim verification failed: Invalid audience")
+    assert _verify(_verifier(audience=None), token)[0] == "ok"
+
+
+def test_claim_failures_are_generic_without_detailed_errors() -> None:
+    assert _verify(_verifier(detailed_errors=False), _hs256(aud="other")) == ("audience", "Token verification failed")
+
+
+def test_required_claims() -> None:
+    verifier = _verifier(required_claims=("scope",))
+    assert _verify(verifier, _hs256()) == ("missing_claim", "Missing scope claim")
+    assert _verify(verifier, _hs256(scope="read"))[0] == "ok"
+
+
+def test_exp_and_nbf_checks_can_be_turned_off() -> None:
+    now = int(time.time())
+    token = _hs256(exp=now - 3600, nbf=now + 3600)
+    assert _verify(_verifier(), token)[0] == "expired"
+    assert _verify(_verifier(verify_exp=False), token)[0] == "not_before"
+    assert _verify(_verifier(verify_exp=False, verify_nbf=False), token)[0] == "ok"
+
+
+def test_leeway() -> None:
+    token = _hs256(exp=int(time.time()) - 10)
+    assert _verify(_verifier(), token)[0] == "expired"
+    assert _verify(_verifier(leeway_seconds=30), token)[0] == "ok"
+
+
+def test_algorithm_allow_list_and_signature() -> None:
+    claims = _claims()
+    verifier = _verifier(algorithms=("HS256", "HS384"))
+    assert _verify(verifier, jwt.encode(claims, SECRET, algorithm="HS384"))[0] == "ok"
+    assert _verify(verifier, jwt.encode(claims, SECRET, algorithm="HS512")) == (
+        "alg",
+        "Unexpected alg HS512; expected HS256, HS384",
+    )
+    assert _verify(verifier, jwt.encode(claims, "other", algorithm="HS256"))[0] == "signature"
+    assert _verify(verifier, "not-a-jwt")[0] == "header"
+
+
+class _Keys:
+    def __init__(self, keys: dict[str, VerificationKey]) -> None:
+        self.keys = keys
+
+    async def get_or_refetch(self, kid: str) -> VerificationKey | None:
+        return self.keys.get(kid)
+
+
+@pytest.fixture(scope="module")
+def rsa_pem() -> str:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+
+
+@pytest.fixture(scope="module")
+def key_set(rsa_pem: str) -> _Keys:
+    return _Keys({"k1": VerificationKey("k1", "RS256", jwk.construct(rsa_pem, "RS256").public_key())})
+
+
+def test_key_set(rsa_pem: str, key_set: _Keys) -> None:
+    claims = _claims()
+    verifier = Verifier(VerificationPolicy(keys=key_set, issuer=ISSUER, audience=AUDIENCE))
+    token = jwt.encode(claims, rsa_pem, algorithm="RS256", headers={"kid": "k1"})
+    assert _verify(verifier, token) == ("ok", claims)
+    assert asyncio.run(verifier.verify(token)).kid == "k1"
+    assert _verify(verifier, jwt.encode(claims, rsa_pem, algorithm="RS256")) == ("kid", "Missing kid header")
+    assert _verify(verifier, jwt.encode(claims, rsa_pem, algorithm="RS256", headers={"kid": "k2"})) == (
+        "unknown_kid",
+        "Unknown signing key: k2",
+    )
+    assert _verify(verifier, jwt.encode(claims, rsa_pem, algorithm="RS384", headers={"kid": "k1"})) == (
+        "alg",
+        "Unexpected alg RS384 for key k1; expected RS256",
+    )
+    # The classic confusion attack: an HMAC token keyed with the public key's PEM.
+    public_pem = jwk.construct(rsa_pem, "RS256").public_key().to_pem().decode()
+    signing_input = f"{_segment({'alg': 'HS256', 'kid': 'k1'})}.{token.split('.')[1]}"
+    signature = hmac.new(public_pem.encode(), signing_input.encode(), hashlib.sha256).digest()
+    forged = f"{signing_input}.{base64.urlsafe_b64encode(signature).rstrip(b'=').decode()}"
+    assert _verify(verifier, forged)[0] == "alg"
+
+
+def test_replay_is_checked_after_verification() -> None:
+    replay = InMemoryReplayCache()
+    verifier = _verifier(replay=replay)
+    token = _hs256(jti="once")
+    assert _verify(verifier, token)[0] == "ok"
+    assert _verify(verifier, token) == ("replay", "Token replay detected")
+    assert _verify(verifier, jwt.encode(_claims(jti="forged"), "other", algorithm="HS256"))[0] == "signature"
+    assert len(replay) == 1
+    assert _verify(verifier, _hs256(jti=None)) == ("missing_claim", "Missing jti claim")
+
+
+def test_verified_cache_skips_the_signature_on_a_hit() -> None:
+    verifier = _verifier(verified_cache_size=8)
+    token = _hs256()
+    assert _verify(verifier, token)[0] == "ok"
+    assert _verify(verifier, token)[0] == "ok"
+    assert verifier.stats()["verified_cache"] == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_introspection_mode() -> None:
+    seen: list[str] = []
+
+    async def introspect(token: str) -> dict[str, Any]:
+        seen.append(token)
+        return {"active": token == "good", "sub": "alice"}
+
+    verifier = Verifier(VerificationPolicy(mode="auto", secret=SECRET, algorithms=("HS256",), introspector=introspect))
+    assert asyncio.run(verifier.verify("good")).source == "introspect"
+    assert _verify(verifier, "bad") == ("inactive", "Token inactive")
+    assert _verify(verifier, _hs256())[0] == "ok"
+    assert seen == ["good", "bad"]
+
+
+@pytest.mark.parametrize(
+    "policy",
+    [
+        {"mode": "sideways", "secret": SECRET, "algorithms": ("HS256",)},
+        {"secret": SECRET},
+        {"algorithms": ("HS256",)},
+        {"mode": "introspect"},
+    ],
+)
+def test_invalid_policies(policy: dict[str, Any]) -> None:
+    with pytest.raises(ValueError):
+        Verifier(VerificationPolicy(**policy))
+
+
+def test_only_verified_headers_are_cached() -> None:
+    verifier = _verifier()
+    for index in range(200):
+        forged = jwt.encode(_claims(), "other", algorithm="HS256", headers={"kid": f"forged-{index}"})
+        assert _verify(verifier, forged)[0] == "signature"
+    assert verifier._headers == {}
+    tokens = [jwt.encode(_claims(), SECRET, algorithm="HS256", headers={"kid": f"k{index}"}) for index in range(70)]
+    for token in tokens:
+        assert _verify(verifier, token)[0] == "ok"
+    # Full: the oldest headers made room for the newest.
+    assert len(verifier._headers) == 64
+    assert tokens[0].partition(".")[0] not in verifier._headers
+    assert tokens[-1].partition(".")[0] in verifier._headers
@@ -0,0 +1,176 @@
+"""``JwksManager``: refreshed off the request path, stale on failure, and one refetch per unknown kid."""
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+from typing import Any
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk
+
+from authn_verify import JwksManager, build_keys, jwks_loader
+from authn_verify.jwks import JwksDocument
+
+
+def _jwk(kid: str) -> dict[str, Any]:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    return {**jwk.construct(pem, "RS256").public_key().to_dict(), "kid": kid}
+
+
+OLD, NEW = _jwk("old"), _jwk("new")
+
+
+class _Source:
+    """A JWKS source whose document, max-age, and failures the test controls."""
+
+    def __init__(self, *keys: dict[str, Any], max_age: float | None = None, delay: float = 0.0) -> None:
+        self.document = {"keys": list(keys)}
+        self.max_age = max_age
+        self.delay = delay
+        self.error: Exception | None = None
+        self.loads = 0
+
+    async def __call__(self) -> JwksDocument:
+        self.loads += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.document, self.max_age
+
+
+def test_refresh_swaps_in_a_new_snapshot() -> None:
+    source = _Source(OLD)
+    manager = JwksManager(source)
+
+    async def run() -> None:
+        assert await manager.refresh()
+        before = manager.keys
+        source.document = {"keys": [NEW]}
+        assert await manager.refresh()
+        assert sorted(before) == ["old"]
+        assert sorted(manager.keys) == ["new"]
+
+    asyncio.run(run())
+    assert manager.stats()["refreshes"] == 2
+
+
+def test_failed_refresh_keeps_serving_stale_keys() -> None:
+    source = _Source(OLD)
+    manager = JwksManager(source, refresh_interval=300, min_refetch_interval=30)
+
+    async def run() -> None:
+        await manager.refresh()
+        source.error = httpx.ConnectError("down")
+        assert not await manager.refresh()
+
+    asyncio.run(run())
+    assert manager.get("old") is not None
+    stats = manager.stats()
+    assert stats["failures"] == 1
+    assert stats["next_refresh_seconds"] == 30
+
+
+def test_unknown_kid_refetch_is_rate_limited() -> None:
+    source = _Source(OLD)
+    manager = JwksManager(source, min_refetch_interval=30)
+
+    async def run() -> list[Any]:
+        await manager.refresh()
+        first = await manager.get_or_refetch("missing")
+        source.document = {"keys": [OLD, NEW]}
+        second = await manager.get_or_refetch("new")
+        return [first, second]
+
+    assert asyncio.run(run()) == [None, None]
+    assert source.loads == 2
+
+
+def test_concurrent_unknown_kids_share_one_fetch() -> None:
+    source = _Source(OLD, delay=0.02)
+    manager = JwksManager(source, min_refetch_interval=30)
+
+    async def run() -> list[Any]:
+        await manager.refresh()
+        source.document = {"keys": [OLD, NEW]}
+        return await asyncio.gather(*(manager.get_or_refetch("new") for _ in range(5)))
+
+    keys = asyncio.run(run())
+    assert [key.kid for key in keys] == ["new"] * 5
+    assert source.loads == 2
+
+
+@pytest.mark.parametrize("max_age,expected", [(None, 300), (600, 600), (1, 30)])
+def test_next_refresh_follows_max_age(max_age: float | None, expected: float) -> None:
+    manager = JwksManager(_Source(OLD, max_age=max_age), refresh_interval=300, min_refetch_interval=30)
+    asyncio.run(manager.refresh())
+    assert manager.stats()["next_refresh_seconds"] == expected
+
+
+def test_background_refresh() -> None:
+    source = _Source(OLD)
+    manager = JwksManager(source, refresh_interval=0.01, min_refetch_interval=0.01)
+
+    async def run() -> None:
+        await manager.start()
+        await asyncio.sleep(0.1)
+        await manager.stop()
+
+    asyncio.run(run())
+    assert source.loads > 2
+    loads = source.loads
+    asyncio.run(asyncio.sleep(0.05))
+    assert source.loads == loads
+
+
+def test_loaders(tmp_path: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    document = {"keys": [OLD]}
+    path = tmp_path / "jwks.json"
+    path.write_text(json.dumps(document))
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=document, headers={"cache-control": "public, max-age=120"})
+
+    client = functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler))
+    # load_url imports httpx when it runs, so patch the module itself.
+    monkeypatch.setattr(httpx, "AsyncClient", client)
+
+    async def run() -> list[JwksDocument]:
+        return [
+            await jwks_loader(inline=json.dumps(document))(),
+            await jwks_loader(path=str(path))(),
+            await jwks_loader(url="https://idp/jwks")(),
+            await jwks_loader()(),
+        ]
+
+    assert asyncio.run(run()) == [(document, None), (document, None), (document, 120.0), ({}, None)]
+
+
+def test_build_keys_pins_an_alg_and_skips_bad_entries() -> None:
+    ec_key = ec.generate_private_key(ec.SECP256R1()).private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    ec_jwk = jwk.construct(ec_key, "ES256").public_key().to_dict()
+    ec_jwk.pop("alg", None)
+    keys = build_keys(
+        {
+            "keys": [
+                {**OLD, "alg": "RS384"},
+                {**ec_jwk, "kid": "ec"},
+                {**NEW, "use": "enc"},
+                {key: value for key, value in NEW.items() if key != "kid"},
+                {"kty": "RSA", "kid": "broken", "alg": "RS256", "n": "AQAB"},
+                {"kty": "oct", "kid": "secret", "k": "c2VjcmV0"},
+            ]
+        }
+    )
+    assert sorted(keys) == ["ec", "old"]
+    assert keys["old"].alg == "RS384"
+    # Without an alg the EC key's curve decides it.
+    assert keys["ec"].alg == "ES256"
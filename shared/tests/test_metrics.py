@@ -0,0 +1,63 @@
+"""``VerificationMetrics``: stage and outcome series, and what ``/metrics`` renders."""
+from __future__ import annotations
+
+import asyncio
+import time
+
+from jose import jwt
+
+from authn_verify import VerificationError, VerificationMetrics, VerificationPolicy, Verifier
+from authn_verify.metrics import Histogram
+
+SECRET = "metrics-secret"
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    histogram = Histogram((0.001, 0.01))
+    for seconds in (0.0005, 0.001, 0.005, 2.0):
+        histogram.observe(seconds)
+    assert histogram.render("t", 'stage="x"') == [
+        't_bucket{stage="x",le="0.001"} 2',
+        't_bucket{stage="x",le="0.01"} 3',
+        't_bucket{stage="x",le="+Inf"} 4',
+        't_sum{stage="x"} 2.0065',
+        't_count{stage="x"} 4',
+    ]
+
+
+def test_verifier_records_stages_and_outcomes() -> None:
+    metrics = VerificationMetrics(prefix="test")
+    verifier = Verifier(
+        VerificationPolicy(algorithms=("HS256",), secret=SECRET, verified_cache_size=8), metrics=metrics
+    )
+    token = jwt.encode({"sub": "alice", "exp": int(time.time()) + 300}, SECRET)
+
+    async def run() -> None:
+        await verifier.verify(token)
+        await verifier.verify(token)
+        try:
+            await verifier.verify(jwt.encode({"sub": "alice"}, "wrong"))
+        except VerificationError:
+            pass
+
+    asyncio.run(run())
+    text = metrics.render()
+    assert 'test_outcomes_total{source="jwt",reason="ok"} 2' in text
+    assert 'test_outcomes_total{source="jwt",reason="signature"} 1' in text
+    assert 'test_duration_seconds_count{source="jwt"} 3' in text
+    # A stage is recorded once it completes, so the forged token stops short of a signature lap.
+    for stage, count in (("cache", 3), ("header", 2), ("key", 2), ("signature", 1), ("claims", 1)):
+        assert f'test_stage_seconds_count{{stage="{stage}"}} {count}' in text
+    assert 'test_cache_hits_total{cache="verified"} 1' in text
+    assert 'test_cache_hit_ratio{cache="verified"} 0.333333' in text
+
+
+def test_polled_values_are_read_at_scrape_time() -> None:
+    metrics = VerificationMetrics(prefix="test")
+    value: list[float | None] = [None]
+    metrics.poll("queue_depth", "gauge", "Queued items.", lambda: value[0])
+    assert "test_queue_depth" not in metrics.render()
+    value[0] = 3
+    assert metrics.render().endswith(
+        "# HELP test_queue_depth Queued items.\n# TYPE test_queue_depth gauge\ntest_queue_depth 3\n"
+    )
@@ -0,0 +1,104 @@
+"""``BearerAuthMiddleware``: what it answers before routing, and what it hands the route."""
+from __future__ import annotations
+
+import time
+from typing import Any
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from authn_verify import BearerAuthMiddleware, VerificationError, VerificationPolicy, VerifiedToken, Verifier
+from authn_verify.dependency import bearer_token, to_http_exception, verified_token
+
+SECRET = "test-secret"
+
+
+def _token(**claims: Any) -> str:
+    return jwt.encode({"sub": "alice", "exp": int(time.time()) + 300, **claims}, SECRET, algorithm="HS256")
+
+
+def _app(paths: tuple[str, ...] = ("/protected", "/api/")) -> tuple[FastAPI, list[str]]:
+    verifier = Verifier(VerificationPolicy(algorithms=("HS256",), secret=SECRET))
+    app = FastAPI()
+    routed: list[str] = []
+
+    @app.get("/protected")
+    @app.get("/api/items")
+    @app.get("/open")
+    async def protected(token: VerifiedToken = Depends(verified_token)) -> dict[str, Any]:
+        routed.append(token.claims["sub"])
+        return token.claims
+
+    @app.get("/public")
+    async def public() -> dict[str, str]:
+        return {"ok": "yes"}
+
+    @app.get("/dependency")
+    async def dependency(token: str = Depends(bearer_token)) -> dict[str, Any]:
+        try:
+            return (await verifier.verify(token)).claims
+        except VerificationError as exc:
+            raise to_http_exception(exc) from exc
+
+    app.add_middleware(BearerAuthMiddleware, verifier=verifier, paths=paths)
+    return app, routed
+
+
+@pytest.fixture
+def client() -> TestClient:
+    app, _ = _app()
+    return TestClient(app)
+
+
+def test_verified_token_reaches_the_route() -> None:
+    app, routed = _app()
+    client = TestClient(app)
+    assert client.get("/protected", headers={"Authorization": f"Bearer {_token()}"}).json()["sub"] == "alice"
+    assert client.get("/api/items", headers={"Authorization": f"bearer {_token()}"}).status_code == 200
+    assert routed == ["alice", "alice"]
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [{}, {"Authorization": "Basic abc"}, {"Authorization": "Bearer"}, {"Authorization": "Bearer "}],
+)
+def test_missing_or_malformed_header(headers: dict[str, str]) -> None:
+    app, routed = _app()
+    resp = TestClient(app).get("/protected", headers=headers)
+    assert resp.status_code == 401
+    assert resp.json() == {"detail": "Missing Authorization header"}
+    assert resp.headers["www-authenticate"] == "Bearer"
+    assert routed == []
+
+
+@pytest.mark.parametrize(
+    "token",
+    ["not-a-jwt", _token(exp=int(time.time()) - 60), jwt.encode({"sub": "alice"}, "other", algorithm="HS256")],
+)
+def test_rejections_match_the_dependency(client: TestClient, token: str) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+    rejected, expected = client.get("/protected", headers=headers), client.get("/dependency", headers=headers)
+    assert rejected.status_code == expected.status_code == 401
+    assert rejected.content == expected.content
+    assert rejected.headers["www-authenticate"] == expected.headers["www-authenticate"]
+    assert rejected.headers["content-length"] == expected.headers["content-length"]
+
+
+def test_uncovered_paths_pass_through(client: TestClient) -> None:
+    assert client.get("/public").json() == {"ok": "yes"}
+    with pytest.raises(RuntimeError, match="does not cover /open"):
+        client.get("/open", headers={"Authorization": f"Bearer {_token()}"})
+
+
+def test_route_errors_are_untouched() -> None:
+    app, _ = _app()
+
+    @app.get("/api/teapot")
+    async def teapot(token: VerifiedToken = Depends(verified_token)) -> None:
+        raise HTTPException(status_code=418, detail="short and stout")
+
+    resp = TestClient(app).get("/api/teapot", headers={"Authorization": f"Bearer {_token()}"})
+    assert resp.status_code == 418
+    assert resp.json() == {"detail": "short and stout"}
@@ -0,0 +1,149 @@
+"""``SignatureOffload``: which checks leave the event loop, where they run, and what a full queue answers."""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+from jose.utils import base64url_decode
+
+from authn_verify import (
+    OffloadBusy,
+    SignatureOffload,
+    VerificationError,
+    VerificationKey,
+    VerificationMetrics,
+    VerificationPolicy,
+    Verifier,
+)
+
+
+@pytest.fixture(scope="module")
+def rsa_pem() -> str:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+
+
+class _Keys:
+    def __init__(self, keys: dict[str, VerificationKey]) -> None:
+        self.keys = keys
+
+    async def get_or_refetch(self, kid: str) -> VerificationKey | None:
+        return self.keys.get(kid)
+
+
+class _BlockingKey:
+    """Holds a worker until ``release`` is set, so the queue can be filled on purpose."""
+
+    def __init__(self) -> None:
+        self.release = threading.Event()
+
+    def verify(self, message: bytes, signature: bytes) -> bool:
+        self.release.wait(10)
+        return True
+
+
+def _signed(rsa_pem: str) -> tuple[Any, bytes, bytes]:
+    token = jwt.encode({"sub": "alice"}, rsa_pem, algorithm="RS256")
+    signing_input, _, signature = token.rpartition(".")
+    key = jwk.construct(rsa_pem, "RS256").public_key()
+    return key, signing_input.encode(), base64url_decode(signature.encode())
+
+
+def test_wants() -> None:
+    offload = SignatureOffload(large_token_bytes=100)
+    assert offload.wants("RS256", 10)
+    assert offload.wants("ES256", 10)
+    assert not offload.wants("HS256", 99)
+    assert offload.wants("HS256", 100)
+    assert not SignatureOffload(large_token_bytes=None).wants("HS256", 10**6)
+    assert not SignatureOffload("inline").wants("RS256", 10)
+
+
+def test_invalid_settings() -> None:
+    with pytest.raises(ValueError):
+        SignatureOffload("fibers")
+    with pytest.raises(ValueError):
+        SignatureOffload(max_queue=-1)
+
+
+@pytest.mark.parametrize("strategy", ["thread", "process"])
+def test_verify(strategy: str, rsa_pem: str) -> None:
+    key, message, signature = _signed(rsa_pem)
+    offload = SignatureOffload(strategy, max_workers=1)
+
+    async def run() -> list[bool]:
+        await offload.start()
+        return [
+            await offload.verify(key, "RS256", message, signature),
+            await offload.verify(key, "RS256", message + b"x", signature),
+        ]
+
+    try:
+        assert asyncio.run(run()) == [True, False]
+    finally:
+        offload.close()
+    stats = offload.stats()
+    assert (stats["strategy"], stats["offloaded"], stats["in_flight"], stats["rejected"]) == (strategy, 2, 0, 0)
+
+
+def test_full_queue_is_rejected() -> None:
+    offload = SignatureOffload(max_workers=1, max_queue=1)
+    key = _BlockingKey()
+
+    async def run() -> None:
+        held = [asyncio.ensure_future(offload.verify(key, "RS256", b"m", b"s")) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert offload.stats()["in_flight"] == 2
+        with pytest.raises(OffloadBusy):
+            await offload.verify(key, "RS256", b"m", b"s")
+        key.release.set()
+        assert await asyncio.gather(*held) == [True, True]
+
+    try:
+        asyncio.run(run())
+    finally:
+        offload.close()
+    stats = offload.stats()
+    assert (stats["in_flight"], stats["peak_in_flight"], stats["offloaded"], stats["rejected"]) == (0, 2, 2, 1)
+
+
+def test_busy_offload_is_a_503(rsa_pem: str) -> None:
+    offload = SignatureOffload(max_workers=1, max_queue=0)
+    metrics = VerificationMetrics()
+    public_key = jwk.construct(rsa_pem, "RS256").public_key()
+    verifier = Verifier(
+        VerificationPolicy(keys=_Keys({"k1": VerificationKey("k1", "RS256", public_key)}), offload=offload),
+        metrics=metrics,
+    )
+    claims = {"sub": "alice", "exp": int(time.time()) + 60}
+    token = jwt.encode(claims, rsa_pem, algorithm="RS256", headers={"kid": "k1"})
+    blocker = _BlockingKey()
+
+    async def run() -> tuple[VerificationError, dict[str, Any]]:
+        held = asyncio.ensure_future(offload.verify(blocker, "RS256", b"m", b"s"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(VerificationError) as busy:
+            await verifier.verify(token)
+        blocker.release.set()
+        await held
+        verified = await verifier.verify(token)
+        return busy.value, verified.claims
+
+    try:
+        error, claims = asyncio.run(run())
+    finally:
+        offload.close()
+    assert (error.status_code, error.reason, error.detail) == (503, "overloaded", "Verifier busy")
+    assert claims["sub"] == "alice"
+    assert verifier.stats()["offload"]["rejected"] == 1
+    rendered = metrics.render()
+    assert "authn_verify_offload_rejected_total 1" in rendered
+    assert "authn_verify_offload_total 2" in rendered
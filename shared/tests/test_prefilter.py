@@ -0,0 +1,207 @@
+"""``TokenPrefilter`` and ``FailureLimiter``: what is turned away before verification, and for how long."""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from authn_verify import (
+    BearerAuthMiddleware,
+    FailureLimiter,
+    Screening,
+    TokenPrefilter,
+    VerificationError,
+    VerificationPolicy,
+    VerifiedToken,
+    Verifier,
+)
+from authn_verify import prefilter as prefilter_module
+from authn_verify.dependency import verified_token
+
+SECRET = "test-secret"
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(prefilter_module.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def _token(key: str = SECRET, headers: dict[str, Any] | None = None, **claims: Any) -> str:
+    payload = {"sub": "alice", "exp": int(time.time()) + 300, **claims}
+    return jwt.encode(payload, key, algorithm="HS256", headers=headers)
+
+
+def _rejection(prefilter: TokenPrefilter, token: str, mode: str = "jwt") -> tuple[str, str] | None:
+    try:
+        prefilter.check(token, mode)
+    except VerificationError as exc:
+        return exc.reason, exc.detail
+    return None
+
+
+def test_size_and_shape() -> None:
+    prefilter = TokenPrefilter(max_token_bytes=64, opaque_pattern=r"opq_[0-9a-f]{8}")
+    assert _rejection(prefilter, "x" * 65) == ("too_large", "Token too large")
+    assert _rejection(prefilter, "opq_0123abcd", "introspect") is None
+    assert _rejection(prefilter, "opq_nothex!", "introspect") == ("malformed", "Invalid token format")
+    assert _rejection(prefilter, "other", "introspect") == ("malformed", "Invalid token format")
+    # In jwt mode the engine's header parse does the shape check.
+    assert _rejection(prefilter, "other", "jwt") is None
+    # In auto mode, a JWT-shaped token is left to the engine; anything else must look like the issuer's.
+    assert _rejection(prefilter, "a.b.c", "auto") is None
+    assert _rejection(prefilter, "a b", "auto") == ("malformed", "Invalid token format")
+    assert prefilter.stats()["too_large"] == 1
+    assert prefilter.stats()["shape"] == 3
+
+
+def test_lasting_rejections_are_remembered(clock: _Clock) -> None:
+    prefilter = TokenPrefilter(negative_ttl=60)
+    prefilter.remember("bad", VerificationError("Signature verification failed", reason="signature"))
+    prefilter.remember("early", VerificationError("not yet", reason="not_before"))
+    outage = VerificationError("Introspection failed: 503", reason="introspection_failed", status_code=502)
+    prefilter.remember("down", outage)
+    # Revocation is the issuer's to report; the introspection cache decides how long to believe it.
+    prefilter.remember("revoked", VerificationError("Token inactive", reason="inactive"))
+    assert _rejection(prefilter, "bad") == ("signature", "Signature verification failed")
+    assert _rejection(prefilter, "early") is None
+    assert _rejection(prefilter, "down") is None
+    assert _rejection(prefilter, "revoked", "introspect") is None
+    clock.now += 60
+    assert _rejection(prefilter, "bad") is None
+    assert prefilter.stats()["negative_hits"] == 1
+
+
+def test_negative_cache_is_bounded(clock: _Clock) -> None:
+    prefilter = TokenPrefilter(negative_cache_size=2)
+    for token in ("a", "b", "c"):
+        prefilter.remember(token, VerificationError("Token expired", reason="expired"))
+    assert [_rejection(prefilter, token) is None for token in ("a", "b", "c")] == [True, False, False]
+    assert prefilter.stats()["rejected_entries"] == 2
+
+
+def test_unknown_kid_is_remembered_briefly(clock: _Clock) -> None:
+    prefilter = TokenPrefilter(unknown_kid_ttl=10)
+    first, second = _token(headers={"kid": "k9"}), _token(headers={"kid": "k9"}, jti="other")
+    prefilter.remember(first, VerificationError("Unknown signing key: k9", reason="unknown_kid"))
+    # Any token with the same header is turned away, not just the one that failed.
+    assert _rejection(prefilter, second) == ("unknown_kid", "Unknown signing key: k9")
+    assert _rejection(prefilter, _token(headers={"kid": "k1"})) is None
+    clock.now += 10
+    assert _rejection(prefilter, second) is None
+
+
+def test_verifier_consults_the_prefilter() -> None:
+    prefilter = TokenPrefilter()
+    verifier = Verifier(VerificationPolicy(algorithms=("HS256",), secret=SECRET, prefilter=prefilter))
+    forged = _token("other")
+
+    async def run() -> list[str]:
+        reasons = []
+        for token in (forged, forged, _token()):
+            try:
+                await verifier.verify(token)
+                reasons.append("ok")
+            except VerificationError as exc:
+                reasons.append(exc.reason)
+        return reasons
+
+    assert asyncio.run(run()) == ["signature", "signature", "ok"]
+    assert verifier.stats()["prefilter"]["negative_hits"] == 1
+
+
+def test_failure_limiter(clock: _Clock) -> None:
+    limiter = FailureLimiter(rate=0.5, burst=2, max_clients=2)
+    assert limiter.allow("a")
+    limiter.failure("a")
+    assert limiter.allow("a")
+    limiter.failure("a")
+    assert not limiter.allow("a")
+    assert limiter.retry_after("a") == pytest.approx(2.0)
+    clock.now += 2
+    assert limiter.allow("a")
+    limiter.failure("b")
+    limiter.failure("c")
+    assert limiter.stats() == {"clients": 2, "blocked": 1, "evicted": 1}
+    with pytest.raises(ValueError):
+        FailureLimiter(burst=0)
+
+
+class _Down:
+    async def get_or_refetch(self, kid: str) -> None:
+        raise VerificationError("Key set unavailable", reason="jwks_unavailable", status_code=503)
+
+
+def _app(verifier: Verifier, limiter: FailureLimiter) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/protected")
+    async def protected(token: VerifiedToken = Depends(verified_token)) -> dict[str, Any]:
+        return token.claims
+
+    app.add_middleware(BearerAuthMiddleware, verifier=verifier, limiter=limiter)
+    return TestClient(app)
+
+
+def test_middleware_answers_429_once_the_budget_is_spent() -> None:
+    verifier = Verifier(VerificationPolicy(algorithms=("HS256",), secret=SECRET))
+    client = _app(verifier, FailureLimiter(rate=0.01, burst=2))
+    bad = {"Authorization": f"Bearer {_token('other')}"}
+    assert [client.get("/protected", headers=bad).status_code for _ in range(2)] == [401, 401]
+    limited = client.get("/protected", headers={"Authorization": f"Bearer {_token()}"})
+    assert limited.status_code == 429
+    assert limited.json() == {"detail": "Too many failed authentication attempts"}
+    assert int(limited.headers["retry-after"]) >= 1
+    assert "www-authenticate" not in limited.headers
+
+
+def test_outages_are_not_charged() -> None:
+    verifier = Verifier(VerificationPolicy(keys=_Down()))
+    client = _app(verifier, FailureLimiter(rate=0.01, burst=1))
+    headers = {"Authorization": f"Bearer {_token(headers={'kid': 'k1'})}"}
+    assert [client.get("/protected", headers=headers).status_code for _ in range(3)] == [503, 503, 503]
+
+
+def test_screening_from_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("LAB_FAILURE_BURST", raising=False)
+    assert Screening.from_env("LAB").limiter is None
+    monkeypatch.setenv("LAB_MAX_TOKEN_BYTES", "100")
+    monkeypatch.setenv("LAB_FAILURE_BURST", "3")
+    monkeypatch.setenv("LAB_FAILURE_RATE", "0.5")
+    screening = Screening.from_env("LAB", opaque_pattern="opq_.*")
+    assert screening.prefilter.max_token_bytes == 100
+    assert _rejection(screening.prefilter, "other", "introspect") == ("malformed", "Invalid token format")
+    assert (screening.limiter.burst, screening.limiter.rate) == (3, 0.5)
+    monkeypatch.setenv("LAB_FAILURE_BURST", "0")
+    assert Screening.from_env("LAB").limiter is None
+
+
+def test_screening_installs_the_middleware(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("LAB_FAILURE_BURST", "1")
+    monkeypatch.setenv("LAB_FAILURE_RATE", "0.01")
+    screening = Screening.from_env("LAB")
+    verifier = Verifier(VerificationPolicy(algorithms=("HS256",), secret=SECRET, prefilter=screening.prefilter))
+    app = FastAPI()
+
+    @app.get("/data")
+    async def data(token: VerifiedToken = Depends(verified_token)) -> dict[str, Any]:
+        return token.claims
+
+    screening.install(app, verifier, paths=("/data",))
+    client = TestClient(app)
+    assert client.get("/data").status_code == 401
+    assert client.get("/data", headers={"Authorization": f"Bearer {_token()}"}).status_code == 429
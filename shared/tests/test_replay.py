@@ -0,0 +1,165 @@
+"""Replay caches accept a jti once until it expires, and fill up the way they are configured to."""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+import pytest
+from jose import jwt
+
+from authn_verify import (
+    FAIL_CLOSED,
+    FAIL_OPEN,
+    OVERFLOW_EVICT,
+    InMemoryReplayCache,
+    RedisReplayCache,
+    ReplayCacheFull,
+    ReplayStoreUnavailable,
+    VerificationError,
+    VerificationPolicy,
+    Verifier,
+    build_replay_cache,
+)
+from authn_verify.resp_stub import RespStubServer
+
+NOW = 1_000_000.0
+
+
+def test_first_use_only() -> None:
+    cache = InMemoryReplayCache()
+    assert cache.add("a", NOW + 60, now=NOW)
+    assert not cache.add("a", NOW + 60, now=NOW)
+    assert cache.add("b", NOW + 60, now=NOW)
+    assert not cache.add("a", NOW + 120, now=NOW + 30)
+    assert len(cache) == 2
+
+
+def test_expired_jti_is_forgotten() -> None:
+    cache = InMemoryReplayCache()
+    assert cache.add("a", NOW + 10, now=NOW)
+    assert not cache.add("a", NOW + 10, now=NOW + 5)
+    assert cache.add("a", NOW + 2000, now=NOW + 1000)
+    assert len(cache) == 1
+
+
+def test_purge_only_drops_expired_entries() -> None:
+    cache = InMemoryReplayCache(shards=1)
+    for index in range(100):
+        cache.add(f"jti-{index}", NOW + index, now=NOW)
+    cache.add("late", NOW + 1000, now=NOW + 50)
+    assert len(cache) == 50
+
+
+def test_full_cache_rejects() -> None:
+    cache = InMemoryReplayCache(shards=1, max_entries=2)
+    assert cache.add("a", NOW + 60, now=NOW)
+    assert cache.add("b", NOW + 60, now=NOW)
+    with pytest.raises(ReplayCacheFull):
+        cache.add("c", NOW + 60, now=NOW)
+    assert cache.stats()["rejections"] == 1
+    # An expired entry frees its slot.
+    assert cache.add("c", NOW + 120, now=NOW + 61)
+
+
+def test_full_cache_evicts_closest_to_expiry() -> None:
+    cache = InMemoryReplayCache(shards=1, max_entries=2, overflow=OVERFLOW_EVICT)
+    assert cache.add("soon", NOW + 10, now=NOW)
+    assert cache.add("late", NOW + 100, now=NOW)
+    assert cache.add("new", NOW + 50, now=NOW)
+    assert cache.stats()["evictions"] == 1
+    assert cache.add("soon", NOW + 10, now=NOW)
+    assert not cache.add("late", NOW + 100, now=NOW)
+
+
+def test_unknown_overflow_policy() -> None:
+    with pytest.raises(ValueError):
+        InMemoryReplayCache(overflow="drop")
+
+
+def _with_redis(test: Callable[[RedisReplayCache, RespStubServer], Awaitable[None]], **options: Any) -> None:
+    redis_asyncio = pytest.importorskip("redis.asyncio")
+
+    async def run() -> None:
+        async with RespStubServer() as server:
+            client = redis_asyncio.from_url(server.url)
+            cache = RedisReplayCache(client, **options)
+            try:
+                await test(cache, server)
+            finally:
+                # A paused server holds the in-flight pipeline; let it answer so nothing is left hanging.
+                server.paused = False
+                while cache._flusher is not None:
+                    await asyncio.sleep(0.01)
+                await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_redis_records_jti_with_ttl() -> None:
+    async def test(cache: RedisReplayCache, server: RespStubServer) -> None:
+        expires_at = time.time() + 60
+        assert [await cache.check_and_store(jti, expires_at) for jti in ("a", "a", "b")] == [True, False, True]
+        assert set(server._data) == {b"authn:jti:a", b"authn:jti:b"}
+        # The stub keeps expiries on its monotonic clock.
+        assert server._data[b"authn:jti:a"][1] - time.monotonic() == pytest.approx(60, abs=1)
+
+    _with_redis(test)
+
+
+def test_concurrent_redis_checks_share_a_pipeline() -> None:
+    async def test(cache: RedisReplayCache, _: RespStubServer) -> None:
+        expires_at = time.time() + 60
+        results = await asyncio.gather(*(cache.check_and_store(jti, expires_at) for jti in ["a", "b", "a", "c"]))
+        assert results == [True, True, False, True]
+        assert not await cache.check_and_store("b", expires_at)
+        stats = cache.stats()
+        assert (stats["commands"], stats["batches"], stats["largest_batch"]) == (5, 2, 4)
+
+    _with_redis(test)
+
+
+def test_redis_fails_closed() -> None:
+    async def test(cache: RedisReplayCache, server: RespStubServer) -> None:
+        assert await cache.check_and_store("warm", time.time() + 60)
+        server.paused = True
+        with pytest.raises(ReplayStoreUnavailable):
+            await cache.check_and_store("a", time.time() + 60)
+        assert cache.stats()["failures"] == 1
+
+    _with_redis(test, timeout=0.05, failure_policy=FAIL_CLOSED)
+
+
+def test_redis_fails_open() -> None:
+    async def test(cache: RedisReplayCache, server: RespStubServer) -> None:
+        assert await cache.check_and_store("warm", time.time() + 60)
+        server.paused = True
+        assert await cache.check_and_store("a", time.time() + 60)
+        assert cache.stats()["accepted_unchecked"] == 1
+
+    _with_redis(test, timeout=0.05, failure_policy=FAIL_OPEN)
+
+
+def test_unavailable_store_is_a_503() -> None:
+    async def test(cache: RedisReplayCache, server: RespStubServer) -> None:
+        verifier = Verifier(VerificationPolicy(algorithms=("HS256",), secret="s", replay=cache))
+        server.paused = True
+        with pytest.raises(VerificationError) as excinfo:
+            await verifier.verify(jwt.encode({"jti": "a", "exp": int(time.time()) + 60}, "s"))
+        assert (excinfo.value.status_code, excinfo.value.detail) == (503, "Replay store unavailable")
+
+    _with_redis(test, timeout=0.05)
+
+
+def test_unknown_failure_policy() -> None:
+    with pytest.raises(ValueError):
+        RedisReplayCache(object(), failure_policy="maybe")
+
+
+def test_build_replay_cache() -> None:
+    cache = build_replay_cache("memory", shards=4, max_entries=40)
+    assert cache.stats()["capacity"] == 40
+    with pytest.raises(RuntimeError):
+        build_replay_cache("redis")
+    with pytest.raises(RuntimeError):
+        build_replay_cache("nope")
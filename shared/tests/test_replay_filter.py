@@ -0,0 +1,81 @@
+"""``CompactReplayFilter``: exact answers from a Bloom-fronted fingerprint store."""
+from __future__ import annotations
+
+import pytest
+
+from authn_verify import OVERFLOW_EVICT, ReplayCacheFull, build_replay_cache
+from authn_verify.replay_filter import CompactReplayFilter
+
+NOW = 1_000_000.0
+
+
+def test_first_use_only() -> None:
+    cache = CompactReplayFilter()
+    assert cache.add("a", NOW + 60, now=NOW)
+    assert not cache.add("a", NOW + 60, now=NOW)
+    assert cache.add("b", NOW + 60, now=NOW)
+    # A different exp does not make a seen jti new again.
+    assert not cache.add("a", NOW + 6000, now=NOW)
+    assert len(cache) == 2
+
+
+def test_expired_bucket_is_dropped() -> None:
+    cache = CompactReplayFilter(bucket_seconds=10)
+    assert cache.add("a", NOW + 5, now=NOW)
+    assert not cache.add("a", NOW + 5, now=NOW + 1)
+    assert cache.add("a", NOW + 2000, now=NOW + 1000)
+    assert cache.stats()["buckets"] == 1
+
+
+def test_already_expired_token_is_not_stored() -> None:
+    cache = CompactReplayFilter()
+    assert cache.add("a", NOW - 1, now=NOW)
+    assert len(cache) == 0
+
+
+def test_filter_hits_never_reject_new_jtis() -> None:
+    # A tiny, saturated filter answers "maybe" for almost everything; the exact store decides.
+    cache = CompactReplayFilter(expected_per_bucket=8, fp_rate=0.5)
+    assert all(cache.add(f"jti-{index}", NOW + 60, now=NOW) for index in range(5000))
+    assert not any(cache.add(f"jti-{index}", NOW + 60, now=NOW) for index in range(0, 5000, 7))
+    stats = cache.stats()
+    assert stats["entries"] == 5000
+    assert stats["false_positives"] > 0
+
+
+def test_fingerprints_cost_about_eight_bytes() -> None:
+    cache = CompactReplayFilter(expected_per_bucket=100_000)
+    for index in range(100_000):
+        cache.add(f"jti-{index}", NOW + 60, now=NOW)
+    assert cache.nbytes() / len(cache) < 10
+
+
+def test_full_cache_rejects() -> None:
+    cache = CompactReplayFilter(max_entries=2)
+    assert cache.add("a", NOW + 60, now=NOW)
+    assert cache.add("b", NOW + 60, now=NOW)
+    with pytest.raises(ReplayCacheFull):
+        cache.add("c", NOW + 60, now=NOW)
+    assert cache.stats()["rejections"] == 1
+
+
+def test_full_cache_evicts_the_bucket_closest_to_expiry() -> None:
+    cache = CompactReplayFilter(bucket_seconds=10, max_entries=2, overflow=OVERFLOW_EVICT)
+    assert cache.add("soon", NOW + 5, now=NOW)
+    assert cache.add("late", NOW + 50, now=NOW)
+    assert cache.add("new", NOW + 50, now=NOW)
+    assert cache.stats()["evictions"] == 1
+    assert not cache.add("late", NOW + 50, now=NOW)
+    assert cache.add("soon", NOW + 5, now=NOW)
+
+
+@pytest.mark.parametrize("options", [{"fp_rate": 0}, {"fp_rate": 1}, {"overflow": "drop"}])
+def test_invalid_options(options: dict[str, object]) -> None:
+    with pytest.raises(ValueError):
+        CompactReplayFilter(**options)
+
+
+def test_build_replay_cache() -> None:
+    cache = build_replay_cache("compact", bucket_seconds=60, fp_rate=0.001, max_entries=10)
+    assert isinstance(cache, CompactReplayFilter)
+    assert (cache.bucket_seconds, cache.fp_rate, cache.max_entries) == (60, 0.001, 10)
@@ -0,0 +1,148 @@
+"""``SharedTable`` and the caches built on it: one answer for every worker that opens the same file."""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from authn_verify import OVERFLOW_EVICT, ReplayCacheFull, build_replay_cache
+from authn_verify.shared_table import (
+    SharedReplayCache,
+    SharedTable,
+    SharedTableFull,
+    SharedVerifiedTokenCache,
+    digest,
+    shared_jwks_loader,
+)
+
+NOW = 1_000_000.0
+
+
+def test_insert_if_absent(tmp_path: Path) -> None:
+    table = SharedTable(str(tmp_path / "t.tbl"), 100, value_size=16)
+    key = digest("a")
+    assert table.insert(key, NOW + 60, b"first", now=NOW)
+    assert not table.insert(key, NOW + 60, b"second", now=NOW)
+    assert table.get(key, now=NOW) == (NOW + 60, b"first")
+    assert table.insert(key, NOW + 90, b"second", replace=True, now=NOW)
+    assert table.get(key, now=NOW) == (NOW + 90, b"second")
+    assert table.get(digest("b"), now=NOW) is None
+    with pytest.raises(ValueError):
+        table.insert(digest("c"), NOW + 60, b"x" * 17, now=NOW)
+
+
+def test_expired_slots_are_reused(tmp_path: Path) -> None:
+    table = SharedTable(str(tmp_path / "t.tbl"), 1)
+    key = digest("a")
+    assert table.insert(key, NOW + 10, now=NOW)
+    assert table.get(key, now=NOW + 10) is None
+    assert table.insert(key, NOW + 100, now=NOW + 10)
+    assert table.entries() == 1
+
+
+def test_full_bucket_evicts_the_soonest_to_expire(tmp_path: Path) -> None:
+    # One bucket of 32 slots.
+    table = SharedTable(str(tmp_path / "t.tbl"), 1)
+    for index in range(32):
+        table.insert(digest(str(index)), NOW + 100 + index, now=NOW)
+    assert table.insert(digest("new"), NOW + 500, now=NOW)
+    assert table.evictions == 1
+    assert table.get(digest("0"), now=NOW) is None
+    assert table.get(digest("1"), now=NOW) is not None
+    with pytest.raises(SharedTableFull):
+        table.insert(digest("newer"), NOW + 500, evict=False, now=NOW)
+
+
+def test_other_opens_see_the_same_entries(tmp_path: Path) -> None:
+    path = str(tmp_path / "t.tbl")
+    SharedTable(path, 100).insert(digest("a"), NOW + 60, now=NOW)
+    assert SharedTable(path, 100).get(digest("a"), now=NOW) is not None
+    with pytest.raises(RuntimeError, match="different size"):
+        SharedTable(path, 5000)
+
+
+def _claim(path: str, start: multiprocessing.Event, results: Any) -> None:
+    table = SharedTable(path, 1000)
+    start.wait()
+    results.put(sum(table.insert(digest(str(index)), time.time() + 60) for index in range(300)))
+
+
+def test_racing_processes_accept_each_key_once(tmp_path: Path) -> None:
+    context = multiprocessing.get_context("fork")
+    path = str(tmp_path / "t.tbl")
+    SharedTable(path, 1000)
+    start, results = context.Event(), context.Queue()
+    workers = [context.Process(target=_claim, args=(path, start, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    accepted = sum(results.get(timeout=30) for _ in workers)
+    for worker in workers:
+        worker.join(timeout=30)
+    assert accepted == 300
+
+
+def test_shared_replay_cache(tmp_path: Path) -> None:
+    path = str(tmp_path / "replay.tbl")
+    first, second = SharedReplayCache(path, max_entries=1), SharedReplayCache(path, max_entries=1)
+
+    async def run() -> list[bool]:
+        return [
+            await first.check_and_store("a", time.time() + 60),
+            await second.check_and_store("a", time.time() + 60),
+        ]
+
+    assert asyncio.run(run()) == [True, False]
+
+    async def fill() -> None:
+        for index in range(40):
+            await first.check_and_store(str(index), time.time() + 60)
+
+    with pytest.raises(ReplayCacheFull):
+        asyncio.run(fill())
+    assert first.stats()["rejections"] == 1
+    evicting = build_replay_cache("shared", max_entries=1, overflow=OVERFLOW_EVICT, shared_path=path)
+    assert isinstance(evicting, SharedReplayCache)
+    assert asyncio.run(evicting.check_and_store("late", time.time() + 60))
+    with pytest.raises(RuntimeError, match="shared_path"):
+        build_replay_cache("shared")
+
+
+def test_shared_verified_token_cache(tmp_path: Path) -> None:
+    path = str(tmp_path / "verified.tbl")
+    writer = SharedVerifiedTokenCache(path, 100, leeway_seconds=0, value_size=128)
+    reader = SharedVerifiedTokenCache(path, 100, leeway_seconds=0, value_size=128)
+    now = time.time()
+    writer.put("token", {"sub": "alice", "exp": now + 60}, kid="k1")
+    assert reader.get("token") == ({"sub": "alice", "exp": now + 60}, "k1")
+    writer.put("later", {"exp": now + 60, "nbf": now + 30})
+    writer.put("expired", {"exp": now - 1})
+    writer.put("large", {"exp": now + 60, "blob": "x" * 200})
+    assert [reader.get(token) for token in ("later", "expired", "large")] == [None, None, None]
+    assert reader.stats() == {"entries": 2, "hits": 1, "misses": 3}
+
+
+def test_one_worker_fetches_the_jwks_for_all(tmp_path: Path) -> None:
+    path = str(tmp_path / "jwks.tbl")
+    fetches: list[int] = []
+
+    async def source() -> tuple[dict[str, Any], float | None]:
+        fetches.append(1)
+        return {"keys": [{"kid": f"k{len(fetches)}"}]}, 120.0
+
+    first, second = shared_jwks_loader(source, path), shared_jwks_loader(source, path)
+
+    async def run() -> list[tuple[dict[str, Any], float | None]]:
+        return [await first(), await second(), await second()]
+
+    fetched, reused, refetched = asyncio.run(run())
+    assert fetched == ({"keys": [{"kid": "k1"}]}, 120.0)
+    assert reused[0] == {"keys": [{"kid": "k1"}]}
+    assert 0 < reused[1] <= 120
+    # Asking again for the copy it already holds means the worker wants a newer key set.
+    assert refetched == ({"keys": [{"kid": "k2"}]}, 120.0)
+    assert len(fetches) == 2
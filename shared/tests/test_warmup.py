@@ -0,0 +1,126 @@
+"""``Warmup``: what it primes, what it leaves untouched, and when ``check`` says ready."""
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+from jose.backends.base import Key
+
+from authn_verify import (
+    InMemoryReplayCache,
+    OffloadBusy,
+    VerificationKey,
+    VerificationMetrics,
+    VerificationPolicy,
+    Verifier,
+    Warmup,
+)
+from authn_verify import warmup as warmup_module
+
+
+class _Keys:
+    def __init__(self, keys: dict[str, VerificationKey]) -> None:
+        self.keys = keys
+
+    async def get_or_refetch(self, kid: str) -> VerificationKey | None:
+        return self.keys.get(kid)
+
+
+def _public_key(alg: str) -> Key:
+    return warmup_module._ephemeral_key(alg).public_key()
+
+
+def _run(coroutine: Any) -> Any:
+    return asyncio.run(coroutine)
+
+
+def test_static_secret() -> None:
+    replay = InMemoryReplayCache()
+    metrics = VerificationMetrics()
+    verifier = Verifier(
+        VerificationPolicy(
+            algorithms=("HS256", "HS384"),
+            secret="secret",
+            issuer="https://issuer",
+            audience="api",
+            required_claims=("scope",),
+            replay=replay,
+            verified_cache_size=16,
+        ),
+        metrics=metrics,
+    )
+    warmup = Warmup(verifier)
+    assert not _run(warmup.check())
+    assert warmup.detail == "Warming up"
+
+    assert _run(warmup.run())
+    assert _run(warmup.check())
+    assert warmup.stats()["algorithms"] == ["HS256", "HS384"]
+    # The synthetic token went through a copy of the policy, so the real verifier saw nothing.
+    assert len(replay) == 0
+    assert verifier.stats()["verified_cache"]["entries"] == 0
+    assert "authn_verify_outcomes_total{" not in metrics.render()
+
+
+def test_introspection_has_nothing_to_warm() -> None:
+    async def introspect(_: str) -> dict[str, Any]:
+        raise AssertionError("warm-up must not call the issuer")
+
+    warmup = Warmup(Verifier(VerificationPolicy(mode="introspect", introspector=introspect)))
+    assert _run(warmup.run())
+    assert _run(warmup.check())
+
+
+def test_key_set_readiness_follows_loaded_keys() -> None:
+    keys = _Keys({})
+    warmup = Warmup(Verifier(VerificationPolicy(keys=keys, algorithms=("RS256", "ES256"))))
+    assert _run(warmup.run())
+    assert not _run(warmup.check())
+    assert warmup.detail == "No signing keys loaded"
+
+    keys.keys = {
+        "rsa": VerificationKey("rsa", "RS256", _public_key("RS256")),
+        "ec": VerificationKey("ec", "ES256", _public_key("ES256")),
+        "hs": VerificationKey("hs", "HS512", warmup_module._ephemeral_key("HS512")),
+    }
+    assert _run(warmup.check())
+    stats = warmup.stats()
+    # HS512 is outside the allow-list, so the verifier would refuse it before touching the key.
+    assert stats["keys"] == ["ec", "rsa"]
+    assert stats["algorithms"] == ["ES256", "RS256"]
+
+
+def test_failed_run_is_permanent() -> None:
+    warmup = Warmup(Verifier(VerificationPolicy(keys=_Keys({}), algorithms=("RS256",))))
+
+    async def fail() -> None:
+        raise ValueError("bad key")
+
+    warmup._prime_new_keys = fail
+    assert not _run(warmup.run())
+    assert not _run(warmup.check())
+    assert warmup.detail == "Warm-up failed: bad key"
+    assert warmup.stats()["error"] == "Warm-up failed: bad key"
+
+
+def test_failed_reprime_is_retried(monkeypatch: pytest.MonkeyPatch) -> None:
+    keys = _Keys({})
+    warmup = Warmup(Verifier(VerificationPolicy(keys=keys, algorithms=("RS256",))))
+    assert _run(warmup.run())
+
+    ephemeral_key = warmup_module._ephemeral_key
+
+    def busy(alg: str) -> Any:
+        raise OffloadBusy("pool saturated")
+
+    keys.keys = {"k1": VerificationKey("k1", "RS256", _public_key("RS256"))}
+    monkeypatch.setattr(warmup_module, "_ephemeral_key", busy)
+    assert not _run(warmup.check())
+    assert "pool saturated" in warmup.detail
+    assert not _run(warmup.check())
+
+    monkeypatch.setattr(warmup_module, "_ephemeral_key", ephemeral_key)
+    assert _run(warmup.check())
+    assert warmup.stats()["keys"] == ["k1"]
+    assert warmup.stats()["error"] is None